@@ -0,0 +1,165 @@
+"""
+Recover the hidden starting accumulators of a mid-stream VWAP export.
+
+A TradingView export that starts part-way through an anchored period has
+VWAP/VAH/VAL columns that already include (cum_vol, cum_tpv, cum_tp2v) from
+bars we never see.  For every bar i before the first in-window reset
+
+    vwap_i * (V0 + cv_i)             = S1 + ctpv_i
+    (sd_i^2 + vwap_i^2) * (V0 + cv_i) = S2 + ctp2v_i
+
+where cv/ctpv/ctp2v are running sums over the window.  Both are linear in
+the unknown prior state (V0, S1, S2), so the whole window is one batched
+least-squares solve.  The state is then replayed forward with the normal
+engine and compared bar by bar.
+
+    python backsolve.py data_vwap.csv [more exports ...] [--workers N]
+"""
+import argparse
+import collections
+import concurrent.futures
+import os
+
+import numpy as np
+
+from bars import BarStore
+from vwap import anchored_vwap_sums, new_period, typical_price
+
+VWAP_COL = "VWAP - Daily"
+VAH_COL = "SD#1 VAH"
+VAL_COL = "SD#1 VAL"
+
+Backsolve = collections.namedtuple(
+    "Backsolve",
+    "cum_vol cum_tpv cum_tp2v fit_bars vwap sd vwap_err vah_err val_err")
+
+
+def solve_prior_state(tp, volume, vwap_obs, sd_obs, resets):
+    """
+    Least-squares (V0, S1, S2) from the bars before the first reset.
+
+    Rows are normalised by their observed VWAP / second moment and columns
+    by their norms so the ~1e10 second-moment equations do not swamp the
+    first-moment ones.  Bars whose observed VWAP or second moment is blank
+    (NaN), infinite or zero, or whose running sums are not finite, are left
+    out of the fit.  Returns ``(state, fit_bars)`` with ``fit_bars`` the
+    number of bars kept.
+    """
+    tp = np.asarray(tp, dtype=np.float64)
+    volume = np.asarray(volume, dtype=np.float64)
+    first_reset = np.flatnonzero(resets)
+    r = int(first_reset[0]) if len(first_reset) else len(tp)
+    if r < 2:
+        return np.zeros(3), r
+
+    tp, v, m, s = tp[:r], volume[:r], vwap_obs[:r], sd_obs[:r]
+    cv = np.cumsum(v)
+    ctpv = np.cumsum(tp * v)
+    ctp2v = np.cumsum(tp * tp * v)
+    q = s * s + m * m
+    with np.errstate(invalid="ignore"):
+        keep = (np.isfinite(tp) & np.isfinite(m) & np.isfinite(q) & (m != 0) & (q != 0)
+                & np.isfinite(cv) & np.isfinite(ctpv) & np.isfinite(ctp2v))
+    r = int(np.count_nonzero(keep))
+    if r < 2:
+        return np.zeros(3), r
+    m, q, cv, ctpv, ctp2v = m[keep], q[keep], cv[keep], ctpv[keep], ctp2v[keep]
+
+    A = np.zeros((2 * r, 3))
+    b = np.empty(2 * r)
+    A[:r, 0], A[:r, 1], b[:r] = 1.0, -1.0 / m, (ctpv - m * cv) / m
+    A[r:, 0], A[r:, 2], b[r:] = 1.0, -1.0 / q, (ctp2v - q * cv) / q
+    scale = np.linalg.norm(A, axis=0)
+    x, *_ = np.linalg.lstsq(A / scale, b, rcond=None)
+    return x / scale, r
+
+
+def replay(tp, volume, resets, state):
+    """Anchored VWAP over the window with ``state`` folded into bar 0."""
+    tp = np.asarray(tp, dtype=np.float64)
+    vol = np.array(volume, dtype=np.float64)
+    tpv = tp * vol
+    tp2v = tpv * tp
+    if len(tp) and not resets[0]:
+        vol[0] += state[0]
+        tpv[0] += state[1]
+        tp2v[0] += state[2]
+    return anchored_vwap_sums(vol, tpv, tp2v, resets)
+
+
+def backsolve_bars(bars, anchor="year", source="hlc3", sd_mult=1.0,
+                   vwap_col=VWAP_COL, vah_col=VAH_COL, val_col=VAL_COL):
+    """Solve and replay one export held in a BarStore."""
+    tp = typical_price(bars, source)
+    resets = new_period(bars.time, anchor)
+    # The window's first bar is a reset only if it genuinely opens a period;
+    # new_period always flags bar 0, so recheck it against a bar earlier.
+    if len(bars):
+        resets = resets.copy()
+        resets[0] = bool(new_period(np.array([bars.time[0] - 1, bars.time[0]]), anchor)[1])
+    vwap_obs = np.asarray(bars[vwap_col], dtype=np.float64)
+    sd_obs = (np.asarray(bars[vah_col], dtype=np.float64) - vwap_obs) / sd_mult
+    state, fit_bars = solve_prior_state(tp, bars.volume, vwap_obs, sd_obs, resets)
+    res = replay(tp, bars.volume, resets, state)
+    vah, val = res.band(sd_mult)
+    return Backsolve(state[0], state[1], state[2], fit_bars, res.vwap, res.sd,
+                     res.vwap - vwap_obs, vah - bars[vah_col], val - bars[val_col])
+
+
+def _summary(path, kwargs):
+    # One bad export must not sink the batch: its row carries the error.
+    try:
+        bars = BarStore.from_csv(path)
+        r = backsolve_bars(bars, **kwargs)
+    except Exception as e:
+        return {"path": path, "error": f"{type(e).__name__}: {e}"}
+    return {
+        "path": path,
+        "bars": len(bars),
+        "fit_bars": r.fit_bars,
+        "cum_vol": float(r.cum_vol),
+        "cum_tpv": float(r.cum_tpv),
+        "cum_tp2v": float(r.cum_tp2v),
+        "max_abs_vwap_err": float(np.nanmax(np.abs(r.vwap_err))) if len(bars) else 0.0,
+        "rmse_vwap": float(np.sqrt(np.nanmean(r.vwap_err ** 2))) if len(bars) else 0.0,
+        "max_abs_vah_err": float(np.nanmax(np.abs(r.vah_err))) if len(bars) else 0.0,
+    }
+
+
+def solve_exports(paths, workers=None, **kwargs):
+    """
+    Back-solve many exports in a process pool; returns one summary dict per
+    path in input order.  Each worker loads its own export (through the
+    binary cache), so only the small summaries cross process boundaries.
+    An export that cannot be loaded or solved gets ``{"path", "error"}``.
+    """
+    paths = [os.path.abspath(p) for p in paths]
+    if workers == 1 or len(paths) <= 1:
+        return [_summary(p, kwargs) for p in paths]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, len(paths) // (4 * (workers or os.cpu_count() or 1)))
+        return list(pool.map(_summary, paths, [kwargs] * len(paths), chunksize=chunksize))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Back-solve prior VWAP accumulators of exports.")
+    ap.add_argument("paths", nargs="+")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--anchor", default="year")
+    ap.add_argument("--source", default="hlc3")
+    args = ap.parse_args(argv)
+    failed = 0
+    for s in solve_exports(args.paths, args.workers, anchor=args.anchor, source=args.source):
+        if "error" in s:
+            failed += 1
+            print(f"{s['path']}: ERROR {s['error']}")
+            continue
+        print(f"{s['path']}: {s['bars']} bars (fit on {s['fit_bars']}) "
+              f"V0={s['cum_vol']:.6g} S1={s['cum_tpv']:.6g} S2={s['cum_tp2v']:.6g} "
+              f"max|ΔVWAP|={s['max_abs_vwap_err']:.4f} rmse={s['rmse_vwap']:.4f} "
+              f"max|ΔVAH|={s['max_abs_vah_err']:.4f}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,107 @@
+"""
+Columnar bar store for the indicator backtests.
+
+Bars are held as one contiguous float64 array per column (time, open, high,
+low, close, volume) plus any extra named columns from a TradingView export
+(``VWAP - Daily``, ``SD#1 VAH``, ``s0..s15`` ...).  Slicing by time range
+returns views into the same arrays, so sub-ranges cost nothing to take.
+"""
+import functools
+import os
+
+import numpy as np
+
+import ingest
+
+CORE_COLUMNS = ("time", "open", "high", "low", "close", "volume")
+
+# TradingView exports without a volume column are weighted equally, which is
+# the same "proxy volume = 1" assumption the backtests make.
+DEFAULT_VOLUME = 1.0
+
+
+class BarStore:
+    """Columnar OHLCV bars plus named extra columns, all of equal length."""
+
+    def __init__(self, columns):
+        columns = dict(columns)
+        missing = [c for c in CORE_COLUMNS if c not in columns and c != "volume"]
+        if missing:
+            raise ValueError(f"missing core columns: {missing}")
+        n = len(columns["time"])
+        if "volume" not in columns:
+            columns["volume"] = np.full(n, DEFAULT_VOLUME)
+        ordered = {}
+        for name in CORE_COLUMNS:
+            ordered[name] = np.ascontiguousarray(columns.pop(name), dtype=np.float64)
+        for name, values in columns.items():
+            ordered[name] = np.asarray(values)
+        for name, values in ordered.items():
+            if values.ndim != 1 or len(values) != n:
+                raise ValueError(f"column {name!r} has shape {values.shape}, expected ({n},)")
+        self._cols = ordered
+
+    # ── Construction ─────────────────────────────────────────────
+    @classmethod
+    def from_csv(cls, path, cache=True):
+        """
+        Load a TradingView CSV export.  With ``cache`` on, columns are
+        memory-mapped from the binary cache written by ``ingest``.
+        """
+        return cls(ingest.load_columns(path, cache=cache))
+
+    # ── Column access ────────────────────────────────────────────
+    def __len__(self):
+        return len(self._cols["time"])
+
+    def __getitem__(self, name):
+        return self._cols[name]
+
+    def __contains__(self, name):
+        return name in self._cols
+
+    def __repr__(self):
+        return f"BarStore({len(self)} bars, columns={self.columns})"
+
+    @property
+    def columns(self):
+        return list(self._cols)
+
+    @property
+    def extra_columns(self):
+        return [c for c in self._cols if c not in CORE_COLUMNS]
+
+    time   = property(lambda self: self._cols["time"])
+    open   = property(lambda self: self._cols["open"])
+    high   = property(lambda self: self._cols["high"])
+    low    = property(lambda self: self._cols["low"])
+    close  = property(lambda self: self._cols["close"])
+    volume = property(lambda self: self._cols["volume"])
+
+    def stack(self, names):
+        """Return the named columns as a (len(names), n) array (copies)."""
+        return np.vstack([self._cols[n] for n in names])
+
+    # ── Slicing (zero-copy) ──────────────────────────────────────
+    def iloc(self, index):
+        """Positional slice; basic slices share memory with this store."""
+        if not isinstance(index, slice):
+            raise TypeError("BarStore.iloc only takes slices")
+        return BarStore({name: col[index] for name, col in self._cols.items()})
+
+    def slice_time(self, start=None, end=None):
+        """Bars with ``start <= time < end``; either bound may be None."""
+        t = self._cols["time"]
+        lo = 0 if start is None else int(np.searchsorted(t, start, side="left"))
+        hi = len(t) if end is None else int(np.searchsorted(t, end, side="left"))
+        return self.iloc(slice(lo, hi))
+
+
+@functools.lru_cache(maxsize=None)
+def _load(path):
+    return BarStore.from_csv(path)
+
+
+def load_csv(path):
+    """Load an export once per process; repeated calls return the same store."""
+    return _load(os.path.abspath(path))
@@ -0,0 +1,360 @@
+"""
+Correctness checks for the ported indicators against the TradingView exports.
+
+backtest.py prints its findings for a person to read; the same facts are
+asserted here so a run either passes or names what broke:
+
+* data_vwap.csv: the exported SD bands are symmetric, the yearly anchor
+  resets exactly at 2026-01-01 with SD 0 on that bar (in the export and
+  in every engine), the batch, incremental and Welford engines agree, and
+  the back-solved prior state replays the 2025 window within tolerance;
+* data_cs9.csv: the exported shapes flag at most one step per bar, every
+  count-rule variant flags at most one setup and one countdown step, and
+  the best variant still scores the F1 it scored when the sweep was written;
+* the synthetic CME H4 bars of BACKTEST 4: exactly the weekend and holiday
+  gaps are detected, and the size-only rule does flag weekday moves;
+* synthetic hourly bars: the batch "naive" VWAP/SD equal the scalar
+  engine bit for bit across ~170 daily periods;
+* synthetic minute bars: the batch and incremental rolling VWAP agree over
+  a series long enough for prefix-sum cancellation to show;
+* synthetic multi-year series: ``shards.run`` on several workers, with
+  shards that differ from the VWAP anchor, matches one sequential pass
+  bit for bit;
+* the result cache: memory and disk hits equal a fresh computation, and a
+  disk tier reopened with a smaller budget evicts down to it;
+* synthetic H4 bars: the batch gap dashboard at any bar equals the live
+  Gap Hunter fed the bars up to it, so gaps that have not formed yet are
+  not counted;
+* synthetic hourly bars: a Resampler fed in pieces, the first a single
+  bar, gives the same ``security`` series as the one-shot function.
+
+Tolerances pin the numbers the backtests report today, so a change that
+moves them shows up as a failure rather than a different printout.
+
+    python -m benchmarks.checks [--data-dir .]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+import cache
+import shards
+from backsolve import VAH_COL, VAL_COL, VWAP_COL, backsolve_bars
+from bars import BarStore
+from benchmarks.synthetic import DAY, synthetic_chunks, write_csv
+from benchmarks.variance_accuracy import synthetic_minutes
+from cme_fixture import CME_BARS, EXPECTED_CME_GAPS, cme_arrays
+from cs9_sweep import sweep, variant_grid, variant_shapes
+from gaps import CME_GAP_THRESHOLD, MIN_GAP_USD, FillIndex, dashboard, detect_gaps, detect_gaps_bars
+from live import Bar, GapHunter
+from resample import Resampler, resample_bars, security
+from rolling_vwap import RollingVWAP, rolling_vwap
+from td_sequential import N_SHAPES, SETUP_LENGTH, setup_counts, td_sequential, td_sequential_bars
+from vwap import (AnchoredVWAP, MODES, TP_SOURCES, anchored_vwap, anchored_vwap_bars, new_period, typical_price,
+                  typical_prices)
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+NEW_YEAR_2026 = 1767225600  # 2026-01-01 00:00 UTC — yearly anchor resets here
+
+BAND_RTOL = 1e-12            # |(VAH - VWAP) - (VWAP - VAL)| / VWAP in the export
+ENGINE_RTOL = 1e-9           # batch vs incremental vs Welford
+BACKSOLVE_MAX_VWAP_ERR = 35.0    # replay max |dVWAP| on the 2025 window (32.91)
+BACKSOLVE_MAX_VAH_ERR = 55.0     # replay max |dVAH| (53.61)
+BAR1_SOURCE = "close"        # closest TP source to the 2026 bar-1 VWAP
+CS9_MIN_F1 = 0.31            # best count-rule variant vs s0..s15 (0.3125)
+NAIVE_SERIES = (4000, 3600)  # (bars, interval): ~170 daily periods
+ROLLING_YEARS = 0.4          # ~210k synthetic minute bars
+ROLLING_SD_RTOL = 1e-6       # batch vs incremental rolling SD, relative to the median SD
+SHARD_SERIES = ((6000, 4 * 3600), (1500, DAY))   # (bars, interval): ~3.8 and ~5.7 years
+SHARD_CONFIGS = (("month", "year", "naive"), ("week", "quarter", "welford"), ("year", "month", "naive"))
+SHARD_WORKERS = 3
+CACHE_SERIES = (20000, 3600)   # (bars, interval) for the cache round trip
+CACHE_DISK_FRACTION = 0.4      # shrunk disk budget, as a share of the filled tier
+GAP_REPLAY_SERIES = (20000, 4 * 3600)   # (bars, interval): ~9 years of H4, some hundred gaps
+GAP_REPLAY_STEP = 97                    # compare the dashboards every this many bars
+RESAMPLER_SERIES = (3000, 3600)         # (bars, interval): ~4 months of H1
+RESAMPLER_CUTS = (1, 2, 5, 41, 300, 1000)   # append boundaries, starting with a lone bar
+
+
+# ─────────────────────────────────────────────────────────────
+# data_vwap.csv
+# ─────────────────────────────────────────────────────────────
+def _close(a, b, rtol):
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    return bool(np.all(np.abs(a - b) <= rtol * np.maximum(np.abs(b), 1.0)))
+
+
+def check_vwap_bands(bars):
+    """Exported VAH and VAL sit symmetrically about the VWAP on every row."""
+    vwap, vah, val = bars[VWAP_COL], bars[VAH_COL], bars[VAL_COL]
+    skew = np.abs((vah - vwap) - (vwap - val)) / vwap
+    assert skew.max() <= BAND_RTOL, f"asymmetric band at row {int(np.argmax(skew))}"
+
+
+def check_year_reset(bars):
+    """The yearly anchor resets at 2026-01-01; SD is 0 on that bar everywhere."""
+    resets = np.flatnonzero(new_period(bars.time, "year"))
+    first = int(np.searchsorted(bars.time, NEW_YEAR_2026))
+    assert resets.tolist() == [0, first], f"year resets at {resets.tolist()}, expected [0, {first}]"
+    assert bars[VAH_COL][first] == bars[VWAP_COL][first] == bars[VAL_COL][first], \
+        "exported SD is not 0 on the first bar of 2026"
+    sources = sorted(TP_SOURCES)
+    tps = typical_prices(bars, sources)
+    for mode in MODES:
+        res = anchored_vwap(tps, bars.volume, new_period(bars.time, "year"), mode)
+        for k, src in enumerate(sources):
+            assert res.sd[k, first] == 0.0, f"{mode}/{src}: SD {res.sd[k, first]} on the reset bar"
+            assert _close(res.vwap[k, first], tps[k, first], ENGINE_RTOL), \
+                f"{mode}/{src}: VWAP on the reset bar is not its typical price"
+
+
+def check_engines(bars):
+    """Batch naive/Welford, bar-by-bar and rolling engines agree on the export."""
+    tp = typical_price(bars, "hlc3")
+    resets = new_period(bars.time, "year")
+    naive = anchored_vwap(tp, bars.volume, resets, "naive")
+    welford = anchored_vwap(tp, bars.volume, resets, "welford")
+    assert _close(naive.vwap, welford.vwap, ENGINE_RTOL), "naive vs welford VWAP"
+    assert _close(naive.sd, welford.sd, ENGINE_RTOL * 1e3), "naive vs welford SD"
+    rows = list(zip(bars.time, bars.open, bars.high, bars.low, bars.close, bars.volume))
+    for mode, ref in (("naive", naive), ("welford", welford)):
+        eng = AnchoredVWAP(anchor="year", source="hlc3", mode=mode)
+        got = np.array([eng.update(r) for r in rows])
+        if mode == "naive":
+            # Same sums in the same order as Pine: bit for bit, not just close.
+            assert np.array_equal(got, np.column_stack(ref), equal_nan=True), "AnchoredVWAP/naive not bit-exact"
+        assert _close(got[:, 0], ref.vwap, ENGINE_RTOL), f"AnchoredVWAP/{mode} VWAP"
+        assert _close(got[:, 1], ref.sd, ENGINE_RTOL * 1e3), f"AnchoredVWAP/{mode} SD"
+    for days in (1, 7, 30):
+        ref = rolling_vwap(bars.time, tp, bars.volume, days * DAY)
+        roll = RollingVWAP(days * DAY)
+        got = np.array([roll.update(t, p, v) for t, p, v in zip(bars.time, tp, bars.volume)])
+        assert _close(got[:, 0], ref.vwap, ENGINE_RTOL), f"RollingVWAP {days}d VWAP"
+
+
+def check_backsolve(bars):
+    """The back-solved 2025 prior state replays the export within tolerance."""
+    solved = backsolve_bars(bars.slice_time(end=NEW_YEAR_2026))
+    vwap_err = float(np.nanmax(np.abs(solved.vwap_err)))
+    vah_err = float(np.nanmax(np.abs(solved.vah_err)))
+    assert vwap_err <= BACKSOLVE_MAX_VWAP_ERR, f"replay max |dVWAP| {vwap_err:.4f}"
+    assert vah_err <= BACKSOLVE_MAX_VAH_ERR, f"replay max |dVAH| {vah_err:.4f}"
+
+
+def check_bar1_source(bars):
+    """``BAR1_SOURCE`` is still the closest TP to the exported 2026 bar-1 VWAP."""
+    new_year = bars.slice_time(start=NEW_YEAR_2026)
+    sources = sorted(TP_SOURCES)
+    res = anchored_vwap(typical_prices(new_year, sources), new_year.volume,
+                        new_period(new_year.time, "year"))
+    err = np.abs(res.vwap[:, 1] - new_year[VWAP_COL][1])
+    best = sources[int(np.argmin(err))]
+    assert best == BAR1_SOURCE, f"closest bar-1 source is {best}, expected {BAR1_SOURCE}"
+
+
+# ─────────────────────────────────────────────────────────────
+# data_cs9.csv
+# ─────────────────────────────────────────────────────────────
+def check_cs9_shapes(bars):
+    """
+    One step per bar in the export, at most one setup and one countdown
+    step per bar in every variant, and the best variant's F1 holds.
+    """
+    actual = bars.stack([f"s{j}" for j in range(N_SHAPES)])
+    assert actual.sum(axis=0).max() <= 1, "export flags two shapes on one bar"
+    for variant in variant_grid():
+        pred = variant_shapes(variant, bars.close, bars.high, bars.low)
+        for part in (pred[:SETUP_LENGTH], pred[SETUP_LENGTH:]):
+            assert part.sum(axis=0).max() <= 1, f"{variant} flags two steps of one kind on a bar"
+    for lb in range(1, 6):
+        td = td_sequential(bars.close, bars.high, bars.low, lb, with_countdown=False)
+        buy, sell = setup_counts(bars.close, lb)
+        assert np.array_equal(td.buy, buy) and np.array_equal(td.sell, sell), \
+            f"td_sequential vs setup_counts at lookback {lb}"
+    best = sweep(bars, workers=1)[0]
+    assert best["f1"] >= CS9_MIN_F1, f"best variant F1 {best['f1']:.4f} < {CS9_MIN_F1}"
+
+
+# ─────────────────────────────────────────────────────────────
+# CME gaps
+# ─────────────────────────────────────────────────────────────
+def check_cme_gaps():
+    """Exactly the closure gaps are detected; the size-only rule over-fires."""
+    time, open_, prev = cme_arrays()
+    found = {CME_BARS[i][3] for i in detect_gaps(time, open_, prev, CME_GAP_THRESHOLD, MIN_GAP_USD).index}
+    assert found == EXPECTED_CME_GAPS, f"detected {sorted(found)}"
+    size_only = {b[3] for b in CME_BARS[1:] if abs(b[2] - b[1]) >= MIN_GAP_USD}
+    assert size_only - EXPECTED_CME_GAPS, "size-only rule no longer shows a false positive"
+
+
+# ─────────────────────────────────────────────────────────────
+# Synthetic series
+# ─────────────────────────────────────────────────────────────
+def check_naive_bit_exact():
+    """Batch "naive" VWAP/SD equal the scalar engine bit for bit over many periods."""
+    n, interval = NAIVE_SERIES
+    bars = BarStore(next(synthetic_chunks(n, interval=interval)))
+    ref = anchored_vwap(typical_price(bars, "hlc3"), bars.volume, new_period(bars.time, "day"))
+    eng = AnchoredVWAP(anchor="day", source="hlc3")
+    rows = zip(*(bars[c].tolist() for c in ("time", "open", "high", "low", "close", "volume")))
+    got = np.array([eng.update(r) for r in rows])
+    bad = int(np.count_nonzero(got[:, 1] != ref.sd))
+    assert np.array_equal(got[:, 0], ref.vwap), "batch vs scalar VWAP"
+    assert not bad, f"batch vs scalar SD differs on {bad} of {n} bars"
+
+
+def check_rolling_long():
+    """Batch and incremental rolling VWAP/SD agree over a long minute series."""
+    time, tp, volume = synthetic_minutes(ROLLING_YEARS)
+    for window in (3600, DAY):
+        ref = rolling_vwap(time, tp, volume, window)
+        roll = RollingVWAP(window)
+        got = np.array([roll.update(t, p, v) for t, p, v in zip(time.tolist(), tp.tolist(), volume.tolist())])
+        assert _close(got[:, 0], ref.vwap, ENGINE_RTOL), f"rolling {window}s VWAP"
+        sd_err = float(np.max(np.abs(got[:, 1] - ref.sd)))
+        assert sd_err <= ROLLING_SD_RTOL * float(np.median(ref.sd)), f"rolling {window}s SD off by {sd_err:.3g}"
+
+
+def check_shards_match_sequential():
+    """Sharded runs over multi-year series equal one sequential pass per series."""
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [write_csv(os.path.join(tmp, f"synthetic_{k}.csv"), n, seed=k, interval=interval)
+                 for k, (n, interval) in enumerate(SHARD_SERIES)]
+        for shard, anchor, mode in SHARD_CONFIGS:
+            params = shards.Params(("hlc3", "close"), anchor, mode, (1, 4))
+            out_dir = os.path.join(tmp, f"{shard}_{anchor}")
+            shards.run(paths, out_dir, params, shard, SHARD_WORKERS)
+            bad = shards.verify(out_dir, params)
+            assert not bad, f"shard={shard} anchor={anchor}: {', '.join(bad)}"
+
+
+def _same(a, b):
+    """Bitwise equality of (nested) cache values, NaN equal to NaN."""
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        a, b = np.asarray(a), np.asarray(b)
+        return a.dtype == b.dtype and np.array_equal(a, b, equal_nan=a.dtype.kind == "f")
+    if isinstance(a, BarStore):
+        return isinstance(b, BarStore) and a.columns == b.columns and all(_same(a[c], b[c]) for c in a.columns)
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(_same(a[k], b[k]) for k in a)
+    if isinstance(a, (tuple, list)):
+        return type(a) is type(b) and len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def _cache_results(bars, results=None):
+    """Every cached wrapper over ``bars``; ``results=None`` computes directly."""
+    sources = sorted(TP_SOURCES)
+    out = {}
+    if results is None:
+        for mode in MODES:
+            out[mode] = anchored_vwap_bars(bars, sources, "month", mode)
+        out["tp"] = typical_prices(bars, sources)
+        out["daily"] = resample_bars(bars, "D")
+        out["td"] = td_sequential_bars(out["daily"], lookback=4)
+        out["gaps"] = detect_gaps_bars(resample_bars(bars, "240"))
+        return out
+    for mode in MODES:
+        out[mode] = cache.anchored_vwap_bars(bars, sources, "month", mode, results)
+    out["tp"] = cache.typical_prices(bars, sources, results)
+    out["daily"] = cache.resample_bars(bars, "D", results)
+    out["td"] = cache.td_sequential_bars(out["daily"], results, lookback=4)
+    out["gaps"] = cache.detect_gaps_bars(cache.resample_bars(bars, "240", results), cache=results)
+    return out
+
+
+def check_cache_roundtrip():
+    """Cache hits equal a fresh computation; a shrunk disk tier fits its budget."""
+    n, interval = CACHE_SERIES
+    bars = BarStore(next(synthetic_chunks(n, interval=interval)))
+    ref = _cache_results(bars)
+    with tempfile.TemporaryDirectory() as tmp:
+        fill = cache.ResultCache(tmp)
+        assert _same(_cache_results(bars, fill), ref), "computing run differs from uncached"
+        again = cache.ResultCache(tmp)
+        assert _same(_cache_results(bars, again), ref), "disk hits differ from uncached"
+        assert _same(_cache_results(bars, again), ref), "memory hits differ from uncached"
+        assert again.stats["miss"] == 0, f"{again.stats['miss']} misses after the cache was filled"
+        budget = int(again.disk.nbytes * CACHE_DISK_FRACTION)
+        cache.ResultCache(tmp, disk_bytes=budget)
+        total = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(tmp) for f in files)
+        assert 0 < total <= budget, f"disk tier holds {total} bytes, budget {budget}"
+
+
+def check_gap_replay():
+    """The batch Gap-Hunter dashboard at bar j equals the live one fed bars 0..j."""
+    n, interval = GAP_REPLAY_SERIES
+    bars = BarStore(next(synthetic_chunks(n, interval=interval)))
+    gaps = detect_gaps_bars(bars)
+    index = FillIndex.from_bars(bars)
+    fills = index.resolve(gaps)
+    hunter = GapHunter()
+    cols = [bars[c].tolist() for c in ("time", "open", "high", "low", "close", "volume")]
+    for j, row in enumerate(zip(*cols)):
+        live = hunter.on_bar(Bar("SYN", *row))
+        if j % GAP_REPLAY_STEP == 0:
+            batch = dashboard(gaps, index.state_at(gaps, fills, j), bars.close[j])
+            assert batch == live, f"bar {j}: batch dashboard {batch}, live {live}"
+
+
+def check_resampler_appends():
+    """A Resampler fed in pieces, the first a single bar, equals one-shot ``security``."""
+    n, interval = RESAMPLER_SERIES
+    bars = BarStore(next(synthetic_chunks(n, interval=interval)))
+    live = Resampler()
+    cuts = (0,) + RESAMPLER_CUTS + (n,)
+    for lo, hi in zip(cuts, cuts[1:]):
+        live.append({name: bars[name][lo:hi] for name in ("time", "open", "high", "low", "close", "volume")})
+    assert live.interval == interval, f"inferred interval {live.interval}, bars are {interval}"
+    for tf in live.timeframes:
+        assert np.array_equal(live.security(tf), security(bars, tf), equal_nan=True), f"{tf}: appended security differs"
+
+
+# ─────────────────────────────────────────────────────────────
+# Runner
+# ─────────────────────────────────────────────────────────────
+VWAP_CHECKS = (check_vwap_bands, check_year_reset, check_engines, check_backsolve, check_bar1_source)
+CS9_CHECKS = (check_cs9_shapes,)
+SYNTHETIC_CHECKS = (check_cme_gaps, check_naive_bit_exact, check_rolling_long, check_shards_match_sequential, check_cache_roundtrip,
+                    check_gap_replay, check_resampler_appends)
+
+
+def run_checks(data_dir=REPO_DIR):
+    """``{check name: None if it passed, else the failure message}``."""
+    vwap_bars = BarStore.from_csv(os.path.join(data_dir, "data_vwap.csv"))
+    cs9_bars = BarStore.from_csv(os.path.join(data_dir, "data_cs9.csv"))
+    calls = [(f, (vwap_bars,)) for f in VWAP_CHECKS]
+    calls += [(f, (cs9_bars,)) for f in CS9_CHECKS]
+    calls += [(f, ()) for f in SYNTHETIC_CHECKS]
+    out = {}
+    for fn, args in calls:
+        try:
+            fn(*args)
+            out[fn.__name__] = None
+        except AssertionError as e:
+            out[fn.__name__] = str(e) or "assertion failed"
+    return out
+
+
+def format_checks(results):
+    return "\n".join(f"  {'ok  ' if msg is None else 'FAIL'}  {name}" + ("" if msg is None else f": {msg}")
+                     for name, msg in results.items())
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Assert the backtest findings against the exports.")
+    ap.add_argument("--data-dir", default=REPO_DIR)
+    args = ap.parse_args(argv)
+    results = run_checks(args.data_dir)
+    print(format_checks(results))
+    failed = sum(msg is not None for msg in results.values())
+    print(f"{len(results) - failed}/{len(results)} checks passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
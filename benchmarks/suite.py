@@ -0,0 +1,214 @@
+"""
+Throughput, memory and allocation benchmarks for the ported indicators.
+
+Synthetic BTC-like 1-minute bars (lognormal volume, a random-walk price
+around 100k, CME-style weekend closures so gap detection has gaps to find)
+from ``benchmarks.synthetic`` are generated chunk by chunk straight into per-column binary files in the
+``ingest`` cache layout, so the 1e8-bar tier is never held in memory while
+it is built, and every case memory-maps the same files.
+
+Each (indicator, size) case runs in a fresh process so its numbers are its
+own: one run under ``tracemalloc`` (NumPy reports its buffers to it) gives
+the allocation high-water mark, then the best of ``--repeat`` untraced runs
+gives bars/s, and ``ru_maxrss`` gives the process's peak RSS (memory-mapped
+input pages included).  The correctness checks of ``benchmarks.checks``
+run first.
+
+Results are written as JSON.  ``--compare base.json`` exits with status 1
+when a case is slower, or peaks higher in RSS or allocations, than the
+baseline by more than ``--threshold`` (or when a check fails).  The 1e8
+tier needs ~5 GB of disk for the bars and several times that in RAM for
+the full-series indicators, so it only runs when asked for.
+
+    python -m benchmarks.suite [--sizes 1e4 1e6 1e8] [--only rolling_vwap ...]
+                               [--out bench.json] [--compare base.json] [--threshold 0.15]
+    python -m benchmarks.suite --results bench.json --compare base.json
+"""
+import argparse
+import concurrent.futures
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import ingest
+from bars import BarStore
+from benchmarks.checks import format_checks, run_checks
+from benchmarks.synthetic import DEFAULT_WORKDIR, synthetic_store
+from gaps import FillIndex, detect_gaps_bars
+from rolling_vwap import rolling_vwap_bars
+from td_sequential import shape_columns, td_sequential_bars
+from volume_profile import Histogram, hvn
+from vwap import anchored_vwap_bars
+
+SIZES = (10 ** 4, 10 ** 6, 10 ** 8)
+DEFAULT_SIZES = SIZES[:2]
+DEFAULT_THRESHOLD = 0.15
+RESULTS_VERSION = 1
+
+
+# ─────────────────────────────────────────────────────────────
+# Cases
+# ─────────────────────────────────────────────────────────────
+def _gaps(bars):
+    gaps = detect_gaps_bars(bars)
+    return FillIndex.from_bars(bars).resolve(gaps)
+
+
+CASES = {
+    "anchored_vwap": lambda bars: anchored_vwap_bars(bars, ("hlc3",), "day", "naive"),
+    "anchored_vwap_welford": lambda bars: anchored_vwap_bars(bars, ("hlc3",), "day", "welford"),
+    "rolling_vwap": lambda bars: rolling_vwap_bars(bars, 1),
+    "td_sequential": lambda bars: shape_columns(td_sequential_bars(bars)),
+    "gaps": _gaps,
+    "volume_profile": lambda bars: hvn(Histogram.from_bars(bars.high, bars.low, bars.volume), top=20),
+}
+
+
+def _max_rss():
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def run_case(name, cache_dir, manifest, repeat=3):
+    """Measure one case in this process; returns its result dict."""
+    fn = CASES[name]
+    bars = BarStore(ingest.open_cache(cache_dir, manifest))
+    rss_base = _max_rss()
+    tracemalloc.start()
+    fn(bars)
+    alloc_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(bars)
+        best = min(best, time.perf_counter() - t0)
+    n = len(bars)
+    return {"case": name, "bars": n, "seconds": best, "bars_per_sec": n / best if best > 0 else float("inf"),
+            "peak_rss": _max_rss(), "rss_base": rss_base, "alloc_peak": alloc_peak}
+
+
+def run_suite(sizes=DEFAULT_SIZES, cases=None, repeat=3, seed=7, workdir=DEFAULT_WORKDIR, progress=print):
+    """Every case at every size, each in a fresh spawned process."""
+    cases = list(CASES) if cases is None else list(cases)
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        raise ValueError(f"unknown cases {unknown}; expected some of {list(CASES)}")
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for n in sizes:
+        cache_dir, manifest = synthetic_store(n, seed, workdir)
+        for name in cases:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                res = pool.submit(run_case, name, cache_dir, manifest, repeat).result()
+            results.append(res)
+            if progress:
+                progress(format_result(res))
+    return results
+
+
+# ─────────────────────────────────────────────────────────────
+# Reporting and comparison
+# ─────────────────────────────────────────────────────────────
+def _mib(b):
+    return b / (1 << 20)
+
+
+def format_result(r):
+    return (f"{r['case']:22s} {r['bars']:>12,d} {r['seconds']:10.4f}s {r['bars_per_sec']:14,.0f} "
+            f"{_mib(r['peak_rss']):10.1f} {_mib(r['alloc_peak']):10.1f}")
+
+
+HEADER = f"{'case':22s} {'bars':>12s} {'best':>11s} {'bars/s':>14s} {'RSS MiB':>10s} {'alloc MiB':>10s}"
+
+
+def platform_info():
+    return {"python": platform.python_version(), "numpy": np.__version__,
+            "machine": platform.machine(), "system": platform.system(),
+            "cpus": os.cpu_count()}
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Regressions of ``results`` against ``baseline`` (both lists of result
+    dicts) as readable strings; cases missing from either side are skipped.
+    """
+    base = {(r["case"], r["bars"]): r for r in baseline}
+    out = []
+    for r in results:
+        b = base.get((r["case"], r["bars"]))
+        if b is None:
+            continue
+        key = f"{r['case']}@{r['bars']:,}"
+        if r["bars_per_sec"] < b["bars_per_sec"] * (1 - threshold):
+            out.append(f"{key}: {r['bars_per_sec']:,.0f} bars/s vs {b['bars_per_sec']:,.0f}")
+        for metric in ("peak_rss", "alloc_peak"):
+            if r[metric] > b[metric] * (1 + threshold):
+                out.append(f"{key}: {metric} {_mib(r[metric]):.1f} MiB vs {_mib(b[metric]):.1f} MiB")
+    return out
+
+
+def _load_results(path):
+    with open(path) as f:
+        doc = json.load(f)
+    if doc.get("version") != RESULTS_VERSION:
+        raise ValueError(f"{path}: results version {doc.get('version')!r}, expected {RESULTS_VERSION}")
+    return doc
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--sizes", type=float, nargs="+", default=list(DEFAULT_SIZES),
+                    help=f"bar counts (tiers: {', '.join(f'{s:.0e}' for s in SIZES)})")
+    ap.add_argument("--only", nargs="+", choices=list(CASES), help="cases to run (default: all)")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--workdir", default=DEFAULT_WORKDIR, help="where the synthetic bars are cached")
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--results", help="compare an existing results JSON instead of running")
+    ap.add_argument("--compare", metavar="BASELINE", help="fail on regression against this results JSON")
+    ap.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                    help="allowed relative regression (default %(default)s)")
+    ap.add_argument("--skip-checks", action="store_true")
+    args = ap.parse_args(argv)
+
+    failed = False
+    if args.results:
+        doc = _load_results(args.results)
+    else:
+        checks = {} if args.skip_checks else run_checks()
+        if checks:
+            print("checks:")
+            print(format_checks(checks))
+            failed = any(msg is not None for msg in checks.values())
+        print()
+        print(HEADER)
+        results = run_suite([int(s) for s in args.sizes], args.only, args.repeat, args.seed, args.workdir)
+        doc = {"version": RESULTS_VERSION,
+               "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+               "platform": platform_info(), "seed": args.seed, "repeat": args.repeat,
+               "checks": checks, "results": results}
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(doc, f, indent=1)
+
+    if args.compare:
+        regressions = compare(doc["results"], _load_results(args.compare)["results"], args.threshold)
+        print(f"\n{len(regressions)} regression(s) past {args.threshold:.0%} vs {args.compare}")
+        for line in regressions:
+            print(f"  {line}")
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
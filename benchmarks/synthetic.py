@@ -0,0 +1,95 @@
+"""
+Synthetic BTC-like bars for the benchmarks and checks.
+
+Lognormal volume, a random-walk price around 100k and CME-style weekend
+closures (five trading days on, two closed) so gap detection has gaps to
+find.  Bars come out chunk by chunk, so ``synthetic_store`` can write the
+1e8-bar benchmark tier straight into the ``ingest`` cache layout without
+holding it in memory; ``write_csv`` writes a small series as a
+TradingView-style export for code that takes paths.
+"""
+import json
+import os
+import tempfile
+
+import numpy as np
+
+import ingest
+from bars import CORE_COLUMNS
+
+MINUTE = 60
+DAY = 86400
+START = 1420416000        # Mon 2015-01-05 00:00 UTC
+GEN_CHUNK = 1 << 22
+DEFAULT_WORKDIR = os.path.join(tempfile.gettempdir(), "indicator-bench")
+
+
+def trading_times(index, interval=MINUTE, start=START):
+    """Open time of trading bar ``index``: five days on, a two-day closure."""
+    t = interval * np.asarray(index, dtype=np.float64)
+    return start + t + 2 * DAY * np.floor(t / (5 * DAY))
+
+
+def synthetic_chunks(n, seed=7, interval=MINUTE, chunk=GEN_CHUNK):
+    """Yield ``{column: array}`` chunks of ``n`` synthetic bars in order."""
+    rng = np.random.default_rng(seed)
+    # Scale the per-bar volatility so the whole walk spans about e^(+/-1)
+    # of the start price at any size; profiles then stay a sane width.
+    sigma = min(0.0008, 0.5 / np.sqrt(max(n, 1)))
+    logp, prev_close, prev_t = 0.0, 100_000.0, None
+    for lo in range(0, n, chunk):
+        m = min(chunk, n - lo)
+        t = trading_times(np.arange(lo, lo + m), interval)
+        path = logp + np.cumsum(rng.normal(0.0, sigma, m))
+        close = 100_000.0 * np.exp(path)
+        open_ = np.concatenate([[prev_close], close[:-1]])
+        # Bars after a closure open away from the previous close.
+        reopen = np.diff(t, prepend=t[0] if prev_t is None else prev_t) > interval
+        open_[reopen] *= 1.0 + rng.normal(0.0, 0.01, int(np.count_nonzero(reopen)))
+        spread = close * np.abs(rng.normal(0.0, 0.0005, (2, m)))
+        yield {"time": t, "open": open_,
+               "high": np.maximum(open_, close) + spread[0],
+               "low": np.minimum(open_, close) - spread[1],
+               "close": close, "volume": rng.lognormal(2.0, 1.2, m)}
+        logp, prev_close, prev_t = path[-1], close[-1], t[-1]
+
+
+def synthetic_store(n, seed=7, workdir=DEFAULT_WORKDIR, interval=MINUTE):
+    """
+    Directory of ``n`` synthetic bars in the ingest cache layout, generated
+    on first use; returns ``(cache_dir, manifest)`` for ``ingest.open_cache``.
+    """
+    cache_dir = os.path.join(workdir, f"bars_{n}_{seed}_{interval}")
+    source = {"synthetic": n, "seed": seed, "interval": interval}
+    path = os.path.join(cache_dir, "manifest.json")
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest.get("version") == ingest.MANIFEST_VERSION and manifest.get("source") == source:
+            return cache_dir, manifest
+    except (OSError, ValueError):
+        pass
+    os.makedirs(cache_dir, exist_ok=True)
+    columns = [{"name": c, "file": f"{c}.bin", "dtype": np.dtype(np.float64).str} for c in CORE_COLUMNS]
+    handles = {c["name"]: open(os.path.join(cache_dir, c["file"]), "wb") for c in columns}
+    try:
+        for part in synthetic_chunks(n, seed, interval):
+            for name, fh in handles.items():
+                part[name].tofile(fh)
+    finally:
+        for fh in handles.values():
+            fh.close()
+    manifest = {"version": ingest.MANIFEST_VERSION, "source": source, "rows": n, "columns": columns}
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + ".tmp", path)
+    return cache_dir, manifest
+
+
+def write_csv(path, n, seed=7, interval=MINUTE):
+    """Write ``n`` synthetic bars as a ``time,open,high,low,close,Volume`` export."""
+    with open(path, "w") as f:
+        f.write("time,open,high,low,close,Volume\n")
+        for part in synthetic_chunks(n, seed, interval):
+            np.savetxt(f, np.column_stack([part[c] for c in CORE_COLUMNS]), delimiter=",", fmt="%.17g")
+    return path
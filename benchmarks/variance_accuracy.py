@@ -0,0 +1,105 @@
+"""
+Accuracy and throughput of the naive vs compensated VWAP variance.
+
+Generates ten-plus years of synthetic 1-minute BTC-like bars (price around
+100k, heavy-tailed volume), runs the yearly anchored VWAP in both modes and
+compares SD against an extended-precision reference.
+
+    python -m benchmarks.variance_accuracy [--years 12] [--scalar]
+
+``--scalar`` also times the bar-by-bar AnchoredVWAP engine (slow: pure
+Python over every bar).
+"""
+import argparse
+import time
+
+import numpy as np
+
+import vwap
+
+MINUTE = 60
+
+
+def synthetic_minutes(years, seed=7, start=1420070400, price=100_000.0):
+    """(time, tp, volume) for ``years`` of 1-minute bars from 2015-01-01."""
+    rng = np.random.default_rng(seed)
+    n = int(years * 365.25 * 1440)
+    t = start + MINUTE * np.arange(n, dtype=np.float64)
+    logret = rng.normal(0.0, 0.0008, n)
+    tp = price * np.exp(np.cumsum(logret) - np.cumsum(logret).mean())
+    vol = rng.lognormal(mean=2.0, sigma=1.2, size=n)
+    return t, tp, vol
+
+
+def reference_sd(tp, vol, resets):
+    """SD from shifted moments accumulated in extended precision."""
+    ld = np.longdouble
+    tp, vol = tp.astype(ld), vol.astype(ld)
+    starts = vwap.segment_starts(resets)
+    d = tp - tp[starts]
+    out = np.empty(len(tp), dtype=ld)
+    bounds = np.flatnonzero(resets).tolist() + [len(tp)]
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        w = np.cumsum(vol[a:b])
+        s1 = np.cumsum(vol[a:b] * d[a:b])
+        s2 = np.cumsum(vol[a:b] * d[a:b] * d[a:b])
+        out[a:b] = np.sqrt(np.maximum(s2 / w - (s1 / w) ** 2, 0))
+    return out.astype(np.float64)
+
+
+def error_stats(sd, ref):
+    rel = np.abs(sd - ref) / np.maximum(ref, 1e-12)
+    return {"max_rel": float(np.max(rel)), "median_rel": float(np.median(rel)),
+            "p99_rel": float(np.quantile(rel, 0.99))}
+
+
+def run(years=12.0, anchor="year", scalar=False):
+    t, tp, vol = synthetic_minutes(years)
+    n = len(t)
+    resets = vwap.new_period(t, anchor)
+    print(f"{n:,} bars ({years:g} years of 1-minute data), anchor={anchor}")
+    if np.finfo(np.longdouble).eps >= np.finfo(np.float64).eps:
+        print("warning: long double is float64 on this platform; reference is not extended")
+    ref = reference_sd(tp, vol, resets)
+
+    # Skip the first hour of each period, where the SD is still ~0 and
+    # relative error is meaningless.
+    settled = np.ones(n, dtype=bool)
+    for s in np.flatnonzero(resets):
+        settled[s:s + 60] = False
+
+    naive_neg = vwap.segmented_cumsum(tp * tp * vol, resets) / vwap.segmented_cumsum(vol, resets) \
+        - (vwap.segmented_cumsum(tp * vol, resets) / vwap.segmented_cumsum(vol, resets)) ** 2
+    print(f"naive raw variance < 0 on {int(np.count_nonzero(naive_neg < 0)):,} bars (clamped to 0)")
+
+    print(f"\n{'engine':18s} {'bars/s':>14s} {'max rel err':>12s} {'p99 rel err':>12s} {'median':>12s}")
+    for mode in vwap.MODES:
+        t0 = time.perf_counter()
+        res = vwap.anchored_vwap(tp, vol, resets, mode=mode)
+        dt = time.perf_counter() - t0
+        st = error_stats(res.sd[settled], ref[settled])
+        print(f"batch/{mode:12s} {n / dt:14,.0f} {st['max_rel']:12.3e} {st['p99_rel']:12.3e} {st['median_rel']:12.3e}")
+
+    if scalar:
+        for mode in vwap.MODES:
+            eng = vwap.AnchoredVWAP(anchor=anchor, source="close", mode=mode)
+            sd = np.empty(n)
+            t0 = time.perf_counter()
+            for i in range(n):
+                sd[i] = eng.update((t[i], 0.0, 0.0, 0.0, tp[i], vol[i]))[1]
+            dt = time.perf_counter() - t0
+            st = error_stats(sd[settled], ref[settled])
+            print(f"scalar/{mode:11s} {n / dt:14,.0f} {st['max_rel']:12.3e} {st['p99_rel']:12.3e} {st['median_rel']:12.3e}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--years", type=float, default=12.0)
+    ap.add_argument("--anchor", default="year", choices=vwap.ANCHORS)
+    ap.add_argument("--scalar", action="store_true", help="also time the bar-by-bar engine")
+    args = ap.parse_args(argv)
+    run(args.years, args.anchor, args.scalar)
+
+
+if __name__ == "__main__":
+    main()
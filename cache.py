@@ -0,0 +1,522 @@
+"""
+Content-addressed cache for indicator outputs and shared intermediates.
+
+Every entry is keyed by a hash of
+
+    (bar-data fingerprint, indicator name, parameters, code version)
+
+so a result is reused only for the same bars, the same settings and the
+same source code.  The code version hashes this file, the computing
+module and every first-party module that module references at module
+level (``import vwap``, ``from bars import BarStore``), transitively:
+editing bars.py invalidates the resampled-bar and gap entries (resample.py
+and gaps.py use it) but not the VWAP ones, and editing gaps.py touches
+only the gap entries.  Imports made inside functions are not followed.
+
+The fingerprint is a BLAKE2b digest of a BarStore's column bytes,
+computed once per store; stores derived through the cache (resampled
+timeframes) get a fingerprint composed from their parent's, without
+rehashing.
+
+Two tiers:
+
+  memory   an LRU of encoded entries (read-only arrays plus a small JSON-able
+           description), bounded by total array bytes
+  disk     optional; one directory per entry holding ``.npy`` files (opened
+           memory-mapped on a hit, so a 1e8-bar series is not read until it
+           is touched) and a small JSON manifest.  Least recently used
+           entries are evicted once the directory grows past its byte budget.
+
+Values may be arrays, BarStores, (named)tuples, lists and str-keyed dicts
+of those, and JSON scalars.  Every hit rebuilds the containers from the
+entry, so a caller may edit the dicts and lists it gets back (a sweep's
+score rows) without touching the cached copy; the arrays inside are shared
+and read-only, so a caller that wants to modify one must copy it first.
+
+The indicator wrappers below cache at the granularity that sweeps overlap
+on: typical prices and anchored VWAP per source, period resets and
+cumulative volume per anchor (shared by every source), resampled bars per
+timeframe.  ``cs9_sweep.sweep`` caches one score row per variant.
+
+Environment (read by ``default_cache``):
+
+    INDICATOR_CACHE_DIR=.indicator_cache   enable the disk tier there
+    INDICATOR_CACHE_MEMORY_MB=512          memory tier budget
+    INDICATOR_CACHE_DISK_MB=4096           disk tier budget
+"""
+import collections
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import types
+import weakref
+
+import numpy as np
+
+import gaps
+import resample
+import td_sequential
+import vwap
+from bars import BarStore
+
+DEFAULT_MEMORY_BYTES = 512 << 20
+DEFAULT_DISK_BYTES = 4096 << 20
+
+ENV_DIR = "INDICATOR_CACHE_DIR"
+ENV_MEMORY_MB = "INDICATOR_CACHE_MEMORY_MB"
+ENV_DISK_MB = "INDICATOR_CACHE_DISK_MB"
+
+_MANIFEST = "entry.json"
+_SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_fingerprints = weakref.WeakKeyDictionary()
+_code_versions = {}
+_default = None
+
+
+# ─────────────────────────────────────────────────────────────
+# Keys
+# ─────────────────────────────────────────────────────────────
+def _digest():
+    return hashlib.blake2b(digest_size=16)
+
+
+def _hash_array(h, values):
+    values = np.ascontiguousarray(values)
+    h.update(f"{values.dtype.str}{values.shape}".encode())
+    h.update(memoryview(values).cast("B"))
+
+
+def fingerprint(data):
+    """
+    Hex digest of a BarStore's columns (memoised per store), or of an array
+    or tuple/list of arrays.  Stores are assumed not to be modified in
+    place once fingerprinted.
+    """
+    if isinstance(data, BarStore):
+        fp = _fingerprints.get(data)
+        if fp is None:
+            h = _digest()
+            for name in data.columns:
+                h.update(name.encode() + b"\0")
+                _hash_array(h, data[name])
+            fp = _fingerprints[data] = h.hexdigest()
+        return fp
+    h = _digest()
+    for values in (data if isinstance(data, (tuple, list)) else (data,)):
+        _hash_array(h, values)
+    return h.hexdigest()
+
+
+def _first_party(module):
+    path = getattr(module, "__file__", None)
+    return path is not None and os.path.abspath(path).startswith(_SOURCE_DIR + os.sep)
+
+
+def dependencies(*modules):
+    """
+    The modules plus every first-party module they reference at module
+    level (imported modules and the modules of imported names), transitively.
+    """
+    seen = {}
+    stack = list(modules)
+    while stack:
+        module = stack.pop()
+        name = module.__name__
+        if name in seen or not _first_party(module):
+            continue
+        seen[name] = module
+        if module is sys.modules[__name__]:
+            continue        # hashed into every version anyway
+        for value in vars(module).values():
+            if isinstance(value, types.ModuleType):
+                stack.append(value)
+            else:
+                dep = sys.modules.get(getattr(value, "__module__", None) or "")
+                if dep is not None:
+                    stack.append(dep)
+    return seen
+
+
+def code_version(*modules):
+    """Digest of the source of ``dependencies(*modules)`` and of this file."""
+    names = tuple(sorted(m.__name__ for m in modules))
+    version = _code_versions.get(names)
+    if version is None:
+        deps = dependencies(sys.modules[__name__], *modules)
+        h = _digest()
+        for path in sorted(os.path.abspath(m.__file__) for m in deps.values()):
+            h.update(os.path.relpath(path, _SOURCE_DIR).encode() + b"\0")
+            with open(path, "rb") as f:
+                h.update(f.read())
+        version = _code_versions[names] = h.hexdigest()
+    return version
+
+
+def make_key(fp, name, params, version):
+    """Entry key for (data fingerprint, indicator, params, code version)."""
+    blob = json.dumps([fp, name, params, version], sort_keys=True, default=str)
+    return hashlib.blake2b(blob.encode(), digest_size=20).hexdigest()
+
+
+# ─────────────────────────────────────────────────────────────
+# Value encoding (shared by both tiers)
+# ─────────────────────────────────────────────────────────────
+def _freeze(values):
+    # A read-only view: the computing code may have returned one of its
+    # inputs (typical_price(bars, "close") is bars.close), which stays writable.
+    values = np.asarray(values).view()
+    values.flags.writeable = False
+    return values
+
+
+def _encode(value, arrays):
+    """JSON-able description of ``value``; arrays are appended to ``arrays``."""
+    if isinstance(value, np.ndarray):
+        arrays.append(value)
+        return {"array": len(arrays) - 1}
+    if isinstance(value, BarStore):
+        return {"bars": [[name, _encode(value[name], arrays)] for name in value.columns]}
+    if isinstance(value, tuple) and hasattr(value, "_fields"):
+        cls = type(value)
+        return {"namedtuple": f"{cls.__module__}:{cls.__qualname__}",
+                "items": [_encode(v, arrays) for v in value]}
+    if isinstance(value, (tuple, list)):
+        return {"tuple" if isinstance(value, tuple) else "list": [_encode(v, arrays) for v in value]}
+    if isinstance(value, dict):
+        if not all(isinstance(k, str) for k in value):
+            raise TypeError("cached dicts must have str keys")
+        return {"dict": [[k, _encode(v, arrays)] for k, v in value.items()]}
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return {"value": value}
+    raise TypeError(f"cannot cache a {type(value).__name__}")
+
+
+def _decode(spec, arrays):
+    if "array" in spec:
+        return arrays[spec["array"]]
+    if "bars" in spec:
+        return BarStore({name: _decode(s, arrays) for name, s in spec["bars"]})
+    if "namedtuple" in spec:
+        module, qualname = spec["namedtuple"].split(":")
+        cls = importlib.import_module(module)
+        for part in qualname.split("."):
+            cls = getattr(cls, part)
+        return cls(*(_decode(s, arrays) for s in spec["items"]))
+    if "tuple" in spec:
+        return tuple(_decode(s, arrays) for s in spec["tuple"])
+    if "list" in spec:
+        return [_decode(s, arrays) for s in spec["list"]]
+    if "dict" in spec:
+        return {k: _decode(s, arrays) for k, s in spec["dict"]}
+    return spec["value"]
+
+
+def _pack(value):
+    """``(spec, read-only arrays, array bytes)`` entry for ``value``."""
+    arrays = []
+    spec = _encode(value, arrays)
+    arrays = [_freeze(a) for a in arrays]
+    return spec, arrays, sum(a.nbytes for a in arrays)
+
+
+# ─────────────────────────────────────────────────────────────
+# Tiers
+# ─────────────────────────────────────────────────────────────
+class MemoryTier:
+    """LRU of ``(spec, arrays, nbytes)`` entries bounded by total array bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)[2]
+        nbytes = entry[2]
+        if nbytes > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes:
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self.nbytes -= size
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+
+class DiskTier:
+    """
+    Entries as ``<dir>/<key[:2]>/<key>/`` directories of ``.npy`` files plus
+    a JSON manifest; hits are memory-mapped and refresh the entry's mtime,
+    which is the LRU clock for eviction.  Entries are written to a temporary
+    directory and renamed into place, so readers never see a partial one.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_DISK_BYTES):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self.nbytes = sum(size for _, size, _ in self._scan())
+        if self.nbytes > self.max_bytes:
+            self.evict()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _scan(self):
+        """``(mtime, bytes, path)`` of every complete entry."""
+        out = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir() or shard.name.startswith("."):
+                continue
+            for entry in os.scandir(shard.path):
+                manifest = os.path.join(entry.path, _MANIFEST)
+                try:
+                    mtime = os.stat(manifest).st_mtime
+                except FileNotFoundError:
+                    continue
+                size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                out.append((mtime, size, entry.path))
+        return out
+
+    def get(self, key):
+        path = self._path(key)
+        manifest = os.path.join(path, _MANIFEST)
+        try:
+            with open(manifest) as f:
+                meta = json.load(f)
+            arrays = [np.load(os.path.join(path, f"{i}.npy"), mmap_mode="r")
+                      for i in range(meta["arrays"])]
+        except (FileNotFoundError, ValueError):
+            return None
+        os.utime(manifest)
+        return meta["spec"], arrays, meta["nbytes"]
+
+    def put(self, key, entry):
+        spec, arrays, nbytes = entry
+        path = self._path(key)
+        if os.path.exists(os.path.join(path, _MANIFEST)):
+            return
+        if nbytes > self.max_bytes:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=self.directory)
+        try:
+            for i, values in enumerate(arrays):
+                np.save(os.path.join(tmp, f"{i}.npy"), np.ascontiguousarray(values))
+            with open(os.path.join(tmp, _MANIFEST), "w") as f:
+                json.dump({"spec": spec, "arrays": len(arrays), "nbytes": nbytes}, f)
+            written = sum(f.stat().st_size for f in os.scandir(tmp))
+            os.replace(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.exists(os.path.join(path, _MANIFEST)):
+                raise
+            return
+        self.nbytes += written
+        if self.nbytes > self.max_bytes:
+            self.evict()
+
+    def evict(self, max_bytes=None):
+        """Drop least recently used entries until under ``max_bytes``."""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self._scan())
+        self.nbytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.nbytes <= limit:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            self.nbytes -= size
+
+    def clear(self):
+        self.evict(0)
+
+
+# ─────────────────────────────────────────────────────────────
+# Cache
+# ─────────────────────────────────────────────────────────────
+class ResultCache:
+    """Memory LRU in front of an optional memory-mapped disk tier."""
+
+    def __init__(self, directory=None, memory_bytes=DEFAULT_MEMORY_BYTES,
+                 disk_bytes=DEFAULT_DISK_BYTES):
+        self.memory = MemoryTier(memory_bytes)
+        self.disk = DiskTier(directory, disk_bytes) if directory else None
+        self.stats = collections.Counter()
+
+    @classmethod
+    def from_env(cls, **overrides):
+        """
+        A cache configured by the INDICATOR_CACHE_* environment variables;
+        keyword ``overrides`` that are not None win.
+        """
+        settings = {"directory": os.environ.get(ENV_DIR) or None,
+                    "memory_bytes": int(float(os.environ.get(ENV_MEMORY_MB, DEFAULT_MEMORY_BYTES >> 20)) * (1 << 20)),
+                    "disk_bytes": int(float(os.environ.get(ENV_DISK_MB, DEFAULT_DISK_BYTES >> 20)) * (1 << 20))}
+        settings.update((k, v) for k, v in overrides.items() if v is not None)
+        return cls(**settings)
+
+    def get(self, key, default=None):
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.stats["memory"] += 1
+            return _decode(*entry[:2])
+        if self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                self.stats["disk"] += 1
+                self.memory.put(key, entry)
+                return _decode(*entry[:2])
+        self.stats["miss"] += 1
+        return default
+
+    def put(self, key, value):
+        """Store ``value`` in both tiers; returns a copy as a hit would."""
+        entry = _pack(value)
+        self.memory.put(key, entry)
+        if self.disk is not None:
+            self.disk.put(key, entry)
+        return _decode(*entry[:2])
+
+    def cached(self, data, name, params, compute, modules=()):
+        """
+        ``compute()`` under the key (fingerprint(data), name, params, code
+        version of ``modules``), or the stored result if there is one.
+        """
+        key = make_key(fingerprint(data), name, params, code_version(*modules))
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def summary(self):
+        hits = self.stats["memory"] + self.stats["disk"]
+        total = hits + self.stats["miss"]
+        line = (f"cache: {hits}/{total} hits ({self.stats['memory']} memory, {self.stats['disk']} disk), "
+                f"{len(self.memory)} entries / {self.memory.nbytes / (1 << 20):.1f} MiB in memory")
+        if self.disk is not None:
+            line += f", {self.disk.nbytes / (1 << 20):.1f} MiB on disk"
+        return line
+
+
+def default_cache():
+    """The process-wide cache, created from the environment on first use."""
+    global _default
+    if _default is None:
+        _default = ResultCache.from_env()
+    return _default
+
+
+def set_default_cache(cache):
+    """Replace the process-wide cache (e.g. from CLI options); returns it."""
+    global _default
+    _default = cache
+    return cache
+
+
+# ─────────────────────────────────────────────────────────────
+# Cached intermediates and indicators
+# ─────────────────────────────────────────────────────────────
+def typical_price(bars, source="hlc3", cache=None):
+    """``vwap.typical_price``, cached per source."""
+    cache = cache or default_cache()
+    return cache.cached(bars, "typical_price", {"source": source},
+                        lambda: vwap.typical_price(bars, source), (vwap,))
+
+
+def typical_prices(bars, sources, cache=None):
+    """``vwap.typical_prices`` assembled from per-source cached rows."""
+    out = np.empty((len(sources), len(bars)))
+    for k, src in enumerate(sources):
+        out[k] = typical_price(bars, src, cache)
+    return out
+
+
+def period_resets(bars, anchor="year", cache=None):
+    """``vwap.new_period`` over the bars' times, cached per anchor."""
+    cache = cache or default_cache()
+    return cache.cached(bars, "new_period", {"anchor": anchor},
+                        lambda: vwap.new_period(bars.time, anchor), (vwap,))
+
+
+def cumulative_volume(bars, anchor="year", cache=None):
+    """Anchored cumulative volume (the VWAP denominator), shared by all sources."""
+    cache = cache or default_cache()
+    return cache.cached(bars, "cumulative_volume", {"anchor": anchor},
+                        lambda: vwap.segmented_cumsum(bars.volume, period_resets(bars, anchor, cache)),
+                        (vwap,))
+
+
+def _anchored_vwap_one(bars, source, anchor, mode, cache):
+    resets = period_resets(bars, anchor, cache)
+    tp = typical_price(bars, source, cache)
+    if mode != "naive":
+        return vwap.anchored_vwap(tp, bars.volume, resets, mode)
+    # Same sums as anchored_vwap's "naive" path, with the volume sum shared.
+    return vwap.vwap_from_sums(cumulative_volume(bars, anchor, cache),
+                               *(vwap.segmented_cumsum(x, resets) for x in vwap.raw_moments(tp, bars.volume)))
+
+
+def anchored_vwap_bars(bars, sources=("hlc3",), anchor="year", mode="naive", cache=None):
+    """``vwap.anchored_vwap_bars``, cached per source: {source: VWAPResult}."""
+    cache = cache or default_cache()
+    return {src: cache.cached(bars, "anchored_vwap", {"source": src, "anchor": anchor, "mode": mode},
+                              lambda src=src: _anchored_vwap_one(bars, src, anchor, mode, cache),
+                              (vwap,))
+            for src in sources}
+
+
+def resample_bars(bars, tf, cache=None):
+    """
+    ``resample.resample_bars``, cached per timeframe.  The result's
+    fingerprint is derived from the base bars', so indicators on it are
+    cached without hashing it again.
+    """
+    cache = cache or default_cache()
+    tf = resample.normalize_tf(tf)
+    htf = cache.cached(bars, "resample", {"tf": tf},
+                       lambda: resample.resample_bars(bars, tf), (resample,))
+    if htf not in _fingerprints:
+        _fingerprints[htf] = make_key(fingerprint(bars), "resample", {"tf": tf},
+                                      code_version(resample))
+    return htf
+
+
+def td_sequential_bars(bars, cache=None, **kwargs):
+    """``td_sequential.td_sequential_bars``, cached per parameter set."""
+    cache = cache or default_cache()
+    return cache.cached(bars, "td_sequential", kwargs,
+                        lambda: td_sequential.td_sequential_bars(bars, **kwargs), (td_sequential,))
+
+
+def detect_gaps_bars(bars, threshold=gaps.CME_GAP_THRESHOLD, min_gap=gaps.MIN_GAP_USD, cache=None):
+    """``gaps.detect_gaps_bars``, cached per threshold and minimum size."""
+    cache = cache or default_cache()
+    return cache.cached(bars, "detect_gaps", {"threshold": threshold, "min_gap": min_gap},
+                        lambda: gaps.detect_gaps_bars(bars, threshold, min_gap), (gaps,))
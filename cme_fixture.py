@@ -0,0 +1,64 @@
+"""
+Synthetic CME BTC1! H4 bars for the gap-detection backtest (BACKTEST 4).
+
+A hand-built sequence of weekday, maintenance-window, weekend and holiday
+transitions, with the descriptions of the bars that are true CME closure
+gaps in ``EXPECTED_CME_GAPS``.  backtest.py prints its report over these
+bars and benchmarks.checks asserts the same facts.
+"""
+import numpy as np
+
+# CME BTC1! H4 bar structure:
+#   - Normal weekday bars  : ~4 hours apart (14 400 s), at most ~5 h near
+#     the daily 1-hour maintenance window (4 PM–5 PM CT).
+#   - Weekend closure      : Friday 4 PM CT → Sunday 5 PM CT (~49 hours).
+#   - Public holiday       : ~24–28 hours.
+#
+# Only gaps where consecutive H4 bar open times differ > 8 hours are CME
+# closure gaps; that excludes every intra-week transition.
+H4_S          = 4  * 3600   # Normal H4 interval  (seconds)
+MAINT_EXTRA_S = 1  * 3600   # Extra 1-hour from maintenance window
+WEEKEND_S     = 49 * 3600   # CME weekend closure (~49 hours)
+HOLIDAY_S     = 28 * 3600   # CME holiday closure (~28 hours)
+
+# (open_time_unix, prev_close, bar_open, description)
+# Base: Mon 8 Jan 2024 00:00:00 UTC  (Unix 1704672000)
+T0 = 1704672000
+
+CME_BARS = [
+    # ── Weekday bars — large price moves, should NOT trigger (time diff = 4 h) ──
+    (T0 + 0 * H4_S,                     None,    42100.0, "Mon bar 1 (first bar — no prev)"),
+    (T0 + 1 * H4_S,                  42100.0, 42155.0, "Mon bar 2 (+$55, weekday)"),
+    (T0 + 2 * H4_S,                  42155.0, 41900.0, "Mon bar 3 (-$255, weekday — large move)"),
+    (T0 + 3 * H4_S,                  41900.0, 42400.0, "Mon bar 4 (+$500, weekday — large move)"),
+    (T0 + 4 * H4_S,                  42400.0, 42380.0, "Mon bar 5 (-$20, weekday)"),
+    # ── Maintenance-adjacent bar: 5-hour gap — should NOT trigger (< 8 h) ──
+    (T0 + 4 * H4_S + MAINT_EXTRA_S, 42380.0, 42600.0, "Post-maintenance bar (+$220, 5h gap — NOT a CME gap)"),
+    # ── Weekend gap: ~49 h after last Friday bar — SHOULD be detected ──
+    (T0 + 4 * H4_S + MAINT_EXTRA_S + WEEKEND_S, 42600.0, 43250.0, "Sunday open (weekend gap +$650)"),
+    # ── Post-weekend weekday bars (normal transitions) ──
+    (T0 + 4 * H4_S + MAINT_EXTRA_S + WEEKEND_S + 1 * H4_S, 43250.0, 43270.0, "Mon bar post-weekend (+$20, weekday)"),
+    (T0 + 4 * H4_S + MAINT_EXTRA_S + WEEKEND_S + 2 * H4_S, 43270.0, 42900.0, "Tue bar (-$370, weekday — large move)"),
+    # ── Holiday gap: ~28 h — SHOULD be detected ──
+    (T0 + 4 * H4_S + MAINT_EXTRA_S + WEEKEND_S + 2 * H4_S + HOLIDAY_S,
+     42900.0, 43500.0, "Post-holiday open (holiday gap +$600)"),
+    # ── Post-holiday normal bar ──
+    (T0 + 4 * H4_S + MAINT_EXTRA_S + WEEKEND_S + 2 * H4_S + HOLIDAY_S + H4_S,
+     43500.0, 43480.0, "Bar after holiday (+$20, weekday — no gap)"),
+    # ── Edge: large move on normal bar right after holiday ──
+    (T0 + 4 * H4_S + MAINT_EXTRA_S + WEEKEND_S + 2 * H4_S + HOLIDAY_S + 2 * H4_S,
+     43480.0, 43900.0, "2nd bar after holiday (+$420, weekday — NOT a CME gap)"),
+]
+
+EXPECTED_CME_GAPS = {
+    "Sunday open (weekend gap +$650)",
+    "Post-holiday open (holiday gap +$600)",
+}
+
+
+def cme_arrays(rows=CME_BARS):
+    """``(time, open, prev_close)`` arrays of the fixture (prev_close NaN on bar 0)."""
+    time = np.array([b[0] for b in rows], dtype=np.float64)
+    open_ = np.array([b[2] for b in rows], dtype=np.float64)
+    prev = np.array([np.nan if b[1] is None else b[1] for b in rows])
+    return time, open_, prev
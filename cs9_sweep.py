@@ -0,0 +1,145 @@
+"""
+Parameter sweep over CS9 / TD Sequential count-rule variants.
+
+cs9_td_sequential.pine is only ~35% sure of its counting rule.  Each
+variant here is one guess at that rule; it is run over the closes and
+scored against the exported ``s0..s15`` shape columns (sN = 1 means the
+bar's count step is N+1; steps 10-16 are countdown).
+
+Every variant is counted by the vectorised ``td_sequential`` (run-length
+encoded comparison signs, no per-bar state machine).  Variants are spread
+over a process pool and come back ranked by F1, then precision.  Each
+variant's score row is kept in the result cache (cache.py), so a repeat or
+overlapping sweep only counts the variants it has not seen.
+
+    python cs9_sweep.py [data_cs9.csv] [--workers N] [--top K] [--lookbacks 1 2 3 ...]
+"""
+import argparse
+import collections
+import concurrent.futures
+import itertools
+import os
+import sys
+
+import numpy as np
+
+import td_sequential as td_module
+from bars import BarStore
+from cache import code_version, default_cache, fingerprint, make_key
+from td_sequential import N_SHAPES, shape_columns, td_sequential
+
+Variant = collections.namedtuple(
+    "Variant", "lookback direction reset_on_equal wrap_at_9 countdown")
+Variant.__doc__ = """\
+One candidate count rule.
+
+lookback        compare close with close[lookback]
+direction       "normal": buy = close < close[lb]; "inverted": buy = close > close[lb]
+reset_on_equal  True: an equal close resets both counts; False: it holds them
+wrap_at_9       True: a count past 9 restarts at 1 (backtest.py); False: keeps going (Pine)
+countdown       also emit countdown steps 10-16 after a setup 9
+"""
+
+
+def variant_grid(lookbacks=range(1, 6), directions=("normal", "inverted"),
+                 reset_on_equal=(True, False), wrap_at_9=(True, False),
+                 countdown=(False, True)):
+    """Cartesian product of rule options as a list of Variants."""
+    return [Variant(*v) for v in itertools.product(
+        lookbacks, directions, reset_on_equal, wrap_at_9, countdown)]
+
+
+def variant_shapes(variant, close, high, low):
+    """(16, n) int8 predicted shape columns for one rule variant."""
+    td = td_sequential(close, high, low, variant.lookback, variant.direction,
+                       variant.reset_on_equal, variant.wrap_at_9, variant.countdown)
+    return shape_columns(td)
+
+
+# ─────────────────────────────────────────────────────────────
+# Scoring and the sweep
+# ─────────────────────────────────────────────────────────────
+def score(pred, actual, skip=0):
+    """Cell-level precision/recall/F1 of predicted vs actual shape flags."""
+    p = pred[:, skip:].astype(bool)
+    a = actual[:, skip:].astype(bool)
+    tp = int(np.count_nonzero(p & a))
+    fp = int(np.count_nonzero(p & ~a))
+    fn = int(np.count_nonzero(~p & a))
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"tp": tp, "fp": fp, "fn": fn, "precision": precision, "recall": recall, "f1": f1}
+
+
+_worker_data = None
+
+
+def _init_worker(data):
+    global _worker_data
+    _worker_data = data
+
+
+def _score_variants(variants, data=None):
+    close, high, low, actual, skip = data if data is not None else _worker_data
+    return [dict(variant._asdict(), **score(variant_shapes(variant, close, high, low), actual, skip))
+            for variant in variants]
+
+
+def _score_all(variants, data, workers):
+    if workers == 1:
+        return _score_variants(variants, data)
+    workers = workers or os.cpu_count() or 1
+    size = max(1, -(-len(variants) // (4 * workers)))
+    chunks = [variants[i:i + size] for i in range(0, len(variants), size)]
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(data,)) as pool:
+        return [r for part in pool.map(_score_variants, chunks) for r in part]
+
+
+def sweep(bars, variants=None, workers=None, skip=0, cache=None):
+    """
+    Score every variant against the bars' ``s0..s15`` columns and return
+    result dicts ranked best first.  ``workers=1`` runs in-process; the
+    arrays are sent to each pool worker once, not once per variant.  Rows
+    already in ``cache`` (default: ``cache.default_cache()``) are reused.
+    """
+    variants = variant_grid() if variants is None else list(variants)
+    cache = cache or default_cache()
+    fp, version = fingerprint(bars), code_version(td_module, sys.modules[__name__])
+    keys = [make_key(fp, "cs9_score", dict(v._asdict(), skip=skip), version) for v in variants]
+    rows = [cache.get(key) for key in keys]
+    todo = [i for i, row in enumerate(rows) if row is None]
+    if todo:
+        actual = bars.stack([f"s{j}" for j in range(N_SHAPES)])
+        data = (np.asarray(bars.close), np.asarray(bars.high), np.asarray(bars.low), actual, skip)
+        for i, row in zip(todo, _score_all([variants[i] for i in todo], data, workers)):
+            rows[i] = cache.put(keys[i], row)
+    rows.sort(key=lambda r: (-r["f1"], -r["precision"], -r["recall"]))
+    return rows
+
+
+def format_table(rows, top=10):
+    """Fixed-width ranking table of the first ``top`` sweep results."""
+    lines = [f"{'#':>3}  {'lb':>2} {'direction':9s} {'eq-reset':8s} {'wrap9':5s} {'cd':5s}"
+             f"  {'prec':>6} {'recall':>6} {'F1':>6}  {'tp':>3} {'fp':>3} {'fn':>3}"]
+    for i, r in enumerate(rows[:top], 1):
+        lines.append(f"{i:3d}  {r['lookback']:2d} {r['direction']:9s} {str(r['reset_on_equal']):8s} "
+                     f"{str(r['wrap_at_9']):5s} {str(r['countdown']):5s}  {r['precision']:6.2f} "
+                     f"{r['recall']:6.2f} {r['f1']:6.2f}  {r['tp']:3d} {r['fp']:3d} {r['fn']:3d}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Sweep CS9 count-rule variants against s0..s15.")
+    ap.add_argument("path", nargs="?", default="data_cs9.csv")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--lookbacks", type=int, nargs="+", default=list(range(1, 6)))
+    args = ap.parse_args(argv)
+    rows = sweep(BarStore.from_csv(args.path), variant_grid(lookbacks=args.lookbacks), args.workers)
+    print(format_table(rows, args.top))
+
+
+if __name__ == "__main__":
+    main()
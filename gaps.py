@@ -0,0 +1,283 @@
+"""
+CME session-gap detection and fill tracking (Lowkeighs20Hunter.pine).
+
+Gaps are found in one vectorised pass over the H4 bars: a gap opens on a
+bar whose open time is more than ``CME_GAP_THRESHOLD`` after the previous
+bar's and whose open differs from the previous close by at least
+``min_gap``.  The zone is [previous close, open] for a bull gap and
+[open, previous close] for a bear gap.
+
+Fill status is then resolved against lower-timeframe bars.  Following the
+Pine state machine, from the first LTF bar at or after the gap bar:
+
+    touched       high >= bot and low <= top          (state 1, partial)
+    fully filled  bot <= close <= top                 (state 2, final)
+
+A partial reverts to unfilled on any bar that does not touch, so the state
+at bar j is 2 from the fill bar on and otherwise 1 exactly when bar j
+touches.  Only the first touch and the fill bar need to be found, and both
+are answered by ``PassageIndex`` first-passage queries: "first bar >= k
+whose low is <= x" is a walk over a sparse table of block minima plus a
+binary search of the block's running minimum, so a query is
+O(log n + block) no matter how many gaps are open.
+
+    python gaps.py btc1_h4.csv [--ltf btc1_1m.csv] [--min-gap USD]
+"""
+import argparse
+import collections
+
+import numpy as np
+
+from bars import BarStore
+
+CME_GAP_THRESHOLD = 8 * 3600    # seconds between H4 bar opens
+MIN_GAP_USD = 50.0
+BLOCK = 256
+
+UNFILLED, PARTIAL, FILLED = 0, 1, 2
+PENDING = -1  # state_at: the gap's bar is still in the future
+
+Gaps = collections.namedtuple("Gaps", "index time top bot is_bull size")
+GapFills = collections.namedtuple("GapFills", "start touch fill touch_time fill_time")
+
+
+# ─────────────────────────────────────────────────────────────
+# Detection
+# ─────────────────────────────────────────────────────────────
+def detect_gaps(time, open_, prev_close, threshold=CME_GAP_THRESHOLD, min_gap=MIN_GAP_USD):
+    """
+    Gaps among H4 bars as a ``Gaps`` tuple of arrays.  ``prev_close[i]`` is
+    the close of bar i-1 (NaN or anything for bar 0, which never gaps).
+    """
+    time = np.asarray(time, dtype=np.float64)
+    open_ = np.asarray(open_, dtype=np.float64)
+    prev_close = np.asarray(prev_close, dtype=np.float64)
+    is_gap = np.zeros(len(time), dtype=bool)
+    if len(time) > 1:
+        size = np.abs(open_[1:] - prev_close[1:])
+        is_gap[1:] = ((time[1:] - time[:-1] > threshold) & (size >= min_gap)
+                      & (open_[1:] != prev_close[1:]))
+    idx = np.flatnonzero(is_gap)
+    o, pc = open_[idx], prev_close[idx]
+    is_bull = o > pc
+    return Gaps(idx, time[idx], np.where(is_bull, o, pc), np.where(is_bull, pc, o),
+                is_bull, np.abs(o - pc))
+
+
+def detect_gaps_bars(bars, threshold=CME_GAP_THRESHOLD, min_gap=MIN_GAP_USD):
+    """``detect_gaps`` over an H4 BarStore (previous close = close[1])."""
+    prev_close = np.empty(len(bars))
+    prev_close[:1] = np.nan
+    prev_close[1:] = bars.close[:-1]
+    return detect_gaps(bars.time, bars.open, prev_close, threshold, min_gap)
+
+
+# ─────────────────────────────────────────────────────────────
+# First-passage index
+# ─────────────────────────────────────────────────────────────
+class PassageIndex:
+    """
+    ``first_below(start, level)``: the first index j >= start with
+    ``values[j] <= level`` (``len(values)`` if none), vectorised over
+    arrays of queries.
+
+    Built once in O(n): per-block running minima (monotone, so binary
+    searchable) and a sparse table over the n / block block minima.
+    """
+
+    __slots__ = ("values", "block", "running_min", "_padded", "_table")
+
+    def __init__(self, values, block=BLOCK):
+        values = np.asarray(values, dtype=np.float64)
+        nb = -(-len(values) // block)
+        padded = np.full(nb * block + 1, np.inf)
+        padded[:len(values)] = values
+        blocks = padded[:-1].reshape(nb, block)
+        self.values = values
+        self.block = block
+        self.running_min = np.minimum.accumulate(blocks, axis=1).reshape(-1)
+        self._padded = padded
+        # _table[l][b] = min over blocks b .. b + 2**l - 1 that exist.
+        table = [blocks.min(axis=1)]
+        span = 1
+        while span < nb:
+            nxt = table[-1].copy()
+            np.minimum(nxt[:nb - span], table[-1][span:], out=nxt[:nb - span])
+            table.append(nxt)
+            span *= 2
+        self._table = table
+
+    def __len__(self):
+        return len(self.values)
+
+    def _head(self, start, level, chunk=4096):
+        """Scan from ``start`` to the end of its block; len(values) if no hit."""
+        n, block = len(self.values), self.block
+        out = np.full(len(start), n, dtype=np.int64)
+        offs = np.arange(block)
+        for i in range(0, len(start), chunk):
+            s, x = start[i:i + chunk], level[i:i + chunk]
+            pos = s[:, None] + offs
+            end = np.minimum((s // block + 1) * block, n)
+            vals = np.where(pos < end[:, None], self._padded[np.minimum(pos, n)], np.inf)
+            hit = vals <= x[:, None]
+            found = hit.any(axis=1)
+            out[i:i + chunk][found] = s[found] + hit[found].argmax(axis=1)
+        return out
+
+    def first_below(self, start, level):
+        n, block = len(self.values), self.block
+        start = np.atleast_1d(np.asarray(start, dtype=np.int64))
+        level = np.broadcast_to(np.asarray(level, dtype=np.float64), start.shape)
+        out = np.full(start.shape, n, dtype=np.int64)
+        live = np.flatnonzero(start < n)
+        if not len(live):
+            return out
+
+        # 1. The rest of the starting block, scanned directly.
+        head = self._head(start[live], level[live])
+        found = head < n
+        out[live[found]] = head[found]
+
+        # 2. Later blocks: sparse-table walk to the first block whose minimum
+        #    is <= level, then binary search of that block's running minimum.
+        live = live[~found]
+        x = level[live]
+        b = start[live] // block + 1
+        nb = len(self._table[0])
+        for lvl in range(len(self._table) - 1, -1, -1):
+            ok = np.flatnonzero(b < nb)
+            skip = self._table[lvl][b[ok]] > x[ok]
+            b[ok[skip]] += 1 << lvl
+        ok = b < nb
+        live, x, b = live[ok], x[ok], b[ok]
+        lo, hi = b * block, b * block + block - 1
+        for _ in range(block.bit_length()):
+            mid = (lo + hi) // 2
+            left = self.running_min[mid] <= x
+            hi = np.where(left, mid, hi)
+            lo = np.where(left, lo, mid + 1)
+        out[live] = np.minimum(lo, n)
+        return out
+
+
+def _first_both(below, above, start, top, bot, lo_vals, hi_vals):
+    """
+    First j >= start with ``lo_vals[j] <= top`` and ``hi_vals[j] >= bot``.
+
+    Every bar before the later of the two single-condition passages fails
+    one of them, so each round jumps past all rejected bars at once; it
+    takes another round only when price skipped over the whole zone.
+    """
+    n = len(lo_vals)
+    k = np.array(start, dtype=np.int64)
+    out = np.full(len(k), n, dtype=np.int64)
+    pending = np.flatnonzero(k < n)
+    while len(pending):
+        kk, t, b = k[pending], top[pending], bot[pending]
+        c = np.maximum(below.first_below(kk, t), above.first_below(kk, -b))
+        miss = c >= n
+        cc = np.minimum(c, n - 1)
+        ok = ~miss & (lo_vals[cc] <= t) & (hi_vals[cc] >= b)
+        out[pending[ok]] = c[ok]
+        retry = ~miss & ~ok
+        k[pending[retry]] = c[retry] + 1
+        pending = pending[retry]
+    return out
+
+
+class FillIndex:
+    """First-touch / full-fill queries for gap zones against LTF bars."""
+
+    __slots__ = ("time", "high", "low", "close", "_low", "_high", "_close_lo", "_close_hi")
+
+    def __init__(self, time, high, low, close, block=BLOCK):
+        self.time = np.asarray(time, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.close = np.asarray(close, dtype=np.float64)
+        self._low = PassageIndex(self.low, block)             # low <= top
+        self._high = PassageIndex(-self.high, block)          # high >= bot
+        self._close_lo = PassageIndex(self.close, block)      # close <= top
+        self._close_hi = PassageIndex(-self.close, block)     # close >= bot
+
+    @classmethod
+    def from_bars(cls, bars, block=BLOCK):
+        return cls(bars.time, bars.high, bars.low, bars.close, block)
+
+    def __len__(self):
+        return len(self.time)
+
+    def start_index(self, gap_time):
+        """First LTF bar at or after each gap's H4 bar open."""
+        return np.searchsorted(self.time, gap_time, side="left")
+
+    def first_touch(self, start, top, bot):
+        """First bar >= start whose high/low range reaches into [bot, top]."""
+        top, bot = np.asarray(top, dtype=np.float64), np.asarray(bot, dtype=np.float64)
+        return _first_both(self._low, self._high, start, top, bot, self.low, self.high)
+
+    def first_fill(self, start, top, bot):
+        """First bar >= start that closes inside [bot, top]."""
+        top, bot = np.asarray(top, dtype=np.float64), np.asarray(bot, dtype=np.float64)
+        return _first_both(self._close_lo, self._close_hi, start, top, bot, self.close, self.close)
+
+    def resolve(self, gaps):
+        """Touch and fill bars (and times; NaN = never) for every gap."""
+        start = self.start_index(gaps.time)
+        touch = self.first_touch(start, gaps.top, gaps.bot)
+        fill = self.first_fill(start, gaps.top, gaps.bot)
+        t = np.append(self.time, np.nan)
+        return GapFills(start, touch, fill, t[touch], t[fill])
+
+    def state_at(self, gaps, fills, j):
+        """
+        Pine ``gap_state`` of every gap as of LTF bar ``j``; ``PENDING`` for
+        gaps that have not formed yet (their first LTF bar is after ``j``).
+        """
+        live = fills.start <= j
+        state = np.where(live, UNFILLED, PENDING).astype(np.int8)
+        touched = live & (self.high[j] >= gaps.bot) & (self.low[j] <= gaps.top)
+        state[touched] = PARTIAL
+        state[live & (fills.fill <= j)] = FILLED
+        return state
+
+
+def dashboard(gaps, state, close):
+    """
+    Gap-Hunter dashboard counts: unfilled above/below price and partials.
+    ``PENDING`` gaps (not formed yet) are not counted.
+    """
+    unfilled = state == UNFILLED
+    return {
+        "above": int(np.count_nonzero(unfilled & (gaps.bot > close))),
+        "partial": int(np.count_nonzero(state == PARTIAL)),
+        "below": int(np.count_nonzero(unfilled & (gaps.top < close))),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Detect CME gaps and resolve their fill status.")
+    ap.add_argument("h4", help="BTC1! H4 export")
+    ap.add_argument("--ltf", help="lower-timeframe export to resolve fills against (default: the H4 bars)")
+    ap.add_argument("--min-gap", type=float, default=MIN_GAP_USD)
+    args = ap.parse_args(argv)
+    h4 = BarStore.from_csv(args.h4)
+    ltf = BarStore.from_csv(args.ltf) if args.ltf else h4
+    gaps = detect_gaps_bars(h4, min_gap=args.min_gap)
+    index = FillIndex.from_bars(ltf)
+    fills = index.resolve(gaps)
+    for k in range(len(gaps.index)):
+        kind = "Bull" if gaps.is_bull[k] else "Bear"
+        print(f"{kind} gap ${gaps.size[k]:.0f} at {int(gaps.time[k])}  "
+              f"[{gaps.bot[k]:.2f}, {gaps.top[k]:.2f}]  "
+              f"touched={fills.touch_time[k]:.0f}  filled={fills.fill_time[k]:.0f}")
+    if len(ltf):
+        last = len(ltf) - 1
+        counts = dashboard(gaps, index.state_at(gaps, fills, last), ltf.close[last])
+        print(f"Unfilled above: {counts['above']}  partial: {counts['partial']}  "
+              f"unfilled below: {counts['below']}")
+
+
+if __name__ == "__main__":
+    main()
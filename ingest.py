@@ -0,0 +1,164 @@
+"""
+Streaming ingestion of TradingView CSV exports.
+
+Exports are parsed in fixed-size row chunks so memory stays bounded no matter
+how large the file is.  On first read every column is written to a raw binary
+file under ``.bar_cache/<export name>/`` together with a ``manifest.json``;
+later reads memory-map those files instead of re-parsing the text.
+"""
+import csv
+import itertools
+import json
+import os
+import re
+
+import numpy as np
+
+CHUNK_ROWS = 1 << 16
+CACHE_DIRNAME = ".bar_cache"
+MANIFEST_VERSION = 1
+
+# Shape plots (s0..s15) are 0/1 flags; everything else is a float series.
+_SHAPE_COLUMN = re.compile(r"^s\d+$")
+
+# TradingView capitalises some built-in series ("Volume"); store them under
+# the lower-case names BarStore expects.
+_CORE_NAMES = ("time", "open", "high", "low", "close", "volume")
+
+
+def column_dtype(name):
+    """Storage dtype for an export column, chosen from its header name."""
+    if _SHAPE_COLUMN.match(name):
+        return np.dtype(np.int8)
+    return np.dtype(np.float64)
+
+
+def _column_filename(index, name):
+    slug = re.sub(r"[^0-9A-Za-z]+", "_", name).strip("_") or "col"
+    return f"{index:03d}_{slug}.bin"
+
+
+def _parse_lines(lines, ncols):
+    """Parse CSV lines into a (rows, ncols) float64 array; blanks become NaN."""
+    try:
+        return np.loadtxt(lines, delimiter=",", dtype=np.float64, ndmin=2).reshape(-1, ncols)
+    except ValueError:
+        rows = [[float(x) if x.strip() else np.nan for x in row]
+                for row in csv.reader(lines) if row]
+        return np.array(rows, dtype=np.float64).reshape(-1, ncols)
+
+
+def _convert(values, dtype):
+    if dtype.kind == "i":
+        values = np.nan_to_num(values, nan=0.0)
+    return values.astype(dtype, copy=False)
+
+
+# ─────────────────────────────────────────────────────────────
+# Chunked reader
+# ─────────────────────────────────────────────────────────────
+def read_header(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        header = [h.strip() for h in next(csv.reader(f))]
+    return [h.lower() if h.lower() in _CORE_NAMES else h for h in header]
+
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yield ``{column: array}`` dicts of at most ``chunk_rows`` bars each."""
+    header = read_header(path)
+    dtypes = [column_dtype(h) for h in header]
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        next(f)
+        while True:
+            lines = [ln for ln in itertools.islice(f, chunk_rows) if ln.strip()]
+            if not lines:
+                return
+            raw = _parse_lines(lines, len(header))
+            yield {name: _convert(raw[:, j], dt)
+                   for j, (name, dt) in enumerate(zip(header, dtypes))}
+
+
+# ─────────────────────────────────────────────────────────────
+# Binary cache
+# ─────────────────────────────────────────────────────────────
+def cache_dir_for(path, cache_root=None):
+    path = os.path.abspath(path)
+    root = cache_root or os.path.join(os.path.dirname(path), CACHE_DIRNAME)
+    return os.path.join(root, os.path.basename(path))
+
+
+def _source_stamp(path):
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _read_manifest(cache_dir, stamp):
+    try:
+        with open(os.path.join(cache_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("source") != stamp:
+        return None
+    return manifest
+
+
+def build_cache(path, cache_dir, chunk_rows=CHUNK_ROWS):
+    """Stream ``path`` into per-column binary files and write the manifest."""
+    os.makedirs(cache_dir, exist_ok=True)
+    header = read_header(path)
+    columns = [{"name": name, "file": _column_filename(j, name), "dtype": column_dtype(name).str}
+               for j, name in enumerate(header)]
+    handles = [open(os.path.join(cache_dir, c["file"]), "wb") for c in columns]
+    rows = 0
+    try:
+        for chunk in iter_chunks(path, chunk_rows):
+            for col, fh in zip(columns, handles):
+                chunk[col["name"]].tofile(fh)
+            rows += len(chunk[header[0]])
+    finally:
+        for fh in handles:
+            fh.close()
+    manifest = {"version": MANIFEST_VERSION, "source": _source_stamp(path),
+                "rows": rows, "columns": columns}
+    tmp = os.path.join(cache_dir, "manifest.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, os.path.join(cache_dir, "manifest.json"))
+    return manifest
+
+
+def open_cache(cache_dir, manifest):
+    """Memory-map every cached column read-only."""
+    out = {}
+    for col in manifest["columns"]:
+        dtype = np.dtype(col["dtype"])
+        fname = os.path.join(cache_dir, col["file"])
+        if manifest["rows"] == 0:
+            out[col["name"]] = np.empty(0, dtype=dtype)
+        else:
+            out[col["name"]] = np.memmap(fname, dtype=dtype, mode="r", shape=(manifest["rows"],))
+    return out
+
+
+def load_columns(path, cache=True, cache_root=None, chunk_rows=CHUNK_ROWS):
+    """
+    Return ``{column: array}`` for a TradingView export.
+
+    With ``cache`` on, the first call writes the binary cache and every call
+    returns memory-mapped columns; a changed source file (size or mtime)
+    invalidates the cache.  With ``cache`` off the chunks are concatenated
+    in memory.
+    """
+    if not cache:
+        chunks = list(iter_chunks(path, chunk_rows))
+        header = read_header(path)
+        if not chunks:
+            return {name: np.empty(0, dtype=column_dtype(name)) for name in header}
+        return {name: np.concatenate([c[name] for c in chunks]) for name in header}
+
+    cache_dir = cache_dir_for(path, cache_root)
+    manifest = _read_manifest(cache_dir, _source_stamp(path))
+    if manifest is None:
+        manifest = build_cache(path, cache_dir, chunk_rows)
+    return open_cache(cache_dir, manifest)
@@ -0,0 +1,289 @@
+"""
+Per-stage timing, memory and sampling-profiler instrumentation.
+
+A ``Tracer`` times named stages, which may nest:
+
+    with Tracer.from_env() as tracer:
+        with stage("load"):
+            ...
+        with stage("backtest", bars=n):
+            with stage("backsolve"):
+                ...
+
+Each stage records wall and CPU time, bars/s (when it is told how many
+bars it processed), the process RSS high-water mark at its end and, with
+``alloc`` on, the tracemalloc peak above its starting allocation (NumPy
+reports its buffers to tracemalloc, so this covers array temporaries).
+``stage()`` at module level uses the active tracer and costs nothing when
+there is none, so library code can mark its own stages.
+
+The optional sampling profiler is a daemon thread that snapshots the
+traced thread's stack every ``interval`` seconds.  Consecutive samples
+with a common stack prefix are merged into spans, so the trace shows a
+flame chart of where time went under the stage spans, and ``folded()``
+gives collapsed stacks for flamegraph tools.
+
+``write_trace`` emits Chrome trace-event JSON (chrome://tracing, Perfetto).
+
+Environment (read by ``Tracer.from_env``):
+
+    INDICATOR_TRACE=trace.json        write the trace there on exit
+    INDICATOR_PROFILE=1               turn on the sampling profiler
+    INDICATOR_PROFILE_INTERVAL_MS=5   sampling interval
+    INDICATOR_TRACE_ALLOC=1           per-stage tracemalloc peaks (slower)
+"""
+import collections
+import contextlib
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+ENV_TRACE = "INDICATOR_TRACE"
+ENV_PROFILE = "INDICATOR_PROFILE"
+ENV_INTERVAL = "INDICATOR_PROFILE_INTERVAL_MS"
+ENV_ALLOC = "INDICATOR_TRACE_ALLOC"
+DEFAULT_INTERVAL = 0.005
+
+_active = None
+
+
+def _env_flag(name):
+    return os.environ.get(name, "").strip().lower() not in ("", "0", "false", "no", "off")
+
+
+def _max_rss():
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class Span:
+    """One timed stage; ``bars`` may be set inside the ``with`` block."""
+
+    __slots__ = ("name", "depth", "start", "wall", "cpu", "bars", "rss_peak",
+                 "alloc_base", "alloc_peak")
+
+    def __init__(self, name, depth, bars=None):
+        self.name = name
+        self.depth = depth
+        self.bars = bars
+        self.start = self.wall = self.cpu = 0.0
+        self.rss_peak = 0
+        self.alloc_base = self.alloc_peak = None
+
+    @property
+    def bars_per_sec(self):
+        if not self.bars or self.wall <= 0:
+            return None
+        return self.bars / self.wall
+
+    def as_dict(self):
+        out = {"wall_ms": self.wall * 1e3, "cpu_ms": self.cpu * 1e3, "rss_peak": self.rss_peak}
+        if self.bars is not None:
+            out["bars"] = self.bars
+            out["bars_per_sec"] = self.bars_per_sec
+        if self.alloc_peak is not None:
+            out["alloc_peak"] = self.alloc_peak - self.alloc_base
+        return out
+
+
+# ─────────────────────────────────────────────────────────────
+# Sampling profiler
+# ─────────────────────────────────────────────────────────────
+class SamplingProfiler:
+    """Background-thread stack sampler for one thread (default: the caller's)."""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, thread_id=None):
+        self.interval = interval
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples.append((time.perf_counter(), self._stack(frame)))
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def folded(self):
+        """``{"a;b;c": samples}`` collapsed stacks."""
+        return dict(collections.Counter(";".join(stack) for _, stack in self.samples))
+
+    def spans(self):
+        """``(depth, name, start, end)`` for runs of samples sharing a frame."""
+        out, open_ = [], []
+        last_t = None
+        for t, stack in self.samples:
+            common = 0
+            while common < min(len(open_), len(stack)) and open_[common][0] == stack[common]:
+                common += 1
+            for depth in range(len(open_) - 1, common - 1, -1):
+                out.append((depth, open_[depth][0], open_[depth][1], t))
+            del open_[common:]
+            open_ += [(name, t) for name in stack[common:]]
+            last_t = t
+        if last_t is not None:
+            end = last_t + self.interval
+            for depth in range(len(open_) - 1, -1, -1):
+                out.append((depth, open_[depth][0], open_[depth][1], end))
+        return out
+
+
+# ─────────────────────────────────────────────────────────────
+# Tracer
+# ─────────────────────────────────────────────────────────────
+class Tracer:
+    """Collects nested stage spans; activate with ``with tracer:``."""
+
+    def __init__(self, name="pipeline", alloc=False, profile=False,
+                 interval=DEFAULT_INTERVAL, trace_path=None):
+        self.name = name
+        self.alloc = alloc
+        self.trace_path = trace_path
+        self.profiler = SamplingProfiler(interval) if profile else None
+        self.spans = []
+        self._stack = []
+        self._t0 = time.perf_counter()
+        self._prev = None
+        self._started_tracemalloc = False
+
+    @classmethod
+    def from_env(cls, name="pipeline", **overrides):
+        """
+        A tracer configured by the INDICATOR_* environment variables;
+        keyword ``overrides`` that are not None (e.g. from CLI flags) win.
+        """
+        settings = {"alloc": _env_flag(ENV_ALLOC), "profile": _env_flag(ENV_PROFILE),
+                    "interval": float(os.environ.get(ENV_INTERVAL, DEFAULT_INTERVAL * 1e3)) / 1e3,
+                    "trace_path": os.environ.get(ENV_TRACE) or None}
+        settings.update((k, v) for k, v in overrides.items() if v is not None)
+        return cls(name, **settings)
+
+    def __enter__(self):
+        global _active
+        self._prev, _active = _active, self
+        self._t0 = time.perf_counter()
+        if self.alloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if self.profiler is not None:
+            self.profiler.start()
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        if self.profiler is not None:
+            self.profiler.stop()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        _active = self._prev
+        if self.trace_path:
+            self.write_trace(self.trace_path)
+        return False
+
+    @contextlib.contextmanager
+    def stage(self, name, bars=None):
+        """Time the block as a stage nested under the current one."""
+        span = Span(name, len(self._stack), bars)
+        if self.alloc:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                parent = self._stack[-1]
+                parent.alloc_peak = max(parent.alloc_peak, peak)
+            tracemalloc.reset_peak()
+            span.alloc_base = span.alloc_peak = current
+        self._stack.append(span)
+        span.start = time.perf_counter()
+        cpu0 = time.process_time()
+        try:
+            yield span
+        finally:
+            span.wall = time.perf_counter() - span.start
+            span.cpu = time.process_time() - cpu0
+            span.rss_peak = _max_rss()
+            self._stack.pop()
+            if self.alloc:
+                span.alloc_peak = max(span.alloc_peak, tracemalloc.get_traced_memory()[1])
+                if self._stack:
+                    parent = self._stack[-1]
+                    parent.alloc_peak = max(parent.alloc_peak, span.alloc_peak)
+                tracemalloc.reset_peak()
+            self.spans.append(span)
+
+    # ── Output ───────────────────────────────────────────────────
+    def summary(self):
+        """Fixed-width table of stages in start order, indented by depth."""
+        lines = [f"{'stage':36s} {'wall ms':>10s} {'cpu ms':>10s} {'bars/s':>14s} {'RSS MiB':>9s}"
+                 + (f" {'alloc MiB':>10s}" if self.alloc else "")]
+        for s in sorted(self.spans, key=lambda s: s.start):
+            rate = s.bars_per_sec
+            line = (f"{'  ' * s.depth + s.name:36s} {s.wall * 1e3:10.2f} {s.cpu * 1e3:10.2f} "
+                    f"{'' if rate is None else f'{rate:,.0f}':>14s} {s.rss_peak / (1 << 20):9.1f}")
+            if self.alloc:
+                line += f" {(s.alloc_peak - s.alloc_base) / (1 << 20):10.2f}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def chrome_trace(self):
+        """Chrome trace-event dict: stages on one track, profiler spans on another."""
+        pid = os.getpid()
+
+        def us(t):
+            return (t - self._t0) * 1e6
+
+        events = [{"ph": "M", "pid": pid, "tid": 0, "name": "thread_name", "args": {"name": "stages"}}]
+        for s in self.spans:
+            events.append({"ph": "X", "pid": pid, "tid": 0, "cat": "stage", "name": s.name,
+                           "ts": us(s.start), "dur": s.wall * 1e6, "args": s.as_dict()})
+        if self.profiler is not None:
+            events.append({"ph": "M", "pid": pid, "tid": 1, "name": "thread_name",
+                           "args": {"name": f"samples ({self.profiler.interval * 1e3:g} ms)"}})
+            for _, name, start, end in self.profiler.spans():
+                events.append({"ph": "X", "pid": pid, "tid": 1, "cat": "sample", "name": name,
+                               "ts": us(start), "dur": (end - start) * 1e6})
+        other = {"name": self.name}
+        if self.profiler is not None:
+            other["folded"] = self.profiler.folded()
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": other}
+
+    def write_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+def active():
+    """The tracer of the innermost ``with tracer:`` block, or None."""
+    return _active
+
+
+def stage(name, bars=None):
+    """``tracer.stage`` on the active tracer; a plain no-op block without one."""
+    if _active is None:
+        return contextlib.nullcontext(Span(name, 0, bars))
+    return _active.stage(name, bars)
@@ -0,0 +1,461 @@
+"""
+Event-driven live runtime for the ported indicators.
+
+Ticks ``(symbol, time, price, size)`` arrive on one asyncio event loop
+for any number of symbols.  Each symbol has a bounded queue and one
+consumer task; ``Runtime.publish`` awaits while the queue is full, so a
+fast feed is slowed to the speed of the indicators instead of buffering
+without bound.  The consumer folds ticks into bars of the symbol's
+interval and drives every subscribed indicator:
+
+    on_bar(bar)    a bar has closed: commit it to the indicator's state
+    on_tick(bar)   the forming bar changed: the provisional value, state
+                   untouched
+
+Indicators are small ``__slots__`` objects whose per-bar work is O(1)
+(``GapHunter`` is O(open gaps), like the script), and on_bar over a
+closed series gives the same values as the batch functions: anchored VWAP
+bands (``vwap.AnchoredVWAP``), TD Sequential setup/countdown, Gap-Hunter
+fill states and spot/perp CVD.
+
+``replay`` stands in for a websocket: it plays bar files back as four
+ticks per bar (open, the extreme nearer the open, the other, close) and
+the runtime records the time from ``publish`` to the end of the last
+indicator update of every tick.
+
+    python live.py btc_1m.csv [--symbols 8] [--queue 1024] [--rate TICKS_PER_SEC]
+"""
+import argparse
+import asyncio
+import collections
+import copy
+import time
+
+import numpy as np
+
+from bars import BarStore
+from gaps import CME_GAP_THRESHOLD, FILLED, MIN_GAP_USD, PARTIAL, UNFILLED
+from resample import infer_interval
+from td_sequential import COUNTDOWN_LIMIT, DIRECTIONS, SETUP_LENGTH, TDResult
+from vwap import AnchoredVWAP
+
+DAY = 86400
+
+Tick = collections.namedtuple("Tick", "symbol time price size")
+Bar = collections.namedtuple("Bar", "symbol time open high low close volume")
+Latency = collections.namedtuple("Latency", "count p50 p90 p99 p999 max")
+
+
+# ─────────────────────────────────────────────────────────────
+# Bars from ticks
+# ─────────────────────────────────────────────────────────────
+class BarBuilder:
+    """Folds one symbol's ticks into ``interval``-second bars."""
+
+    __slots__ = ("symbol", "interval", "_start", "_o", "_h", "_l", "_c", "_v")
+
+    def __init__(self, symbol, interval):
+        self.symbol = symbol
+        self.interval = float(interval)
+        self._start = None
+
+    def forming(self):
+        if self._start is None:
+            return None
+        return Bar(self.symbol, self._start, self._o, self._h, self._l, self._c, self._v)
+
+    def on_tick(self, tick):
+        """Add a tick; returns the bar it closed, if any."""
+        start = (tick.time // self.interval) * self.interval
+        closed = None
+        if start != self._start:
+            closed = self.forming()
+            self._start = start
+            self._o = self._h = self._l = tick.price
+            self._v = 0.0
+        else:
+            self._h = max(self._h, tick.price)
+            self._l = min(self._l, tick.price)
+        self._c = tick.price
+        self._v += tick.size
+        return closed
+
+    def flush(self):
+        bar = self.forming()
+        self._start = None
+        return bar
+
+
+# ─────────────────────────────────────────────────────────────
+# Indicators
+# ─────────────────────────────────────────────────────────────
+class Indicator:
+    """Base for live indicators: ``on_bar`` commits, ``on_tick`` previews."""
+
+    __slots__ = ()
+
+    def on_bar(self, bar):
+        raise NotImplementedError
+
+    def on_tick(self, bar):
+        raise NotImplementedError
+
+
+class VWAPBands(Indicator):
+    """Anchored VWAP and SD bands; returns ``(vwap, sd)``."""
+
+    __slots__ = ("engine",)
+
+    def __init__(self, anchor="year", source="hlc3", mode="welford"):
+        self.engine = AnchoredVWAP(anchor, source, mode)
+
+    def on_bar(self, bar):
+        return self.engine.update(bar[1:])
+
+    def on_tick(self, bar):
+        # The engine's state is a handful of floats: copying it is O(1).
+        return copy.copy(self.engine).update(bar[1:])
+
+
+class TDCount(Indicator):
+    """
+    TD Sequential setup and countdown bar by bar, as a TDResult of ints.
+    Options are those of ``td_sequential.td_sequential``.
+    """
+
+    __slots__ = ("lookback", "buy_sign", "reset_on_equal", "wrap_at_9", "with_countdown",
+                 "_closes", "_hl", "_sign", "_run", "_buy", "_sell", "_side", "_count")
+
+    def __init__(self, lookback=4, direction="normal", reset_on_equal=True, wrap_at_9=False,
+                 with_countdown=True):
+        if direction not in DIRECTIONS:
+            raise ValueError(f"direction must be one of {DIRECTIONS}, got {direction!r}")
+        self.lookback = lookback
+        self.buy_sign = -1 if direction == "normal" else 1
+        self.reset_on_equal = reset_on_equal
+        self.wrap_at_9 = wrap_at_9
+        self.with_countdown = with_countdown
+        self._closes = ()           # up to ``lookback`` previous closes, oldest first
+        self._hl = ()               # (high, low) of the two previous bars
+        self._sign = None
+        self._run = self._buy = self._sell = 0
+        self._side = self._count = 0
+
+    def _wrap(self, count):
+        if self.wrap_at_9 and count > 0:
+            return (count - 1) % SETUP_LENGTH + 1
+        return count
+
+    def _step(self, bar):
+        """(new state, TDResult) for ``bar``; self is not modified."""
+        c = bar.close
+        if len(self._closes) < self.lookback:
+            sign = 2
+        else:
+            ref = self._closes[0]
+            sign = int(c > ref) - int(c < ref)
+        run, held_buy, held_sell = self._run, self._buy, self._sell
+        if self.reset_on_equal:
+            run = run + 1 if sign == self._sign else 1
+            w = self._wrap(run)
+            buy = w if sign == self.buy_sign else 0
+            sell = w if sign == -self.buy_sign else 0
+        else:
+            held_buy = held_buy + 1 if sign == self.buy_sign else (held_buy if sign == 0 else 0)
+            held_sell = held_sell + 1 if sign == -self.buy_sign else (held_sell if sign == 0 else 0)
+            buy, sell = self._wrap(held_buy), self._wrap(held_sell)
+
+        side, count = self._side, self._count
+        buy_cd = sell_cd = 0
+        if self.with_countdown:
+            if buy == SETUP_LENGTH or sell == SETUP_LENGTH:
+                side, count = (1 if buy == SETUP_LENGTH else -1), 0
+            if side and len(self._hl) == 2:
+                h2, l2 = self._hl[0]
+                count += (c <= l2) if side == 1 else (c >= h2)
+            cd = count if count < COUNTDOWN_LIMIT else 0
+            buy_cd, sell_cd = (cd, 0) if side == 1 else (0, cd)
+
+        state = ((self._closes + (c,))[-self.lookback:], (self._hl + ((bar.high, bar.low),))[-2:],
+                 sign, run, held_buy, held_sell, side, count)
+        return state, TDResult(buy, sell, buy_cd, sell_cd)
+
+    def on_bar(self, bar):
+        state, out = self._step(bar)
+        (self._closes, self._hl, self._sign, self._run, self._buy, self._sell,
+         self._side, self._count) = state
+        return out
+
+    def on_tick(self, bar):
+        return self._step(bar)[1]
+
+
+class GapHunter(Indicator):
+    """
+    CME gaps on H4 bars with Gap-Hunter fill states, tracked against the
+    same bars.  Returns the dashboard counts (see ``gaps.dashboard``).
+    """
+
+    __slots__ = ("threshold", "min_gap", "gaps", "_prev_time", "_prev_close")
+
+    def __init__(self, threshold=CME_GAP_THRESHOLD, min_gap=MIN_GAP_USD):
+        self.threshold = threshold
+        self.min_gap = min_gap
+        self.gaps = []              # open gaps: [time, top, bot, state]
+        self._prev_time = self._prev_close = None
+
+    def _new_gap(self, bar):
+        pc = self._prev_close
+        if pc is None or bar.time - self._prev_time <= self.threshold:
+            return None
+        if abs(bar.open - pc) < self.min_gap or bar.open == pc:
+            return None
+        return [bar.time, max(bar.open, pc), min(bar.open, pc), UNFILLED]
+
+    def _states(self, bar, gaps):
+        out = []
+        for g in gaps:
+            _, top, bot, _ = g
+            if bot <= bar.close <= top:
+                state = FILLED
+            elif bar.high >= bot and bar.low <= top:
+                state = PARTIAL
+            else:
+                state = UNFILLED
+            out.append(state)
+        return out
+
+    def _evaluate(self, bar, commit):
+        gap = self._new_gap(bar)
+        gaps = self.gaps + [gap] if gap else self.gaps
+        states = self._states(bar, gaps)
+        counts = {"above": 0, "partial": 0, "below": 0}
+        for (_, top, bot, _), state in zip(gaps, states):
+            if state == PARTIAL:
+                counts["partial"] += 1
+            elif state == UNFILLED:
+                if bot > bar.close:
+                    counts["above"] += 1
+                elif top < bar.close:
+                    counts["below"] += 1
+        if commit:
+            # Filled is final: drop those gaps from the open list.
+            self.gaps = [g[:3] + [s] for g, s in zip(gaps, states) if s != FILLED]
+            self._prev_time, self._prev_close = bar.time, bar.close
+        return counts
+
+    def on_bar(self, bar):
+        return self._evaluate(bar, True)
+
+    def on_tick(self, bar):
+        return self._evaluate(bar, False)
+
+
+class SpotPerpCVD(Indicator):
+    """
+    Spot and perp CVD across venue symbols (``venues.spot_perp`` in CVD mode,
+    unsmoothed and unnormalised).  ``groups`` maps symbol -> "spot"/"perp".
+    Returns ``(spot, perp)``.
+
+    Each venue keeps its own session total and a group's CVD sums the
+    venues already in the group's latest session, so venues whose
+    consumers run at different speeds never reset each other.
+    """
+
+    __slots__ = ("groups", "intraday", "_cvd", "_day")
+
+    def __init__(self, groups, intraday=True):
+        self.groups = dict(groups)
+        self.intraday = intraday
+        self._cvd = dict.fromkeys(self.groups, 0.0)
+        self._day = dict.fromkeys(self.groups)
+
+    def _session(self, bar):
+        day = bar.time // DAY if self.intraday else 0
+        v = bar.volume if bar.volume == bar.volume else 0.0
+        delta = v if bar.close >= bar.open else -v
+        base = self._cvd[bar.symbol] if self._day[bar.symbol] == day else 0.0
+        return day, base + delta
+
+    def _totals(self, day, cvd):
+        out = {}
+        for g in ("spot", "perp"):
+            members = [s for s, grp in self.groups.items() if grp == g and day[s] is not None]
+            latest = max((day[s] for s in members), default=None)
+            out[g] = sum(cvd[s] for s in members if day[s] == latest)
+        return out["spot"], out["perp"]
+
+    def on_bar(self, bar):
+        self._day[bar.symbol], self._cvd[bar.symbol] = self._session(bar)
+        return self._totals(self._day, self._cvd)
+
+    def on_tick(self, bar):
+        day, cvd = dict(self._day), dict(self._cvd)
+        day[bar.symbol], cvd[bar.symbol] = self._session(bar)
+        return self._totals(day, cvd)
+
+
+# ─────────────────────────────────────────────────────────────
+# Runtime
+# ─────────────────────────────────────────────────────────────
+_CLOSE = object()
+
+
+class Runtime:
+    """
+    Multiplexes symbols on one event loop.
+
+    ``add_symbol`` registers a symbol's bar interval, ``subscribe`` attaches
+    a named indicator to one or more symbols, ``publish`` enqueues a tick
+    (waiting while the symbol's queue is full) and ``run`` drives the
+    consumers until ``close``.  ``sink(symbol, name, value, closed)``, if
+    given, receives every update; ``latest`` holds the last one per name.
+    Latencies of the most recent ``latency_window`` ticks are kept.
+    """
+
+    def __init__(self, maxsize=1024, sink=None, latency_window=1 << 20):
+        self.maxsize = maxsize
+        self.sink = sink
+        self.latest = {}
+        self.stalls = 0             # publishes that had to wait for room
+        self._builders = {}
+        self._queues = {}
+        self._subs = collections.defaultdict(list)
+        self._latency = collections.deque(maxlen=latency_window)
+
+    def add_symbol(self, symbol, interval):
+        self._builders[symbol] = BarBuilder(symbol, interval)
+        self._queues[symbol] = asyncio.Queue(self.maxsize)
+
+    def subscribe(self, name, indicator, symbols):
+        for s in ([symbols] if isinstance(symbols, str) else symbols):
+            if s not in self._builders:
+                raise ValueError(f"unknown symbol {s!r}; call add_symbol first")
+            self._subs[s].append((name, indicator))
+
+    async def publish(self, tick):
+        queue = self._queues[tick.symbol]
+        if queue.full():
+            self.stalls += 1
+        await queue.put((time.perf_counter_ns(), tick))
+
+    async def close(self):
+        for queue in self._queues.values():
+            await queue.put(_CLOSE)
+
+    def _dispatch(self, symbol, bar, closed):
+        for name, ind in self._subs[symbol]:
+            value = ind.on_bar(bar) if closed else ind.on_tick(bar)
+            self.latest[name] = value
+            if self.sink is not None:
+                self.sink(symbol, name, value, closed)
+
+    async def _consume(self, symbol):
+        queue, builder = self._queues[symbol], self._builders[symbol]
+        record = self._latency.append
+        while True:
+            item = await queue.get()
+            if item is _CLOSE:
+                bar = builder.flush()
+                if bar is not None:
+                    self._dispatch(symbol, bar, True)
+                return
+            stamp, tick = item
+            closed = builder.on_tick(tick)
+            if closed is not None:
+                self._dispatch(symbol, closed, True)
+            self._dispatch(symbol, builder.forming(), False)
+            record(time.perf_counter_ns() - stamp)
+
+    async def run(self):
+        await asyncio.gather(*(self._consume(s) for s in self._queues))
+
+    def latency(self):
+        """Tick-to-update latency percentiles in microseconds."""
+        lat = np.fromiter(self._latency, dtype=np.float64, count=len(self._latency)) / 1e3
+        if not len(lat):
+            return Latency(0, *([float("nan")] * 5))
+        p = np.percentile(lat, [50, 90, 99, 99.9])
+        return Latency(len(lat), *p.tolist(), float(lat.max()))
+
+
+# ─────────────────────────────────────────────────────────────
+# Replay
+# ─────────────────────────────────────────────────────────────
+def ticks_from_bars(symbol, bars, interval=None):
+    """
+    Four ticks per bar within the bar's interval: open, the extreme nearer
+    the open, the other extreme, close; each carries a quarter of the
+    volume.  Rebuilding bars from them gives back the original OHLCV.
+    """
+    interval = infer_interval(bars.time) if interval is None else interval
+    t, o, h, l, c = (np.asarray(bars[k], dtype=np.float64) for k in ("time", "open", "high", "low", "close"))
+    v = np.nan_to_num(np.asarray(bars.volume, dtype=np.float64)) / 4
+    low_first = (o - l) <= (h - o)
+    first = np.where(low_first, l, h)
+    second = np.where(low_first, h, l)
+    for i in range(len(t)):
+        for k, price in enumerate((o[i], first[i], second[i], c[i])):
+            yield Tick(symbol, float(t[i] + k * interval / 4), float(price), float(v[i]))
+
+
+async def replay(runtime, streams, rate=None):
+    """
+    Play ``{symbol: BarStore}`` through ``runtime`` concurrently, one
+    producer per symbol, optionally paced to ``rate`` ticks/s per symbol.
+    Returns the latency report once every queue has drained.
+    """
+    for symbol, bars in streams.items():
+        if symbol not in runtime._builders:
+            runtime.add_symbol(symbol, infer_interval(bars.time))
+
+    async def produce(symbol, bars):
+        for tick in ticks_from_bars(symbol, bars, runtime._builders[symbol].interval):
+            await runtime.publish(tick)
+            if rate:
+                await asyncio.sleep(1.0 / rate)
+
+    consumers = asyncio.ensure_future(runtime.run())
+    producers = asyncio.gather(*(produce(s, b) for s, b in streams.items()))
+    await asyncio.wait({producers, consumers}, return_when=asyncio.FIRST_COMPLETED)
+    if consumers.done():
+        # Consumers only stop early by raising; producers would block on
+        # their full queues forever.
+        producers.cancel()
+        await asyncio.gather(producers, return_exceptions=True)
+        consumers.result()
+    await producers
+    await runtime.close()
+    await consumers
+    return runtime.latency()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Replay bars through the live indicator runtime.")
+    ap.add_argument("path")
+    ap.add_argument("--symbols", type=int, default=1, help="replay the file as this many symbols")
+    ap.add_argument("--queue", type=int, default=1024)
+    ap.add_argument("--rate", type=float, default=0.0, help="ticks/s per symbol (0: as fast as possible)")
+    ap.add_argument("--anchor", default="year")
+    args = ap.parse_args(argv)
+    bars = BarStore.from_csv(args.path)
+    runtime = Runtime(maxsize=args.queue)
+    streams = {f"SYM{k}": bars for k in range(args.symbols)}
+    for symbol in streams:
+        runtime.add_symbol(symbol, infer_interval(bars.time))
+        runtime.subscribe(f"{symbol}/vwap", VWAPBands(args.anchor), symbol)
+        runtime.subscribe(f"{symbol}/td", TDCount(), symbol)
+        runtime.subscribe(f"{symbol}/gaps", GapHunter(), symbol)
+    start = time.perf_counter()
+    lat = asyncio.run(replay(runtime, streams, args.rate or None))
+    elapsed = time.perf_counter() - start
+    print(f"{lat.count} ticks in {elapsed:.2f}s ({lat.count / elapsed:,.0f}/s), "
+          f"{runtime.stalls} publishes waited for queue room")
+    print(f"latency us: p50={lat.p50:.1f} p90={lat.p90:.1f} p99={lat.p99:.1f} "
+          f"p99.9={lat.p999:.1f} max={lat.max:.1f}")
+    for name, value in sorted(runtime.latest.items())[:6]:
+        print(f"  {name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Many anchored VWAPs over one bar array (agg_vwap.pine).
+
+agg_vwap.pine runs ``vwap_from_anchor`` once per anchor date.  Here the
+whole array is reduced once to prefix sums of volume, v*d and v*d^2 with
+``d = tp - K`` for one reference price K; the VWAP/SD anchored at bar s is
+then, for every bar i >= s, a difference of two prefix sums:
+
+    V = P0[i+1] - P0[s]      D = P1[i+1] - P1[s]      Q = P2[i+1] - P2[s]
+    vwap = K + D / V         sd = sqrt(Q / V - (D / V)^2)
+
+so each extra anchor costs O(1) per bar and nothing more to set up.  A
+late anchor's short window is a small difference of two large totals (the
+cancellation ``vwap.segmented_cumsum`` avoids by restarting per period), so
+the prefix sums are kept in long double and taken about K, the
+volume-weighted mean price; each difference is rounded to float64 only
+once it is small.
+
+Like the script, an anchor date starts accumulating at the first bar on or
+after 00:00 UTC of that day.  (On intraday charts the Pine helper resets
+on *every* bar of the anchor day; on the daily exports the two agree.)
+
+``search_anchors`` scores every candidate anchor day against the exported
+``Rolling VWAP 1-4`` columns, evaluating candidates x bars in fixed-size
+blocks so memory stays bounded however many of either there are.
+
+    python multi_anchor.py agg_vwap_export.csv [--top K] [--block-bars N]
+"""
+import argparse
+import collections
+import datetime
+
+import numpy as np
+
+from bars import BarStore
+from vwap import VWAPResult, typical_price
+
+DAY = 86400
+
+AGG_ANCHORS = ("2022-11-21", "2024-01-11", "2024-08-05", "2024-04-20")
+EXPORT_COLUMNS = tuple(f"Rolling VWAP {k}" for k in range(1, 5))
+
+AnchorMatch = collections.namedtuple("AnchorMatch", "anchor_time start rmse coverage")
+
+
+def anchor_time(anchor):
+    """UTC seconds of an anchor given as "YYYY-MM-DD", (y, m, d) or seconds."""
+    if isinstance(anchor, str):
+        anchor = datetime.date.fromisoformat(anchor)
+    elif isinstance(anchor, tuple):
+        anchor = datetime.date(*anchor)
+    if isinstance(anchor, datetime.date):
+        return float((anchor - datetime.date(1970, 1, 1)).days * DAY)
+    return float(anchor)
+
+
+class PrefixSums:
+    """Shifted long-double prefix sums of (v, v*d, v*d^2); index k covers bars < k."""
+
+    __slots__ = ("ref", "p0", "p1", "p2")
+
+    def __init__(self, tp, volume):
+        tp = np.asarray(tp, dtype=np.float64)
+        volume = np.broadcast_to(np.asarray(volume, dtype=np.float64), tp.shape)
+        total = volume.sum()
+        self.ref = float((tp * volume).sum() / total) if total > 0 else 0.0
+        d = tp - self.ref
+        vd = volume * d
+        self.p0, self.p1, self.p2 = (np.concatenate([[0.0], np.cumsum(x, dtype=np.longdouble)])
+                                     for x in (volume, vd, vd * d))
+
+    def __len__(self):
+        return len(self.p0) - 1
+
+    def window(self, start, end):
+        """VWAPResult for bars [start, end) with a (k, 1) start per anchor."""
+        v = (self.p0[end] - self.p0[start]).astype(np.float64)
+        d = (self.p1[end] - self.p1[start]).astype(np.float64)
+        q = (self.p2[end] - self.p2[start]).astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_d = np.where(v > 0, d / v, np.nan)
+            var = np.maximum(q / v - mean_d * mean_d, 0.0)
+        return VWAPResult(self.ref + mean_d, np.sqrt(var))
+
+    def anchored(self, starts, lo=0, hi=None):
+        """
+        (k, hi - lo) VWAP/SD of bars lo..hi-1 for anchors starting at bar
+        ``starts``; NaN on bars before an anchor's start.
+        """
+        hi = len(self) if hi is None else hi
+        starts = np.asarray(starts, dtype=np.int64)[:, None]
+        i = np.arange(lo, hi)[None, :]
+        # (k, 1) anchor sums broadcast against (1, b) bar sums: no (k, b) gathers.
+        res = self.window(starts, i + 1)
+        before = i < starts
+        return VWAPResult(np.where(before, np.nan, res.vwap), np.where(before, np.nan, res.sd))
+
+
+def anchor_starts(time, anchors):
+    """First bar index on or after each anchor day (len(time) if none)."""
+    times = np.array([anchor_time(a) for a in anchors])
+    return np.searchsorted(np.asarray(time, dtype=np.float64), times, side="left")
+
+
+def multi_anchor_vwap(time, tp, volume, anchors=AGG_ANCHORS):
+    """(k, n) VWAPResult for k anchors from a single prefix-sum pass."""
+    sums = PrefixSums(tp, volume)
+    return sums.anchored(anchor_starts(time, anchors))
+
+
+def multi_anchor_vwap_bars(bars, anchors=AGG_ANCHORS, source="hlc3"):
+    return multi_anchor_vwap(bars.time, typical_price(bars, source), bars.volume, anchors)
+
+
+# ─────────────────────────────────────────────────────────────
+# Anchor search
+# ─────────────────────────────────────────────────────────────
+def candidate_starts(time):
+    """First bar of every UTC day: one candidate anchor per day."""
+    day = np.floor_divide(np.asarray(time, dtype=np.float64), DAY)
+    if not len(day):
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(np.concatenate([[True], day[1:] != day[:-1]]))
+
+
+def search_anchors(bars, columns=EXPORT_COLUMNS, source="hlc3", candidates=None,
+                   top=5, min_coverage=0.9, block_anchors=256, block_bars=1 << 14):
+    """
+    Rank candidate anchors for each exported VWAP column by RMSE.
+
+    ``candidates`` are start bar indices (default: the first bar of every
+    day).  A candidate is compared on the bars where both it and the export
+    have a value; candidates covering less than ``min_coverage`` of the
+    export's valid bars are dropped.  Work proceeds in
+    ``block_anchors x block_bars`` tiles, and each tile's VWAP is computed
+    once and scored against every column.
+
+    Returns ``{column: [AnchorMatch, ...]}`` best first.
+    """
+    columns = [c for c in columns if c in bars]
+    sums = PrefixSums(typical_price(bars, source), bars.volume)
+    n = len(sums)
+    # Ranking needs VWAP only, and float64 differences (~1e-11 relative)
+    # are ample for it, so tiles skip the long-double and SD work.
+    p0, p1 = sums.p0.astype(np.float64), sums.p1.astype(np.float64)
+    starts = candidate_starts(bars.time) if candidates is None else np.asarray(candidates, dtype=np.int64)
+    targets = np.vstack([np.asarray(bars[c], dtype=np.float64) for c in columns]) if columns else np.empty((0, n))
+    valid = ~np.isnan(targets)
+    k = len(columns)
+
+    sq = np.zeros((k, len(starts)))
+    cnt = np.zeros((k, len(starts)))
+    for a0 in range(0, len(starts), block_anchors):
+        s = starts[a0:a0 + block_anchors]
+        if not len(s):
+            continue
+        for b0 in range(int(s.min()), n, block_bars):
+            b1 = min(b0 + block_bars, n)
+            vol = p0[None, b0 + 1:b1 + 1] - p0[s, None]                # (a, b)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                res = sums.ref + (p1[None, b0 + 1:b1 + 1] - p1[s, None]) / vol
+            have = (np.arange(b0, b1)[None, :] >= s[:, None]) & (vol > 0)
+            for j in range(k):
+                ok = have & valid[j, b0:b1]
+                err = np.where(ok, res - targets[j, b0:b1], 0.0)
+                sq[j, a0:a0 + len(s)] += np.einsum("ab,ab->a", err, err)
+                cnt[j, a0:a0 + len(s)] += ok.sum(axis=1)
+
+    out = {}
+    time = np.asarray(bars.time, dtype=np.float64)
+    for j, col in enumerate(columns):
+        need = max(int(valid[j].sum()), 1)
+        coverage = cnt[j] / need
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rmse = np.sqrt(sq[j] / cnt[j])
+        rmse[coverage < min_coverage] = np.inf
+        order = np.argsort(rmse, kind="stable")[:top]
+        out[col] = [AnchorMatch(float(time[starts[a]]), int(starts[a]), float(rmse[a]), float(coverage[a]))
+                    for a in order if np.isfinite(rmse[a])]
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Find the anchor days behind exported Rolling VWAP columns.")
+    ap.add_argument("path")
+    ap.add_argument("--top", type=int, default=5)
+    ap.add_argument("--source", default="hlc3")
+    ap.add_argument("--block-bars", type=int, default=1 << 14)
+    args = ap.parse_args(argv)
+    bars = BarStore.from_csv(args.path)
+    for col, matches in search_anchors(bars, source=args.source, top=args.top,
+                                       block_bars=args.block_bars).items():
+        print(col)
+        for m in matches:
+            day = datetime.datetime.fromtimestamp(m.anchor_time, datetime.timezone.utc).date()
+            print(f"  {day}  bar {m.start:6d}  rmse={m.rmse:.4f}  coverage={m.coverage:.0%}")
+
+
+if __name__ == "__main__":
+    main()
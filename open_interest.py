@@ -0,0 +1,458 @@
+"""
+Aggregated open interest, OI delta/rVOL/RSI, screener and distribution
+profile (the "Aggregated open interest" OI Suite script).
+
+Six OI feeds are summed with ``nz`` on the chart timeline: the Binance
+USDT/BUSD perps report OI in coin, the USD-margined feeds (Binance USD,
+BitMEX USD/USDT, Kraken USD) in contracts of one dollar and are divided by
+the chart close.  Each feed's delta is ``close - close[1]`` on the feed's
+own bars, so a feed that skips a chart bar still diffs against its own
+previous print.  Every feed is added at its positions on the timeline, as
+in ``venues.aggregate``; no feed x bar matrix is built.
+
+The script's profile loops over every (bar, row) pair on each redraw.  A
+row at level L gains ``profSize`` for every pair of consecutive values whose
+closed range [a, b] contains L, so the rows covered by one pair are a
+contiguous index range: each pair adds +1 at its first row and -1 after its
+last and a single cumulative sum gives every row's count, O(bars + rows).
+``OIProfile`` keeps the pair ends in two sorted arrays instead, so a redraw
+after new bars costs O(rows log bars) plus merging in the new ends.
+
+The screener's four rolling dollar sums are prefix-sum windows in batch
+and running window sums in ``OIEngine.update``; both add up the same
+per-bar ``screener_flows``.
+"""
+import collections
+
+import numpy as np
+
+from value_area import value_area
+from venues import sma, timeline_positions
+
+QUOTES = ("USD", "COIN")
+SCREENER = ("rekt_longs", "rekt_shorts", "aggressive_longs", "aggressive_shorts")
+
+# (exchange, quote, OI in USD and so divided by the chart close)
+FEEDS = (
+    ("BINANCE", "USDT", False),
+    ("BINANCE", "USD", True),
+    ("BINANCE", "BUSD", False),
+    ("BITMEX", "USD", True),
+    ("BITMEX", "USDT", True),
+    ("KRAKEN", "USD", True),
+)
+
+BASE_NODE = 5       # x2 starts every row at 5 (array.new_int(rows + 1, 5))
+
+Feed = collections.namedtuple("Feed", "symbol in_usd time open high low close")
+OIBars = collections.namedtuple("OIBars", "open high low close delta")
+OISeries = collections.namedtuple(
+    "OISeries", "open high low close delta p_thresh n_thresh large_up large_dw rvol delta_rvol rsi ema")
+Profile = collections.namedtuple("Profile", "levels nodes poc va_lo va_hi")
+
+
+def feed_symbols(base="BTC"):
+    """The script's ``(symbol, in_usd)`` feed list; BitMEX spells BTC as XBT."""
+    out = []
+    for ex, quote, in_usd in FEEDS:
+        b = "XBT" if ex == "BITMEX" and base == "BTC" else base
+        out.append((f"{ex}:{b}{quote}.P_OI", in_usd))
+    return out
+
+
+def feed_from_bars(symbol, in_usd, bars):
+    """Wrap a BarStore of OI prints as a Feed."""
+    return Feed(symbol, bool(in_usd), bars.time, bars.open, bars.high, bars.low, bars.close)
+
+
+# ─────────────────────────────────────────────────────────────
+# Aggregation
+# ─────────────────────────────────────────────────────────────
+def aggregate_oi(feeds, timeline, close):
+    """
+    Coin-denominated OI candles and delta (``O H L C deltaOI``) on the chart
+    timeline.  Missing feeds, bars and first deltas count as zero.
+    """
+    timeline = np.asarray(timeline, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    n = len(timeline)
+    out = OIBars(*(np.zeros(n) for _ in OIBars._fields))
+    for f in feeds:
+        on, idx = timeline_positions(timeline, f.time)
+        c = np.asarray(f.close, dtype=np.float64)
+        delta = np.empty(len(c))
+        delta[:1] = np.nan
+        np.subtract(c[1:], c[:-1], out=delta[1:])
+        scale = 1.0 / close[idx] if f.in_usd else 1.0
+        for acc, values in zip(out, (f.open, f.high, f.low, c, delta)):
+            acc[idx] += np.nan_to_num(np.asarray(values, dtype=np.float64)[on] * scale)
+    return out
+
+
+# ─────────────────────────────────────────────────────────────
+# Smoothing
+# ─────────────────────────────────────────────────────────────
+def _exp_filter(x, alpha, y0):
+    """
+    ``y[t] = alpha * x[t] + (1 - alpha) * y[t-1]`` from ``y[-1] = y0``.
+
+    Within a block of B bars the recursion is the closed form
+    ``r^(k+1) y0 + alpha r^k cumsum(x_j r^-j)``; B is chosen so r^-B stays
+    below 1e200, so one Python step covers thousands of bars for the usual
+    Pine lengths.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    r = 1.0 - alpha
+    if r == 0.0:
+        return x.copy()
+    block = int(min(max(200 / -np.log10(r), 1), 8192))
+    out = np.empty(len(x))
+    k = np.arange(block)
+    rk, rinv = r ** k, r ** -k.astype(np.float64)
+    y = y0
+    for s in range(0, len(x), block):
+        xb = x[s:s + block]
+        m = len(xb)
+        yb = rk[:m] * (r * y + alpha * np.cumsum(xb * rinv[:m]))
+        out[s:s + m] = yb
+        y = yb[-1]
+    return out
+
+
+def _seeded_smooth(x, length, alpha):
+    """Pine ``ta.rma``/``ta.ema``: seeded by the first full ``ta.sma`` window."""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(len(x), np.nan)
+    mean = sma(x, length)
+    seed = np.flatnonzero(~np.isnan(mean))
+    if len(seed):
+        s = seed[0]
+        out[s] = mean[s]
+        out[s + 1:] = _exp_filter(x[s + 1:], alpha, out[s])
+    return out
+
+
+def rma(x, length):
+    return _seeded_smooth(x, length, 1.0 / length)
+
+
+def ema(x, length):
+    return _seeded_smooth(x, length, 2.0 / (length + 1))
+
+
+def _rsi_value(up, down):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(down == 0, 100.0, np.where(up == 0, 0.0, 100.0 - 100.0 / (1.0 + up / down)))
+
+
+def _changes(x):
+    x = np.asarray(x, dtype=np.float64)
+    ch = np.empty(len(x))
+    ch[:1] = np.nan
+    np.subtract(x[1:], x[:-1], out=ch[1:])
+    return np.maximum(ch, 0.0), np.maximum(-ch, 0.0)
+
+
+def rsi(x, length):
+    """``ta.rsi``: Wilder averages of up/down moves; 100 with no down moves."""
+    up, down = _changes(x)
+    return _rsi_value(rma(up, length), rma(down, length))
+
+
+# ─────────────────────────────────────────────────────────────
+# Indicator series
+# ─────────────────────────────────────────────────────────────
+def _check_quote(quote):
+    if quote not in QUOTES:
+        raise ValueError(f"quote must be one of {QUOTES}, got {quote!r}")
+
+
+def oi_series(oi, close, volume, quote="USD", d_mult=5.0, thresh_len=300,
+              rvol_len=20, rsi_len=20, ema_len=50):
+    """
+    Every plotted series of the script as an OISeries.
+
+    ``open``..``close`` are in ``quote`` units, ``delta`` stays in coin as in
+    the script; ``large_up``/``large_dw`` compare it with ``d_mult`` times
+    the 300-bar mean of its positive/negative parts.  ``rsi`` is taken on
+    the coin close (``ta.rsi(C, ...)``), ``ema`` on the quoted close.
+    """
+    _check_quote(quote)
+    close = np.asarray(close, dtype=np.float64)
+    mult = close if quote == "USD" else 1.0
+    delta = np.asarray(oi.delta, dtype=np.float64)
+    p_thresh = sma(np.maximum(delta, 0.0), thresh_len) * d_mult
+    n_thresh = sma(np.minimum(delta, 0.0), thresh_len) * d_mult
+    avg = sma(volume, rvol_len)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Pine's x / 0 is na.
+        rvol = np.where(avg != 0, np.asarray(volume, dtype=np.float64) / avg, np.nan)
+    quoted_close = oi.close * mult
+    return OISeries(oi.open * mult, oi.high * mult, oi.low * mult, quoted_close, delta,
+                    p_thresh, n_thresh, delta > p_thresh, delta < n_thresh, rvol, delta * rvol,
+                    rsi(oi.close, rsi_len), ema(quoted_close, ema_len))
+
+
+# ─────────────────────────────────────────────────────────────
+# Screener
+# ─────────────────────────────────────────────────────────────
+def screener_flows(delta, open_, close, large_up, large_dw):
+    """(4, n) per-bar dollar contributions, rows in ``SCREENER`` order."""
+    close = np.asarray(close, dtype=np.float64)
+    open_ = np.asarray(open_, dtype=np.float64)
+    usd = np.abs(np.asarray(delta, dtype=np.float64) * close)
+    down, up = close < open_, close > open_
+    flows = np.zeros((len(SCREENER), len(usd)))
+    for row, (big, side) in enumerate(((large_dw, down), (large_dw, up), (large_up, up), (large_up, down))):
+        np.copyto(flows[row], usd, where=big & side)
+    return flows
+
+
+def rolling_sum(x, length):
+    """Sum of the last ``length`` values (fewer on the first bars)."""
+    x = np.asarray(x, dtype=np.float64)
+    p = np.concatenate([[0.0], np.cumsum(x, dtype=np.longdouble)])
+    i = np.arange(1, len(x) + 1)
+    return (p[i] - p[np.maximum(i - length, 0)]).astype(np.float64)
+
+
+def screener(series, open_, close, lookback=200, use_rvol=False):
+    """
+    The screener table as of every bar: ``{name: rolling dollar sum}``.
+    ``use_rvol`` takes the OIΔ x rVOL delta, as the script does in that
+    display mode.
+    """
+    delta = series.delta_rvol if use_rvol else series.delta
+    flows = screener_flows(delta, open_, close, series.large_up, series.large_dw)
+    return {name: rolling_sum(f, lookback) for name, f in zip(SCREENER, flows)}
+
+
+# ─────────────────────────────────────────────────────────────
+# Distribution profile
+# ─────────────────────────────────────────────────────────────
+def profile_levels(lo, hi, rows=39):
+    """``dist``: rows + 1 levels from ``lo`` in steps of (hi - lo) / (rows + 1)."""
+    calc = (hi - lo) / (rows + 1)
+    return lo + np.arange(rows + 1) * calc
+
+
+def _level_range(levels, a, b):
+    """First level >= a and last level <= b per pair, from the uniform step."""
+    m = len(levels)
+    lo, calc = levels[0], levels[1] - levels[0] if m > 1 else 0.0
+    if calc <= 0:
+        inside = (a <= lo) & (b >= lo)
+        return np.where(inside, 0, m), np.where(inside, m - 1, -1)
+    first = np.clip(np.ceil((a - lo) / calc), 0, m).astype(np.int64)
+    last = np.clip(np.floor((b - lo) / calc), -1, m - 1).astype(np.int64)
+    # The division can land one row off; compare against the levels
+    # themselves so the rows match the script's ``>=``/``<=`` tests exactly.
+    first -= (first > 0) & (levels[np.maximum(first - 1, 0)] >= a)
+    first += (first < m) & (levels[np.minimum(first, m - 1)] < a)
+    last += (last < m - 1) & (levels[np.minimum(last + 1, m - 1)] <= b)
+    last -= (last >= 0) & (levels[np.maximum(last, 0)] > b)
+    return first, last
+
+
+def node_counts(values, levels):
+    """Pairs of consecutive values whose range covers each level (difference array)."""
+    v = np.asarray(values, dtype=np.float64)
+    v = v[~np.isnan(v)]
+    m = len(levels)
+    if len(v) < 2:
+        return np.zeros(m, dtype=np.int64)
+    first, last = _level_range(levels, np.minimum(v[:-1], v[1:]), np.maximum(v[:-1], v[1:]))
+    ok = first <= last
+    diff = np.bincount(first[ok], minlength=m + 1) - np.bincount(last[ok] + 1, minlength=m + 1)
+    return np.cumsum(diff[:m])
+
+
+def _profile(levels, counts, prof_size, vapct):
+    # array.shift(x2) drops level 0: node j is the box between levels j and j+1.
+    nodes = BASE_NODE + prof_size * counts[1:]
+    return Profile(levels, nodes, *value_area(nodes, vapct))
+
+
+def profile(values, rows=40, prof_size=2, vapct=70.0):
+    """
+    Distribution profile of ``values`` (the visible ``C_`` bars) with the
+    script's ``Rows`` input: ``rows - 1`` nodes, their POC and value area.
+    """
+    v = np.asarray(values, dtype=np.float64)
+    if not (~np.isnan(v)).any():
+        raise ValueError("profile needs at least one non-NaN value")
+    levels = profile_levels(np.nanmin(v), np.nanmax(v), rows - 1)
+    return _profile(levels, node_counts(v, levels), prof_size, vapct)
+
+
+class OIProfile:
+    """
+    Growing distribution profile: ``append`` values as bars arrive, then
+    ``profile`` redraws.  Matches ``profile`` on all values appended so far.
+
+    Pair ends live in two sorted arrays; a level's count is
+    ``#(low ends <= L) - #(high ends < L)``.  New ends are buffered and
+    merged on the next redraw.
+    """
+
+    __slots__ = ("_lows", "_highs", "_pending", "_last", "lo", "hi")
+
+    def __init__(self, values=None):
+        self._lows = np.empty(0)
+        self._highs = np.empty(0)
+        self._pending = []
+        self._last = np.nan
+        self.lo, self.hi = np.inf, -np.inf
+        if values is not None:
+            self.extend(values)
+
+    def extend(self, values):
+        v = np.asarray(values, dtype=np.float64)
+        v = v[~np.isnan(v)]
+        if not len(v):
+            return
+        if not np.isnan(self._last):
+            v = np.concatenate([[self._last], v])
+        self._last = v[-1]
+        self.lo, self.hi = min(self.lo, v.min()), max(self.hi, v.max())
+        if len(v) > 1:
+            self._pending.append((np.minimum(v[:-1], v[1:]), np.maximum(v[:-1], v[1:])))
+
+    def append(self, value):
+        self.extend([value])
+
+    def _merge(self):
+        if not self._pending:
+            return
+        for name, k in (("_lows", 0), ("_highs", 1)):
+            new = np.sort(np.concatenate([p[k] for p in self._pending]))
+            old = getattr(self, name)
+            setattr(self, name, np.insert(old, np.searchsorted(old, new), new))
+        self._pending = []
+
+    def counts(self, levels):
+        self._merge()
+        return (np.searchsorted(self._lows, levels, side="right")
+                - np.searchsorted(self._highs, levels, side="left"))
+
+    def profile(self, rows=40, prof_size=2, vapct=70.0):
+        if np.isnan(self._last):
+            raise ValueError("profile needs at least one non-NaN value")
+        levels = profile_levels(self.lo, self.hi, rows - 1)
+        return _profile(levels, self.counts(levels), prof_size, vapct)
+
+
+# ─────────────────────────────────────────────────────────────
+# Incremental engine
+# ─────────────────────────────────────────────────────────────
+class _Window:
+    """Running sum of the last ``length`` values; NaNs are counted, not summed."""
+
+    __slots__ = ("buf", "nan", "pos", "count", "nans", "total")
+
+    def __init__(self, length):
+        self.buf = np.zeros(length)
+        self.nan = np.zeros(length, dtype=bool)
+        self.pos = self.count = self.nans = 0
+        self.total = 0.0
+
+    def push(self, x):
+        length = len(self.buf)
+        bad = x != x
+        self.total += (0.0 if bad else x) - self.buf[self.pos]
+        self.buf[self.pos] = 0.0 if bad else x
+        self.nans += int(bad) - int(self.nan[self.pos])
+        self.nan[self.pos] = bad
+        self.pos = (self.pos + 1) % length
+        self.count = min(self.count + 1, length)
+        if self.pos == 0:
+            self.total = float(self.buf.sum())      # drop accumulated rounding
+
+    def mean(self):
+        """``ta.sma``: NaN until full or while a NaN is in the window."""
+        if self.count < len(self.buf) or self.nans:
+            return float("nan")
+        return self.total / len(self.buf)
+
+
+class _Smoother:
+    """Bar-by-bar ``ta.rma``/``ta.ema`` with the same sma seed as ``rma``/``ema``."""
+
+    __slots__ = ("alpha", "window", "value")
+
+    def __init__(self, length, alpha):
+        self.alpha = alpha
+        self.window = _Window(length)
+        self.value = float("nan")
+
+    def update(self, x):
+        self.window.push(x)
+        if self.value != self.value:
+            self.value = self.window.mean()
+        else:
+            self.value = self.alpha * x + (1.0 - self.alpha) * self.value
+        return self.value
+
+
+class OIEngine:
+    """
+    Bar-by-bar OI Suite for live feeds; each ``update`` is O(1).
+
+    ``update(bar, oi)`` takes the chart bar ``(time, open, high, low,
+    close, volume)`` and that bar's coin-denominated aggregate
+    ``(open, high, low, close, delta)`` (``aggregate_oi`` of the new bars)
+    and returns the bar's OISeries values.  ``screener`` holds the running
+    lookback sums and ``profile`` the distribution of ``C_`` since
+    ``profile_from`` (all bars by default).
+    """
+
+    __slots__ = ("quote", "d_mult", "use_rvol", "profile_from", "screener", "profile",
+                 "_pos", "_neg", "_vol", "_up", "_down", "_ema", "_flows", "_prev_c")
+
+    def __init__(self, quote="USD", d_mult=5.0, thresh_len=300, rvol_len=20, rsi_len=20,
+                 ema_len=50, lookback=200, use_rvol=False, profile_from=None):
+        _check_quote(quote)
+        self.quote = quote
+        self.d_mult = d_mult
+        self.use_rvol = use_rvol
+        self.profile_from = profile_from
+        self.profile = OIProfile()
+        self._pos, self._neg = _Window(thresh_len), _Window(thresh_len)
+        self._vol = _Window(rvol_len)
+        self._up, self._down = _Smoother(rsi_len, 1.0 / rsi_len), _Smoother(rsi_len, 1.0 / rsi_len)
+        self._ema = _Smoother(ema_len, 2.0 / (ema_len + 1))
+        self._flows = [_Window(lookback) for _ in SCREENER]
+        self.screener = dict.fromkeys(SCREENER, 0.0)
+        self._prev_c = float("nan")
+
+    def update(self, bar, oi):
+        t, o, h, l, c, vol = bar
+        oo, oh, ol, oc, delta = oi
+        mult = c if self.quote == "USD" else 1.0
+
+        self._pos.push(max(delta, 0.0))
+        self._neg.push(min(delta, 0.0))
+        p_thresh = self._pos.mean() * self.d_mult
+        n_thresh = self._neg.mean() * self.d_mult
+        large_up, large_dw = delta > p_thresh, delta < n_thresh
+        self._vol.push(vol)
+        avg = self._vol.mean()
+        rvol = vol / avg if avg != 0 else float("nan")
+
+        ch = oc - self._prev_c
+        self._prev_c = oc
+        up = self._up.update(max(ch, 0.0) if ch == ch else ch)
+        down = self._down.update(max(-ch, 0.0) if ch == ch else ch)
+        rsi_ = float(_rsi_value(up, down)) if up == up else float("nan")
+        ema_ = self._ema.update(oc * mult)
+
+        d = delta * rvol if self.use_rvol else delta
+        usd = abs(d * c)
+        hits = (large_dw and c < o, large_dw and c > o, large_up and c > o, large_up and c < o)
+        for name, window, hit in zip(SCREENER, self._flows, hits):
+            window.push(usd if hit else 0.0)
+            self.screener[name] = window.total
+        if self.profile_from is None or t >= self.profile_from:
+            self.profile.append(oc * mult)
+        return OISeries(oo * mult, oh * mult, ol * mult, oc * mult, delta, p_thresh, n_thresh,
+                        large_up, large_dw, rvol, delta * rvol, rsi_, ema_)
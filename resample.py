@@ -0,0 +1,263 @@
+"""
+Higher-timeframe bars from a base store, aligned like ``request.security``.
+
+``resample`` groups base bars into UTC calendar buckets (H1/H4/D by fixed
+seconds, W by ISO week starting Monday, M by calendar month) and reduces
+every bucket at once with ``ufunc.reduceat``: open = first, high = max,
+low = min, close = last, volume = sum.  A resampled bar's time is its
+bucket's start, as on TradingView.
+
+``align`` maps a higher-timeframe series back onto base bars with
+``barmerge.lookahead_off`` semantics on historical bars: a base bar sees
+the latest higher-timeframe bar that had *closed* by the base bar's own
+close, so a daily close appears on the day's last intraday bar and never
+earlier.  ``offset=1`` gives the ``close[1]`` form.
+
+``Resampler`` keeps every derived timeframe in memory and builds coarse
+frames from finer ones (H1 -> H4 -> D -> W/M), so the base bars are read
+once.  ``append`` only rebuilds each frame's last, possibly still-open
+bar plus whatever is new.
+"""
+import numpy as np
+
+from bars import BarStore
+
+DAY = 86400
+
+_FIXED = {"1": 60, "5": 300, "15": 900, "30": 1800, "60": 3600,
+          "120": 7200, "240": 4 * 3600, "D": DAY}
+_ALIASES = {"H1": "60", "H4": "240", "1D": "D", "1W": "W", "1M": "M"}
+TIMEFRAMES = ("60", "240", "D", "W", "M")
+_ORDER = ("1", "5", "15", "30", "60", "120", "240", "D", "W", "M")
+
+# Coarser frames are reduced from a finer frame whose buckets nest inside.
+_PARENT = {"240": "60", "D": "240", "W": "D", "M": "D"}
+
+_OHLCV = ("time", "open", "high", "low", "close", "volume")
+
+
+def normalize_tf(tf):
+    """Pine timeframe string ("60", "240", "D", "W", "M"; "H4" etc. accepted)."""
+    tf = _ALIASES.get(tf, tf)
+    if tf not in _FIXED and tf not in ("W", "M"):
+        raise ValueError(f"unsupported timeframe {tf!r}")
+    return tf
+
+
+def bucket_start(time, tf):
+    """Start time of the ``tf`` bucket containing each timestamp."""
+    tf = normalize_tf(tf)
+    t = np.asarray(time, dtype=np.float64)
+    if tf in _FIXED:
+        return np.floor_divide(t, _FIXED[tf]) * _FIXED[tf]
+    days = np.floor_divide(t, DAY)
+    if tf == "W":
+        # 1970-01-01 was a Thursday; ISO weeks start on Monday.
+        return (days - (days + 3) % 7) * DAY
+    months = days.astype(np.int64).astype("datetime64[D]").astype("datetime64[M]")
+    return months.astype("datetime64[s]").astype(np.float64)
+
+
+def bucket_end(start, tf):
+    """Close time (start of the next bucket) for bucket start times."""
+    tf = normalize_tf(tf)
+    start = np.asarray(start, dtype=np.float64)
+    if tf in _FIXED:
+        return start + _FIXED[tf]
+    if tf == "W":
+        return start + 7 * DAY
+    months = start.astype(np.int64).astype("datetime64[s]").astype("datetime64[M]")
+    return (months + 1).astype("datetime64[s]").astype(np.float64)
+
+
+def resample(columns, tf):
+    """
+    Reduce ``{time, open, high, low, close, volume}`` arrays to ``tf`` bars.
+
+    Returns the same columns plus ``end`` (bucket close time) and ``first``
+    (index of each bucket's first source row).
+    """
+    time = np.asarray(columns["time"], dtype=np.float64)
+    key = bucket_start(time, tf)
+    n = len(key)
+    change = np.empty(n, dtype=bool)
+    change[:1] = True
+    np.not_equal(key[1:], key[:-1], out=change[1:])
+    first = np.flatnonzero(change)
+    last = np.append(first[1:], n) - 1
+    out = {"time": key[first]}
+    if n:
+        out["open"] = np.asarray(columns["open"], dtype=np.float64)[first]
+        out["high"] = np.maximum.reduceat(np.asarray(columns["high"], dtype=np.float64), first)
+        out["low"] = np.minimum.reduceat(np.asarray(columns["low"], dtype=np.float64), first)
+        out["close"] = np.asarray(columns["close"], dtype=np.float64)[last]
+        out["volume"] = np.add.reduceat(np.asarray(columns["volume"], dtype=np.float64), first)
+    else:
+        for name in _OHLCV[1:]:
+            out[name] = np.empty(0)
+    out["end"] = bucket_end(out["time"], tf)
+    out["first"] = first
+    return out
+
+
+def resample_bars(bars, tf):
+    """``resample`` of a BarStore, as a BarStore (with an ``end`` column)."""
+    frame = resample({name: bars[name] for name in _OHLCV}, tf)
+    del frame["first"]
+    return BarStore(frame)
+
+
+def align_index(htf_end, base_close):
+    """
+    Index of the higher-timeframe bar each base bar sees under
+    ``lookahead_off``: the last one with ``end <= base close``; -1 if none.
+    """
+    return np.searchsorted(htf_end, base_close, side="right") - 1
+
+
+def align(values, index, offset=0):
+    """Higher-timeframe ``values[index - offset]`` per base bar; NaN where na."""
+    values = np.asarray(values, dtype=np.float64)
+    j = np.asarray(index) - offset
+    out = np.full(len(j), np.nan)
+    ok = j >= 0
+    out[ok] = values[j[ok]]
+    return out
+
+
+def infer_interval(time):
+    """Base bar length in seconds: the smallest positive gap between bars."""
+    d = np.diff(np.asarray(time, dtype=np.float64))
+    d = d[d > 0]
+    return float(d.min()) if len(d) else 60.0
+
+
+def security(bars, tf, values="close", offset=0, interval=None):
+    """
+    One-shot ``request.security(tf, values, lookahead_off)`` on base bars.
+    ``values`` is a column name of the resampled frame.
+    """
+    frame = resample({name: bars[name] for name in _OHLCV}, tf)
+    interval = infer_interval(bars.time) if interval is None else interval
+    index = align_index(frame["end"], np.asarray(bars.time) + interval)
+    return align(frame[values], index, offset)
+
+
+# ─────────────────────────────────────────────────────────────
+# Incremental multi-timeframe cache
+# ─────────────────────────────────────────────────────────────
+class _Columns:
+    """Equal-length growable float/int columns with amortised O(1) appends."""
+
+    __slots__ = ("_data", "_len")
+
+    def __init__(self, dtypes):
+        self._data = {name: np.empty(64, dtype=dt) for name, dt in dtypes.items()}
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, name):
+        return self._data[name][:self._len]
+
+    def truncate(self, length):
+        self._len = length
+
+    def extend(self, columns):
+        add = len(next(iter(columns.values())))
+        need = self._len + add
+        for name, arr in self._data.items():
+            if need > len(arr):
+                grown = np.empty(max(need, 2 * len(arr)), dtype=arr.dtype)
+                grown[:self._len] = arr[:self._len]
+                self._data[name] = arr = grown
+            arr[self._len:need] = columns[name]
+        self._len = need
+
+
+_FRAME_DTYPES = dict({name: np.float64 for name in _OHLCV}, end=np.float64, first=np.int64)
+
+
+class Resampler:
+    """
+    Cached H1/H4/D/W/M frames over a growing base series.
+
+    ``append`` takes new base bars (a BarStore or a dict of OHLCV arrays,
+    strictly after the bars already held).  ``frame(tf)`` returns the
+    resampled bars, the last of which may still be forming, and
+    ``security(tf, column)`` the lookahead-free base-aligned series.
+    Without an ``interval`` the base bar length is inferred from the bars
+    held, and refined (re-aligning every bar) if a shorter spacing appears.
+    """
+
+    def __init__(self, bars=None, timeframes=TIMEFRAMES, interval=None):
+        tfs = [normalize_tf(tf) for tf in timeframes]
+        self.timeframes = sorted(set(tfs), key=_ORDER.index)
+        self.interval = interval
+        self._infer = interval is None      # self.interval stays None until two base bars
+        self._base = _Columns({name: np.float64 for name in _OHLCV})
+        self._frames = {tf: _Columns(_FRAME_DTYPES) for tf in self.timeframes}
+        self._index = {tf: _Columns({"i": np.int64}) for tf in self.timeframes}
+        if bars is not None:
+            self.append(bars)
+
+    def __len__(self):
+        return len(self._base)
+
+    def _source(self, tf):
+        parent = _PARENT.get(tf)
+        while parent is not None and parent not in self._frames:
+            parent = _PARENT.get(parent)
+        return parent
+
+    def append(self, bars):
+        new = {name: np.asarray(bars[name], dtype=np.float64) for name in _OHLCV}
+        added = len(new["time"])
+        if not added:
+            return
+        old_base = len(self._base)
+        self._base.extend(new)
+        aligned = old_base
+        if self._infer and len(self._base) > 1:
+            # Smallest bar spacing seen so far; when it changes, the base rows
+            # already aligned were closed at the wrong time and are redone.
+            interval = infer_interval(self._base["time"][max(old_base - 1, 0):])
+            if self.interval is None or interval < self.interval:
+                self.interval = interval
+                aligned = 0
+        dirty = {None: old_base}            # first source row that changed
+        for tf in self.timeframes:
+            src = self._source(tf)
+            frame = self._frames[tf]
+            # Bars wholly before the first changed source row are final; rebuild
+            # from the bar holding that row (or the last, still-open bar).
+            keep = max(int(np.searchsorted(frame["first"], dirty[src], side="right")) - 1, 0)
+            row = int(frame["first"][keep]) if keep < len(frame) else 0
+            source = self._base if src is None else self._frames[src]
+            part = resample({name: source[name][row:] for name in _OHLCV}, tf)
+            part["first"] = part["first"] + row
+            frame.truncate(keep)
+            frame.extend(part)
+            dirty[tf] = keep
+        # A lone first bar has no known length yet: close it at its open time,
+        # so no higher-timeframe bar can count as finished on it.
+        base_close = self._base["time"][aligned:] + (self.interval or 0.0)
+        for tf in self.timeframes:
+            index = self._index[tf]
+            index.truncate(aligned)
+            index.extend({"i": align_index(self._frames[tf]["end"], base_close)})
+
+    def frame(self, tf):
+        """Resampled bars for ``tf`` as a BarStore (zero-copy views)."""
+        f = self._frames[normalize_tf(tf)]
+        return BarStore({name: f[name] for name in _OHLCV + ("end",)})
+
+    def aligned_index(self, tf):
+        """Per base bar, the ``lookahead_off`` higher-timeframe bar index (-1 = na)."""
+        return self._index[normalize_tf(tf)]["i"]
+
+    def security(self, tf, values="close", offset=0):
+        """``request.security(tf, values[offset], lookahead_off)`` for every base bar."""
+        tf = normalize_tf(tf)
+        return align(self._frames[tf][values], self._index[tf]["i"], offset)
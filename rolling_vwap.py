@@ -0,0 +1,104 @@
+"""
+Calendar-time rolling VWAP and SD (``rv_days`` in Agg-MTF-VWAP.pine,
+``rvwap_days`` in yearly_anchored_vwap.pine).
+
+The Pine scripts approximate an N-day window with a bar-count lookback
+capped at 5000 bars.  Here the window is a true time span: a bar at time t
+covers every bar with ``t - window < time <= t``, however many bars that is.
+
+``RollingVWAP`` keeps running sums of vol, tp*vol and tp^2*vol over a deque
+of live bars and evicts expired ones from the left, so each update is
+amortised O(1).  ``rolling_vwap`` computes the whole series at once from
+searchsorted window starts and ``multi_anchor.PrefixSums``: long-double
+prefix sums about the series' mean price, so a window's sums are not the
+difference of two whole-history totals that have swamped its own digits.
+"""
+import collections
+
+import numpy as np
+
+from multi_anchor import PrefixSums
+from vwap import typical_price
+
+DAY = 86400
+
+
+def window_starts(time, window):
+    """Index of the first bar inside each bar's ``(t - window, t]`` window."""
+    time = np.asarray(time, dtype=np.float64)
+    return np.searchsorted(time, time - window, side="right")
+
+
+def _check_window(window):
+    if not window > 0:
+        raise ValueError(f"window must be positive, got {window!r}")
+
+
+def rolling_vwap(time, tp, volume, window):
+    """Rolling VWAP/SD over a ``window``-second span, for the whole series."""
+    _check_window(window)
+    tp = np.asarray(tp, dtype=np.float64)
+    starts = window_starts(time, window)
+    return PrefixSums(tp, volume).window(starts, np.arange(1, len(tp) + 1))
+
+
+def rolling_vwap_bars(bars, days, source="hlc3"):
+    """Rolling ``days``-day VWAP of a BarStore."""
+    return rolling_vwap(bars.time, typical_price(bars, source), bars.volume, days * DAY)
+
+
+class RollingVWAP:
+    """
+    Incremental time-window VWAP.  ``update(time, tp, volume)`` returns the
+    current ``(vwap, sd)``; bars must arrive in time order.
+
+    Running sums are rebuilt from the buffer once as many bars have been
+    evicted as it holds, which bounds floating-point drift from the
+    add/subtract pairs without changing the amortised cost.
+    """
+
+    __slots__ = ("window", "_buf", "_vol", "_tpv", "_tp2v", "_evicted")
+
+    def __init__(self, window):
+        _check_window(window)
+        self.window = window
+        self._buf = collections.deque()
+        self._vol = self._tpv = self._tp2v = 0.0
+        self._evicted = 0
+
+    def __len__(self):
+        return len(self._buf)
+
+    def update(self, time, tp, volume):
+        tpv = tp * volume
+        tp2v = tpv * tp
+        self._buf.append((time, volume, tpv, tp2v))
+        self._vol += volume
+        self._tpv += tpv
+        self._tp2v += tp2v
+
+        cutoff = time - self.window
+        buf = self._buf
+        while buf[0][0] <= cutoff:
+            _, v, a, b = buf.popleft()
+            self._vol -= v
+            self._tpv -= a
+            self._tp2v -= b
+            self._evicted += 1
+        if self._evicted >= len(buf):
+            self._resum()
+        return self.result()
+
+    def _resum(self):
+        self._vol = sum(e[1] for e in self._buf)
+        self._tpv = sum(e[2] for e in self._buf)
+        self._tp2v = sum(e[3] for e in self._buf)
+        self._evicted = 0
+
+    def result(self):
+        """Current ``(vwap, sd)``; NaN when the window holds no volume."""
+        if self._vol <= 0:
+            return float("nan"), float("nan")
+        vwap = self._tpv / self._vol
+        return vwap, max(self._tp2v / self._vol - vwap * vwap, 0.0) ** 0.5
+
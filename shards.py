@@ -0,0 +1,296 @@
+"""
+Sharded parallel backtest runner over (symbol, timeframe, date shard).
+
+Each input export is one (symbol, timeframe) series.  Its bars are split
+into date shards at calendar period starts (``--shard month``) and every
+shard of every series runs on one process pool.  Workers open the same
+memory-mapped ingest cache (``bars.load_csv``) and write their rows straight
+into one memory-mapped columnar output, so neither bars nor results are
+pickled: a task is a path, an index range and the parameters.
+
+Every column comes out bit for bit what one sequential run over each
+series gives:
+
+* anchored VWAP is split into units that start on a period reset (each
+  shard start moved forward to the next reset), so no VWAP state crosses
+  a unit boundary and each unit sums its bars once, in its own worker.
+  Carrying a VWAPState across shard starts instead would chain the shards
+  of a period one after another: per-shard partial sums computed in
+  parallel cannot be combined exactly, since float addition does not
+  reassociate and the single pass rounds after every bar.  Parallelism
+  for VWAP is therefore one task per anchor period (or per shard, when
+  shards are coarser than the anchor) per series.
+* TD Sequential: each shard starts counting at ``warmup_start``, which
+  reads back from the shard start only as far as the boundary state
+  reaches (usually a few hundred bars).
+* gaps: the previous bar is all a gap needs.
+
+VWAP units and TD/gap shards go to the pool as one batch of tasks.
+
+The output is per-column binary files plus a manifest in the ``ingest``
+cache layout (``ingest.open_cache`` reads it back): columns ``series``,
+``time``, ``vwap_<src>``/``sd_<src>``, ``td<lb>_buy``/``_sell``/
+``_buy_cd``/``_sell_cd`` and ``gap`` (+1 bull, -1 bear); the manifest's
+``series`` list maps row ranges to (symbol, timeframe).
+
+    python shards.py out_dir btc_1m.csv eth_1m.csv ... [--shard month] [--anchor year]
+                     [--sources hlc3 close] [--lookbacks 4] [--workers N] [--verify]
+"""
+import argparse
+import collections
+import concurrent.futures
+import functools
+import json
+import os
+import time
+
+import numpy as np
+
+import ingest
+from bars import load_csv
+from gaps import CME_GAP_THRESHOLD, MIN_GAP_USD, detect_gaps
+from resample import infer_interval
+from td_sequential import DIRECTIONS, td_sequential, warmup_start
+from vwap import ANCHORS, MODES, anchored_vwap, new_period, typical_prices
+
+Params = collections.namedtuple(
+    "Params", "sources anchor mode lookbacks direction reset_on_equal wrap_at_9 countdown "
+              "gap_threshold min_gap",
+    defaults=(("hlc3",), "year", "naive", (4,), "normal", True, False, True,
+              CME_GAP_THRESHOLD, MIN_GAP_USD))
+Series = collections.namedtuple("Series", "symbol timeframe path offset rows")
+Shard = collections.namedtuple("Shard", "series lo hi")
+
+TD_FIELDS = ("buy", "sell", "buy_cd", "sell_cd")
+
+
+def output_columns(params):
+    """``[(name, dtype)]`` of the output table for ``params``."""
+    cols = [("series", np.int32), ("time", np.float64)]
+    for src in params.sources:
+        cols += [(f"vwap_{src}", np.float64), (f"sd_{src}", np.float64)]
+    for lb in params.lookbacks:
+        cols += [(f"td{lb}_{f}", np.int32) for f in TD_FIELDS]
+    cols.append(("gap", np.int8))
+    return [(name, np.dtype(dt)) for name, dt in cols]
+
+
+def date_shards(time, shard="month"):
+    """``(lo, hi)`` bar ranges, one per ``shard`` calendar period."""
+    starts = np.flatnonzero(new_period(time, shard)).tolist()
+    return list(zip(starts, starts[1:] + [len(time)]))
+
+
+def vwap_units(time, shards, anchor="year"):
+    """
+    ``(lo, hi)`` VWAP work ranges: every shard start moved forward to the
+    next ``anchor`` reset, so each range opens a period and needs no state.
+    """
+    resets = np.flatnonzero(new_period(time, anchor))
+    starts = np.unique(resets[np.minimum(np.searchsorted(resets, [lo for lo, _ in shards]),
+                                         len(resets) - 1)]).tolist() if len(resets) else []
+    return list(zip(starts, starts[1:] + [len(time)]))
+
+
+# ─────────────────────────────────────────────────────────────
+# Per-shard kernels
+# ─────────────────────────────────────────────────────────────
+def _resets(bars, lo, hi, anchor):
+    """The whole-series reset mask over [lo, hi); bar lo is a reset only if
+    its period differs from bar lo - 1's."""
+    a = max(lo - 1, 0)
+    return new_period(bars.time[a:hi], anchor)[lo - a:]
+
+
+def compute_vwap(bars, lo, hi, params):
+    """``vwap_<src>``/``sd_<src>`` columns for bars [lo, hi); bar lo must open a period."""
+    part = bars.iloc(slice(lo, hi))
+    resets = _resets(bars, lo, hi, params.anchor)
+    if hi > lo and not resets[0]:
+        raise ValueError(f"bar {lo} does not open a {params.anchor} period")
+    res = anchored_vwap(typical_prices(part, params.sources), part.volume, resets, params.mode)
+    out = {}
+    for k, src in enumerate(params.sources):
+        out[f"vwap_{src}"], out[f"sd_{src}"] = res.vwap[k], res.sd[k]
+    return out
+
+
+def compute_shard(bars, lo, hi, params):
+    """``time``, TD and ``gap`` columns for bars [lo, hi)."""
+    out = {"time": np.asarray(bars.time[lo:hi])}
+    for lb in params.lookbacks:
+        w = warmup_start(bars.close, lo, lb, params.reset_on_equal, params.wrap_at_9, params.countdown)
+        td = td_sequential(bars.close[w:hi], bars.high[w:hi], bars.low[w:hi], lb, params.direction,
+                           params.reset_on_equal, params.wrap_at_9, params.countdown)
+        for f, values in zip(TD_FIELDS, td):
+            out[f"td{lb}_{f}"] = values[lo - w:]
+    a = max(lo - 1, 0)
+    prev_close = np.empty(hi - a)
+    prev_close[:1] = np.nan
+    prev_close[1:] = bars.close[a:hi - 1]
+    gaps = detect_gaps(bars.time[a:hi], bars.open[a:hi], prev_close, params.gap_threshold, params.min_gap)
+    gap = np.zeros(hi - lo, dtype=np.int8)
+    gap[gaps.index - (lo - a)] = np.where(gaps.is_bull, 1, -1)
+    out["gap"] = gap
+    return out
+
+
+# ─────────────────────────────────────────────────────────────
+# Output table
+# ─────────────────────────────────────────────────────────────
+def _create_output(out_dir, columns, rows, source, series, shards):
+    os.makedirs(out_dir, exist_ok=True)
+    entries = []
+    for j, (name, dtype) in enumerate(columns):
+        fname = f"{j:03d}_{name}.bin"
+        with open(os.path.join(out_dir, fname), "wb") as f:
+            f.truncate(rows * dtype.itemsize)
+        entries.append({"name": name, "file": fname, "dtype": dtype.str})
+    manifest = {"version": ingest.MANIFEST_VERSION, "source": source, "rows": rows, "columns": entries,
+                "series": [s._asdict() for s in series], "shards": shards}
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+@functools.lru_cache(maxsize=None)
+def _output(out_dir):
+    """Writable memory maps of every output column (one set per process)."""
+    with open(os.path.join(out_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    return {c["name"]: np.memmap(os.path.join(out_dir, c["file"]), dtype=np.dtype(c["dtype"]),
+                                 mode="r+", shape=(manifest["rows"],))
+            for c in manifest["columns"]}
+
+
+def open_output(out_dir):
+    """``(manifest, {column: read-only memmap})`` of a finished run."""
+    with open(os.path.join(out_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    return manifest, ingest.open_cache(out_dir, manifest)
+
+
+# ─────────────────────────────────────────────────────────────
+# Pool tasks
+# ─────────────────────────────────────────────────────────────
+def _write(out_dir, offset, lo, hi, cols):
+    out = _output(out_dir)
+    rows = slice(offset + lo, offset + hi)
+    for name, values in cols.items():
+        out[name][rows] = values
+    return hi - lo
+
+
+def _vwap_task(path, offset, lo, hi, params, out_dir):
+    return _write(out_dir, offset, lo, hi, compute_vwap(load_csv(path), lo, hi, params))
+
+
+def _shard_task(path, series, offset, lo, hi, params, out_dir):
+    cols = compute_shard(load_csv(path), lo, hi, params)
+    cols["series"] = np.full(hi - lo, series, dtype=np.int32)
+    return _write(out_dir, offset, lo, hi, cols)
+
+
+def _call(task):
+    fn, args = task
+    return fn(*args)
+
+
+def _map(pool, workers, fn, tasks):
+    if pool is None:
+        return [fn(t) for t in tasks]
+    return list(pool.map(fn, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+
+
+def run(paths, out_dir, params=Params(), shard="month", workers=None):
+    """
+    Run every shard of every series and write the merged table to
+    ``out_dir``; returns the manifest.  ``workers=1`` runs in-process.
+    """
+    if shard not in ANCHORS:
+        raise ValueError(f"unknown shard period {shard!r}; expected one of {ANCHORS}")
+    series, shards, units, offset = [], [], [], 0
+    for path in paths:
+        bars = load_csv(path)
+        symbol = os.path.splitext(os.path.basename(path))[0]
+        tf = int(infer_interval(bars.time)) if len(bars) > 1 else 0
+        series.append(Series(symbol, tf, os.path.abspath(path), offset, len(bars)))
+        ranges = date_shards(bars.time, shard)
+        shards += [Shard(len(series) - 1, lo, hi) for lo, hi in ranges]
+        if params.sources:
+            units += [Shard(len(series) - 1, lo, hi) for lo, hi in vwap_units(bars.time, ranges, params.anchor)]
+        offset += len(bars)
+    source = {"params": params._asdict(), "shard": shard, "paths": [s.path for s in series]}
+    manifest = _create_output(out_dir, output_columns(params), offset, source, series, len(shards))
+    _output.cache_clear()
+
+    # Largest VWAP units first: they are the longest tasks when the anchor
+    # is coarser than the shards.
+    tasks = [(_vwap_task, (series[u.series].path, series[u.series].offset, u.lo, u.hi, params, out_dir))
+             for u in sorted(units, key=lambda u: u.lo - u.hi)]
+    tasks += [(_shard_task, (series[s.series].path, s.series, series[s.series].offset, s.lo, s.hi,
+                             params, out_dir)) for s in shards]
+    workers = workers or os.cpu_count() or 1
+    pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        _map(pool, workers, _call, tasks)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    if offset:
+        for out in _output(out_dir).values():
+            out.flush()
+    _output.cache_clear()
+    return manifest
+
+
+def verify(out_dir, params=Params()):
+    """Columns that differ from one sequential run per series (empty = exact)."""
+    manifest, cols = open_output(out_dir)
+    bad = []
+    for s in manifest["series"]:
+        bars = load_csv(s["path"])
+        ref = compute_shard(bars, 0, len(bars), params)
+        if params.sources:
+            ref.update(compute_vwap(bars, 0, len(bars), params))
+        rows = slice(s["offset"], s["offset"] + s["rows"])
+        for name, values in ref.items():
+            if not np.array_equal(cols[name][rows], values, equal_nan=values.dtype.kind == "f"):
+                bad.append(f"{s['symbol']}:{name}")
+    return bad
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Sharded VWAP / TD / gap backtest over many exports.")
+    ap.add_argument("out")
+    ap.add_argument("paths", nargs="+")
+    ap.add_argument("--shard", default="month", choices=ANCHORS)
+    ap.add_argument("--anchor", default="year", choices=ANCHORS)
+    ap.add_argument("--mode", default="naive", choices=MODES)
+    ap.add_argument("--sources", nargs="*", default=["hlc3"])
+    ap.add_argument("--lookbacks", type=int, nargs="*", default=[4])
+    ap.add_argument("--direction", default="normal", choices=DIRECTIONS)
+    ap.add_argument("--hold-on-equal", action="store_true", help="equal closes hold the counts")
+    ap.add_argument("--wrap-at-9", action="store_true")
+    ap.add_argument("--no-countdown", action="store_true")
+    ap.add_argument("--min-gap", type=float, default=MIN_GAP_USD)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--verify", action="store_true", help="compare against a sequential run")
+    args = ap.parse_args(argv)
+    params = Params(tuple(args.sources), args.anchor, args.mode, tuple(args.lookbacks), args.direction,
+                    not args.hold_on_equal, args.wrap_at_9, not args.no_countdown,
+                    CME_GAP_THRESHOLD, args.min_gap)
+    t0 = time.perf_counter()
+    manifest = run(args.paths, args.out, params, args.shard, args.workers)
+    dt = time.perf_counter() - t0
+    print(f"{len(manifest['series'])} series, {manifest['shards']} shards, "
+          f"{manifest['rows']:,} rows in {dt:.2f}s -> {args.out}")
+    if args.verify:
+        bad = verify(args.out, params)
+        print("sequential match: exact" if not bad else f"MISMATCH in {', '.join(bad)}")
+        return 1 if bad else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,197 @@
+"""
+Vectorised TD Sequential setup and countdown (cs9_td_sequential.pine).
+
+Setup counts are positions within runs of the sign of
+``close - close[lookback]``: the sign is run-length encoded once and each
+bar's count is its offset from the start of its run, so a whole close array
+is counted in a few NumPy passes with no per-bar state machine.  ``wrap_at_9``
+folds counts past 9 back to 1 with modular arithmetic (backtest.py's rule;
+the Pine script lets them keep growing).
+
+The countdown opens a segment at every setup 9; within a segment the
+qualifying bars (close <= low[2] for buy, close >= high[2] for sell) are a
+prefix sum, and the countdown switches off when it reaches 13.  Shape
+column sN flags count step N+1: s0..s8 are setup steps 1-9 and s9..s15 are
+countdown steps 10-16 (countdown value + 9).
+"""
+import collections
+
+import numpy as np
+
+N_SHAPES = 16
+SETUP_LENGTH = 9
+COUNTDOWN_LIMIT = 13
+DIRECTIONS = ("normal", "inverted")
+
+TDResult = collections.namedtuple("TDResult", "buy sell buy_cd sell_cd")
+
+
+def _comparison_sign(close, lookback):
+    """sign(close - close[lookback]) as int8; 2 where close[lookback] is na."""
+    s = np.full(len(close), 2, dtype=np.int8)
+    if lookback < len(close):
+        cur, ref = close[lookback:], close[:-lookback]
+        np.subtract((cur > ref).view(np.int8), (cur < ref).view(np.int8), out=s[lookback:])
+    return s
+
+
+def _run_position(sign):
+    """1-based position of every bar within its run of equal ``sign`` values."""
+    n = len(sign)
+    idx = np.arange(n, dtype=np.int32)
+    change = np.empty(n, dtype=bool)
+    change[:1] = True
+    np.not_equal(sign[1:], sign[:-1], out=change[1:])
+    start = idx * change
+    np.maximum.accumulate(start, out=start)
+    np.subtract(idx, start, out=start)
+    start += 1
+    return start
+
+
+def _held_counts(sign, target):
+    """Run counts of ``sign == target`` where equal closes (sign 0) hold the count."""
+    n = len(sign)
+    hit = sign == target
+    breaker = (sign != 0) & ~hit
+    # csum[k] = hits in bars < k; a run restarts after its last breaker.
+    csum = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(hit, out=csum[1:])
+    last_break = np.arange(1, n + 1, dtype=np.int32) * breaker
+    np.maximum.accumulate(last_break, out=last_break)
+    return csum[1:] - csum[last_break]
+
+
+def setup_counts(close, lookback=4, direction="normal", reset_on_equal=True, wrap_at_9=False):
+    """
+    ``(buy, sell)`` setup counts per bar.
+
+    ``direction="normal"`` counts buy bars as close < close[lookback] (Pine);
+    ``"inverted"`` swaps the two sides.  With ``reset_on_equal`` off an equal
+    close leaves both counts where they were instead of zeroing them.
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError(f"direction must be one of {DIRECTIONS}, got {direction!r}")
+    close = np.asarray(close, dtype=np.float64)
+    sign = _comparison_sign(close, lookback)
+    buy_sign = -1 if direction == "normal" else 1
+    if reset_on_equal:
+        # Runs of both sides come from one RLE pass; a single modulo wraps both.
+        pos = _run_position(sign)
+        if wrap_at_9:
+            pos -= 1
+            pos %= SETUP_LENGTH
+            pos += 1
+        return pos * (sign == buy_sign), pos * (sign == -buy_sign)
+    buy = _held_counts(sign, buy_sign)
+    sell = _held_counts(sign, -buy_sign)
+    if wrap_at_9:
+        buy = (buy > 0) * ((buy - 1) % SETUP_LENGTH + 1)
+        sell = (sell > 0) * ((sell - 1) % SETUP_LENGTH + 1)
+    return buy, sell
+
+
+def countdown(close, high, low, buy_setup_9, sell_setup_9, limit=COUNTDOWN_LIMIT):
+    """
+    ``(buy_cd, sell_cd)`` countdown values per bar, 0 while inactive.
+
+    A setup 9 starts a fresh countdown on its side and cancels the other
+    side's; the setup bar itself may already count.  Reaching ``limit``
+    ends the countdown (Pine resets it to 0 on that bar).
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    event = buy_setup_9 | sell_setup_9
+    if not event.any():
+        return np.zeros(n, dtype=np.int32), np.zeros(n, dtype=np.int32)
+    # seg[i] = 1 + index of the latest setup 9 at or before bar i, 0 if none.
+    seg = np.arange(1, n + 1, dtype=np.int32) * event
+    np.maximum.accumulate(seg, out=seg)
+    # Padded so seg - 1 == -1 (no countdown yet) reads a zero on both arrays.
+    buy_side = np.zeros(n + 1, dtype=bool)
+    buy_side[:n] = buy_setup_9
+    is_buy = buy_side[seg - 1]
+
+    q = np.zeros(n, dtype=bool)
+    if n > 2:
+        high = np.asarray(high, dtype=np.float64)
+        low = np.asarray(low, dtype=np.float64)
+        np.copyto(q[2:], close[2:] >= high[:-2])
+        np.copyto(q[2:], close[2:] <= low[:-2], where=is_buy[2:])
+    q &= seg > 0
+    cd = np.cumsum(q, dtype=np.int32)
+    # before[k] = qualifying bars before bar k; before[-1] is the zero pad.
+    before = np.zeros(n + 1, dtype=np.int32)
+    np.subtract(cd, q, out=before[:n])
+    cd -= before[seg - 1]
+    cd *= cd < limit
+    buy_cd = cd * is_buy
+    return buy_cd, cd - buy_cd
+
+
+def td_sequential(close, high=None, low=None, lookback=4, direction="normal",
+                  reset_on_equal=True, wrap_at_9=False, with_countdown=True):
+    """Setup and (optionally) countdown values for a whole series as a TDResult."""
+    buy, sell = setup_counts(close, lookback, direction, reset_on_equal, wrap_at_9)
+    if with_countdown:
+        buy_cd, sell_cd = countdown(close, high, low, buy == SETUP_LENGTH, sell == SETUP_LENGTH)
+    else:
+        buy_cd = sell_cd = np.zeros(len(buy), dtype=np.int32)
+    return TDResult(buy, sell, buy_cd, sell_cd)
+
+
+def shape_columns(td):
+    """(16, n) int8 shape flags (s0..s15) for a TDResult."""
+    n = len(td.buy)
+    shapes = np.zeros((N_SHAPES, n), dtype=np.int8)
+    flat = shapes.reshape(-1)
+    # Buy and sell values are never both non-zero, so each pair folds into one
+    # step per bar.  Setup counts past 9 (no wrap) are not shown; a countdown
+    # value c shows as step c + 9.
+    for step, lo, hi in ((td.buy + td.sell, 1, SETUP_LENGTH),
+                         (td.buy_cd + td.sell_cd + SETUP_LENGTH, SETUP_LENGTH + 1, N_SHAPES)):
+        on = np.flatnonzero((step >= lo) & (step <= hi))
+        flat[(step[on] - 1) * n + on] = 1
+    return shapes
+
+
+def warmup_start(close, start, lookback=4, reset_on_equal=True, wrap_at_9=False,
+                 with_countdown=True, block=256):
+    """
+    A bar w <= start such that ``td_sequential`` over bars w.. gives the same
+    values from bar ``start`` on as a run from bar 0 (for either direction).
+
+    The counts carry no state beyond a few events: once the comparison sign
+    has changed inside the window the run positions are exact, and once an
+    exact setup 9 has opened a countdown segment the countdown is too.  The
+    window doubles backwards from ``start`` until both hold, so a shard of a
+    long series only re-reads the bars its boundary state depends on.
+    """
+    w = start
+    while w > 0:
+        w = max(start - max(block, 2 * (start - w)), 0)
+        if w == 0:
+            break
+        c = np.asarray(close[w:start], dtype=np.float64)
+        sign = _comparison_sign(c, lookback)[lookback:]
+        if reset_on_equal:
+            change = np.flatnonzero(sign[1:] != sign[:-1])
+            exact = int(change[0]) + 1 if len(change) else None
+        else:
+            # Held counts restart at the other side's bar; both sides need one.
+            up, down = np.flatnonzero(sign == 1), np.flatnonzero(sign == -1)
+            exact = max(int(up[0]), int(down[0])) if len(up) and len(down) else None
+        if exact is None:
+            continue
+        if not with_countdown:
+            return w
+        buy, sell = setup_counts(c, lookback, "normal", reset_on_equal, wrap_at_9)
+        nine = (buy[lookback + exact:] == SETUP_LENGTH) | (sell[lookback + exact:] == SETUP_LENGTH)
+        if nine.any():
+            return w
+    return 0
+
+
+def td_sequential_bars(bars, **kwargs):
+    """``td_sequential`` over a BarStore's close/high/low."""
+    return td_sequential(bars.close, bars.high, bars.low, **kwargs)
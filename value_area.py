@@ -0,0 +1,159 @@
+"""
+Volume-distribution value areas (POC, VAH, VAL) for every period at once.
+
+The VWAP scripts plot VAH/VAL as VWAP +/- k * SD.  The OI Suite's
+``vapct`` uses the distribution definition instead: start at the row with
+the most volume (the POC) and keep adding the larger of the next row above
+and the next row below (above on ties) until the rows taken hold ``pct``
+percent of the volume.  That is a two-pointer sweep: the area is always
+one contiguous run of rows [lo, hi], so its volume is a difference of two
+prefix sums and each step is O(1), with no sorting.
+
+``value_areas`` runs the sweep for a whole (periods, rows) matrix in step:
+every iteration moves each unfinished period by one row, so the Python
+loop runs at most ``rows`` times however many periods there are.
+``period_profiles`` builds that matrix in one difference-array pass: each
+period is split into ``rows`` equal price rows between its low and high
+(TradingView's "Number Of Rows" layout) and each bar's volume is spread
+evenly over the rows its range covers.
+
+    python value_area.py btc_1d.csv [--anchor month] [--rows 24] [--pct 70] [--mult 1]
+"""
+import argparse
+import collections
+import datetime
+
+import numpy as np
+
+from bars import BarStore
+from vwap import anchored_vwap, new_period, typical_price
+
+DEFAULT_ROWS = 24
+
+ValueArea = collections.namedtuple("ValueArea", "poc lo hi")
+PeriodProfiles = collections.namedtuple("PeriodProfiles", "start low step volume")
+PeriodValueArea = collections.namedtuple("PeriodValueArea", "start poc vah val")
+
+
+def _prefix(volume):
+    volume = np.asarray(volume, dtype=np.float64)
+    p = np.zeros(volume.shape[:-1] + (volume.shape[-1] + 1,))
+    np.cumsum(volume, axis=-1, out=p[..., 1:])
+    return p
+
+
+def value_areas(volume, pct=70.0, width=None):
+    """
+    ValueArea of row indices for each row of a (k, m) volume matrix; the
+    value area of profile j is rows ``lo[j]..hi[j]`` inclusive.
+
+    ``width`` limits profile j to its first ``width[j]`` rows (for
+    zero-padded ragged profiles).
+    """
+    volume = np.atleast_2d(np.asarray(volume, dtype=np.float64))
+    k, m = volume.shape
+    width = np.full(k, m) if width is None else np.asarray(width, dtype=np.int64)
+    masked = np.where(np.arange(m) < width[:, None], volume, -np.inf)
+    poc = np.argmax(masked, axis=1)
+    p = _prefix(np.maximum(masked, 0.0))
+    rows = np.arange(k)
+    target = p[rows, width] * (pct / 100)
+    lo, hi = poc.copy(), poc.copy()
+    # -inf sentinels on both sides: an exhausted side never wins a comparison.
+    padded = np.full((k, m + 2), -np.inf)
+    padded[:, 1:-1] = masked
+    active = np.flatnonzero(p[rows, hi + 1] - p[rows, lo] < target)
+    while len(active):
+        a, b = lo[active], hi[active]
+        up = padded[active, b + 2] >= padded[active, a]
+        hi[active] = b + up
+        lo[active] = a - ~up
+        done = p[active, hi[active] + 1] - p[active, lo[active]] >= target[active]
+        active = active[~done & ((lo[active] > 0) | (hi[active] < width[active] - 1))]
+    return ValueArea(poc, lo, hi)
+
+
+def value_area(volume, pct=70.0):
+    """``(poc, lo, hi)`` row indices of one profile."""
+    res = value_areas(np.asarray(volume)[None, :], pct)
+    return int(res.poc[0]), int(res.lo[0]), int(res.hi[0])
+
+
+# ─────────────────────────────────────────────────────────────
+# Per-period profiles
+# ─────────────────────────────────────────────────────────────
+def period_profiles(high, low, volume, resets, rows=DEFAULT_ROWS):
+    """
+    (periods, rows) volume profiles, one per period opened by ``resets``.
+    Period j spans ``low[j] + i * step[j]`` for rows i = 0..rows-1.
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    vol = np.nan_to_num(np.asarray(volume, dtype=np.float64))
+    start = np.flatnonzero(resets)
+    if len(high) and (not len(start) or start[0] != 0):
+        start = np.concatenate([[0], start])
+    if not len(start):
+        return PeriodProfiles(start, np.empty(0), np.empty(0), np.empty((0, rows)))
+    opens = np.zeros(len(high), dtype=bool)
+    opens[start] = True
+    seg = np.cumsum(opens) - 1
+    p_low = np.minimum.reduceat(low, start)
+    p_high = np.maximum.reduceat(high, start)
+    step = (p_high - p_low) / rows
+    safe = np.where(step > 0, step, 1.0)
+    base, s = p_low[seg], safe[seg]
+    r_lo = np.clip(np.floor((low - base) / s), 0, rows - 1).astype(np.int64)
+    r_hi = np.clip(np.floor((high - base) / s), 0, rows - 1).astype(np.int64)
+    per_row = vol / (r_hi - r_lo + 1)
+    # Flat (periods, rows + 1) difference array; each period's +/- pairs
+    # stay inside its own row block, so one cumsum along axis 1 is exact.
+    stride = rows + 1
+    size = len(start) * stride
+    diff = np.bincount(seg * stride + r_lo, per_row, minlength=size)
+    diff -= np.bincount(seg * stride + r_hi + 1, per_row, minlength=size)
+    prof = np.cumsum(diff.reshape(len(start), stride), axis=1)[:, :rows]
+    return PeriodProfiles(start, p_low, step, np.maximum(prof, 0.0, out=prof))
+
+
+def period_value_areas(bars, anchor="month", rows=DEFAULT_ROWS, pct=70.0):
+    """
+    POC (row middle), VAH and VAL prices of every ``anchor`` period of a
+    BarStore, from one profile pass and one vectorised sweep.
+    """
+    prof = period_profiles(bars.high, bars.low, bars.volume, new_period(bars.time, anchor), rows)
+    va = value_areas(prof.volume, pct)
+    return PeriodValueArea(prof.start, prof.low + (va.poc + 0.5) * prof.step,
+                           prof.low + (va.hi + 1) * prof.step, prof.low + va.lo * prof.step)
+
+
+def sd_value_areas(bars, anchor="month", mult=1.0, source="hlc3"):
+    """The VWAP scripts' ``(vah, val)`` = VWAP +/- mult * SD at each period's close."""
+    resets = new_period(bars.time, anchor)
+    res = anchored_vwap(typical_price(bars, source), bars.volume, resets, mode="welford")
+    last = np.append(np.flatnonzero(resets)[1:], len(bars)) - 1
+    vah, val = res.band(mult)
+    return vah[last], val[last]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Distribution vs SD-band value areas per period.")
+    ap.add_argument("path")
+    ap.add_argument("--anchor", default="month")
+    ap.add_argument("--rows", type=int, default=DEFAULT_ROWS)
+    ap.add_argument("--pct", type=float, default=70.0)
+    ap.add_argument("--mult", type=float, default=1.0)
+    ap.add_argument("--source", default="hlc3")
+    args = ap.parse_args(argv)
+    bars = BarStore.from_csv(args.path)
+    va = period_value_areas(bars, args.anchor, args.rows, args.pct)
+    sd_vah, sd_val = sd_value_areas(bars, args.anchor, args.mult, args.source)
+    print(f"{'period':10s} {'POC':>10s} {'VAL':>10s} {'VAH':>10s} {'SD VAL':>10s} {'SD VAH':>10s}")
+    for j, i in enumerate(va.start):
+        day = datetime.datetime.fromtimestamp(bars.time[i], datetime.timezone.utc).date()
+        print(f"{day!s:10s} {va.poc[j]:10.2f} {va.val[j]:10.2f} {va.vah[j]:10.2f} "
+              f"{sd_val[j]:10.2f} {sd_vah[j]:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Aggregated spot vs perp volume, delta and CVD (agg_spot_perps_volume.pine).
+
+The script pulls open/close/volume for eight venues (Binance, Bybit,
+Coinbase and OKX spot plus their ``.P`` perps) and sums them with ``nz``,
+so a venue with no bar, or no symbol, counts as zero.  Offline the venues
+are separate bar streams with their own timestamps:
+
+* the common timeline is the union of the venue timelines, built by a
+  balanced k-way merge of the sorted time arrays (or taken from a chart);
+* each venue is then added into one running total per group (spot, perp)
+  at its own positions on that timeline, so memory is O(groups x bars)
+  however many venues there are; no venue x time matrix is ever built.
+  Venues built from ``BarStore.from_csv`` stay memory-mapped until added.
+
+Delta is +volume on bars closing at or above the open, -volume otherwise
+(``f_delta``).  CVD restarts at the first bar of every UTC session on
+intraday timeframes and runs from the first bar on daily and above.
+``ta.sma``/``ta.stdev`` windows come from prefix sums, O(1) per bar.
+"""
+import collections
+
+import numpy as np
+
+from resample import infer_interval
+from vwap import new_period, segmented_cumsum
+
+DAY = 86400
+GROUPS = ("spot", "perp")
+MODES = ("Volume", "Delta", "CVD")
+EXCHANGES = ("BINANCE", "BYBIT", "COINBASE", "OKX")
+
+Venue = collections.namedtuple("Venue", "symbol group time open close volume")
+GroupTotals = collections.namedtuple("GroupTotals", "volume delta")
+SpotPerp = collections.namedtuple("SpotPerp", "time spot perp divergence")
+
+
+def venue_symbols(base="BTC", quote="USDT"):
+    """The script's ``(symbol, group)`` list; Coinbase quotes USD, not USDT."""
+    out = []
+    for group, suffix in (("spot", ""), ("perp", ".P")):
+        for ex in EXCHANGES:
+            q = quote.replace("USDT", "USD") if ex == "COINBASE" else quote
+            out.append((f"{ex}:{base}{q}{suffix}", group))
+    return out
+
+
+def venue_from_bars(symbol, group, bars):
+    """Wrap a BarStore's time/open/close/volume as a Venue."""
+    if group not in GROUPS:
+        raise ValueError(f"group must be one of {GROUPS}, got {group!r}")
+    return Venue(symbol, group, bars.time, bars.open, bars.close, bars.volume)
+
+
+# ─────────────────────────────────────────────────────────────
+# Timeline join
+# ─────────────────────────────────────────────────────────────
+def _strictly_increasing(t):
+    t = np.asarray(t, dtype=np.float64)
+    if len(t) > 1 and not (t[1:] > t[:-1]).all():
+        t = np.unique(t)
+    return t
+
+
+def _merge_two(a, b):
+    """Union of two strictly increasing arrays in O(len(a) + len(b) log len(a))."""
+    pos = np.searchsorted(a, b)
+    new = pos >= len(a)
+    new[~new] = a[pos[~new]] != b[~new]
+    b, pos = b[new], pos[new]
+    out = np.empty(len(a) + len(b))
+    at = pos + np.arange(len(b))
+    keep = np.ones(len(out), dtype=bool)
+    keep[at] = False
+    out[at] = b
+    out[keep] = a
+    return out
+
+
+def merge_timelines(times):
+    """Sorted union of many timestamp arrays by pairwise (tournament) merging."""
+    level = [_strictly_increasing(t) for t in times]
+    if not level:
+        return np.empty(0)
+    while len(level) > 1:
+        level = [_merge_two(level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+                 for i in range(0, len(level), 2)]
+    return level[0]
+
+
+def timeline_positions(timeline, time):
+    """``(on, idx)``: which of ``time`` lie on ``timeline`` and where."""
+    t = np.asarray(time, dtype=np.float64)
+    pos = np.searchsorted(timeline, t)
+    on = pos < len(timeline)
+    on[on] = timeline[pos[on]] == t[on]
+    return on, pos[on]
+
+
+def aggregate(venues, timeline=None):
+    """
+    ``(timeline, {group: GroupTotals})`` summed over venues.  The timeline
+    defaults to the union of the venues' own.
+
+    Venue bars whose time is not on the timeline are dropped (as
+    ``request.security`` on the chart's timeframe would never see them);
+    ``nz`` semantics make every absent venue/bar contribute zero.
+    """
+    venues = list(venues)
+    if timeline is None:
+        timeline = merge_timelines(v.time for v in venues)
+    timeline = np.asarray(timeline, dtype=np.float64)
+    n = len(timeline)
+    totals = {g: GroupTotals(np.zeros(n), np.zeros(n)) for g in GROUPS}
+    for v in venues:
+        on, idx = timeline_positions(timeline, v.time)
+        vol = np.nan_to_num(np.asarray(v.volume, dtype=np.float64)[on])
+        up = np.asarray(v.close)[on] >= np.asarray(v.open)[on]
+        acc = totals[v.group]
+        # A venue hits each timeline slot at most once, so plain fancy-index
+        # accumulation is exact (no np.add.at needed).
+        acc.volume[idx] += vol
+        acc.delta[idx] += np.where(up, vol, -vol)
+    return timeline, totals
+
+
+# ─────────────────────────────────────────────────────────────
+# Rolling statistics
+# ─────────────────────────────────────────────────────────────
+def rolling_mean_std(x, length):
+    """
+    ``ta.sma`` and ``ta.stdev`` (population) over ``length`` bars from
+    centred long-double prefix sums.  NaN until the window is full or while
+    it holds a NaN.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+    mean = np.full(n, np.nan)
+    std = np.full(n, np.nan)
+    if n < length:
+        return mean, std
+    bad = np.isnan(x)
+    ref = float(np.nanmean(x)) if (~bad).any() else 0.0
+    d = np.where(bad, 0.0, x - ref)
+    s1 = np.concatenate([[0.0], np.cumsum(d, dtype=np.longdouble)])
+    s2 = np.concatenate([[0.0], np.cumsum(d * d, dtype=np.longdouble)])
+    nb = np.concatenate([[0], np.cumsum(bad)])
+    w1 = ((s1[length:] - s1[:-length]) / length).astype(np.float64)
+    w2 = ((s2[length:] - s2[:-length]) / length).astype(np.float64)
+    ok = nb[length:] == nb[:-length]
+    mean[length - 1:] = np.where(ok, ref + w1, np.nan)
+    std[length - 1:] = np.where(ok, np.sqrt(np.maximum(w2 - w1 * w1, 0.0)), np.nan)
+    return mean, std
+
+
+def sma(x, length):
+    if length <= 1:
+        return np.asarray(x, dtype=np.float64)
+    return rolling_mean_std(x, length)[0]
+
+
+def zscore(x, length):
+    """``f_zscore``: (x - sma) / stdev, and 0 wherever stdev is not > 0 (or na)."""
+    x = np.asarray(x, dtype=np.float64)
+    mean, std = rolling_mean_std(x, length)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(std > 0, (x - mean) / std, 0.0)
+
+
+def session_resets(time, intraday=None):
+    """CVD reset mask: UTC day starts on intraday data, else only bar 0."""
+    time = np.asarray(time, dtype=np.float64)
+    if intraday is None:
+        intraday = infer_interval(time) < DAY if len(time) > 1 else False
+    if intraday:
+        return new_period(time, "day")
+    resets = np.zeros(len(time), dtype=bool)
+    resets[:1] = True
+    return resets
+
+
+# ─────────────────────────────────────────────────────────────
+# Indicator
+# ─────────────────────────────────────────────────────────────
+def spot_perp(venues, timeline=None, mode="Delta", usd_close=None, smooth=1,
+              normalize=True, norm_len=100, intraday=None):
+    """
+    The indicator's spot and perp plot series.
+
+    ``usd_close`` (the chart close on the timeline) switches the unit to
+    USD.  ``divergence`` is +1 where perps are positive and spot negative,
+    -1 for the reverse (Delta mode only; 0 elsewhere).
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+    timeline, totals = aggregate(venues, timeline)
+    mult = 1.0 if usd_close is None else np.asarray(usd_close, dtype=np.float64)
+    resets = session_resets(timeline, intraday) if mode == "CVD" else None
+    series = {}
+    for g in GROUPS:
+        vol, delta = totals[g].volume * mult, totals[g].delta * mult
+        if mode == "Volume":
+            val = vol
+        elif mode == "Delta":
+            val = delta
+        else:
+            val = segmented_cumsum(delta, resets)
+        val = sma(val, smooth)
+        series[g] = zscore(val, norm_len) if normalize else val
+    div = np.zeros(len(timeline), dtype=np.int8)
+    if mode == "Delta":
+        div[(series["perp"] > 0) & (series["spot"] < 0)] = 1
+        div[(series["spot"] > 0) & (series["perp"] < 0)] = -1
+    return SpotPerp(timeline, series["spot"], series["perp"], div)
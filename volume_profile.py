@@ -0,0 +1,344 @@
+"""
+Fixed-tick volume profiles and HVN detection (btc_historical_hvn.pine).
+
+btc_historical_hvn.pine hardcodes its levels.  Here they are found from
+the bars: prices are binned on one absolute grid, bin k = [k*tick,
+(k+1)*tick), and each bar's volume is spread evenly over the bins its
+low..high range touches.  The spread is a range add, so a whole array of
+bars goes into a profile with a difference array: +v/w at the bar's first
+bin, -v/w one past its last, then a single cumulative sum.
+
+HVNs are peaks of the profile ranked by prominence (height above the
+higher of the two lowest points between the peak and the nearest higher
+bin on either side, as in ``scipy.signal.peak_prominences``); the POC is
+the highest bin.
+
+``DayProfiles`` keeps one partial profile per UTC day plus a Fenwick tree
+of merged day blocks.  Because every profile shares the same grid, the
+profile of any day range is the sum of O(log^2 days) disjoint precomputed
+blocks, and a new bar only touches its day's leaf and tree node.
+
+    python volume_profile.py btc_1d.csv [--tick 10] [--prominence 0.05] [--from 2024-01-01]
+"""
+import argparse
+import collections
+import datetime
+
+import numpy as np
+
+from bars import BarStore
+from gaps import PassageIndex
+
+DAY = 86400
+DEFAULT_TICK = 10.0
+
+HVN = collections.namedtuple("HVN", "price volume prominence")
+
+
+def bar_bins(high, low, tick):
+    """First and last grid bin of every bar's low..high range."""
+    lo = np.floor(np.asarray(low, dtype=np.float64) / tick).astype(np.int64)
+    hi = np.floor(np.asarray(high, dtype=np.float64) / tick).astype(np.int64)
+    return np.minimum(lo, hi), np.maximum(lo, hi)
+
+
+def _spread(lo, hi, volume, base, size):
+    """Dense profile of bins base..base+size-1 from bar bin ranges (difference array)."""
+    vol = np.nan_to_num(np.asarray(volume, dtype=np.float64))
+    per_bin = vol / (hi - lo + 1)
+    diff = np.bincount(lo - base, per_bin, minlength=size + 1)
+    diff -= np.bincount(hi + 1 - base, per_bin, minlength=size + 1)
+    out = np.cumsum(diff[:size], dtype=np.longdouble).astype(np.float64)
+    return np.maximum(out, 0.0, out=out)      # rounding residue below empty bins
+
+
+# ─────────────────────────────────────────────────────────────
+# Profile
+# ─────────────────────────────────────────────────────────────
+class Histogram:
+    """
+    Volume per tick bin over a growing bin range.
+
+    ``add`` spreads arrays of bars at once; ``add_bar`` one bar.  Storage
+    grows with slack on the side being extended, so a profile fed bar by
+    bar reallocates O(log range) times.
+    """
+
+    __slots__ = ("tick", "_base", "_data", "lo", "hi")
+
+    def __init__(self, tick=DEFAULT_TICK):
+        self.tick = float(tick)
+        self._base = 0
+        self._data = np.zeros(0)
+        self.lo, self.hi = 0, -1            # bins held (hi < lo: empty)
+
+    @classmethod
+    def from_bars(cls, high, low, volume, tick=DEFAULT_TICK):
+        hist = cls(tick)
+        hist.add(high, low, volume)
+        return hist
+
+    def __len__(self):
+        return max(self.hi - self.lo + 1, 0)
+
+    @property
+    def volume(self):
+        return self._data[self.lo - self._base:self.hi - self._base + 1]
+
+    @property
+    def prices(self):
+        """Bottom price of every bin in ``volume``."""
+        return np.arange(self.lo, self.hi + 1) * self.tick
+
+    def _reserve(self, lo, hi):
+        if len(self) == 0:
+            self._base, self._data = lo, np.zeros(hi - lo + 1)
+        else:
+            base, end = self._base, self._base + len(self._data)
+            if lo >= base and hi < end:
+                lo, hi = min(lo, self.lo), max(hi, self.hi)
+            else:
+                slack = len(self._data) // 2
+                new_base = min(base, lo - slack) if lo < base else base
+                new_end = max(end, hi + 1 + slack) if hi >= end else end
+                data = np.zeros(new_end - new_base)
+                data[base - new_base:end - new_base] = self._data
+                self._base, self._data = new_base, data
+                lo, hi = min(lo, self.lo), max(hi, self.hi)
+        self.lo, self.hi = lo, hi
+
+    def add(self, high, low, volume):
+        lo, hi = bar_bins(high, low, self.tick)
+        if not len(lo):
+            return
+        a, b = int(lo.min()), int(hi.max())
+        self._reserve(a, b)
+        self._data[a - self._base:b - self._base + 1] += _spread(lo, hi, volume, a, b - a + 1)
+
+    def add_bar(self, high, low, volume):
+        lo, hi = bar_bins(high, low, self.tick)
+        lo, hi = int(lo[()]), int(hi[()])
+        self._reserve(lo, hi)
+        if volume == volume:
+            self._data[lo - self._base:hi - self._base + 1] += volume / (hi - lo + 1)
+
+    def add_histogram(self, other):
+        """Merge another profile on the same grid into this one."""
+        if other.tick != self.tick:
+            raise ValueError(f"tick mismatch: {self.tick} vs {other.tick}")
+        if len(other):
+            self._reserve(other.lo, other.hi)
+            self._data[other.lo - self._base:other.hi - self._base + 1] += other.volume
+
+    def copy(self):
+        out = Histogram(self.tick)
+        out._base, out.lo, out.hi = self.lo, self.lo, self.hi
+        out._data = self.volume.copy()
+        return out
+
+    def poc(self):
+        """Price (bin bottom) of the highest-volume bin; mid-plateau, as for peaks."""
+        if not len(self):
+            return float("nan")
+        vol = self.volume
+        i = int(np.argmax(vol))
+        run = int(np.argmin(vol[i:] == vol[i])) if (vol[i:] != vol[i]).any() else len(vol) - i
+        return (self.lo + i + (run - 1) // 2) * self.tick
+
+    def hvn(self, prominence=0.05, top=None):
+        return hvn(self, prominence, top)
+
+
+# ─────────────────────────────────────────────────────────────
+# Peaks
+# ─────────────────────────────────────────────────────────────
+def find_peaks(x):
+    """
+    Indices of local maxima; a flat-topped peak reports its middle bin.
+    The first and last bins are never peaks.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if len(x) < 3:
+        return np.empty(0, dtype=np.int64)
+    change = np.flatnonzero(x[1:] != x[:-1]) + 1
+    start = np.concatenate([[0], change])
+    end = np.append(change, len(x)) - 1
+    inner = (start > 0) & (end < len(x) - 1)
+    start, end = start[inner], end[inner]
+    up = (x[start - 1] < x[start]) & (x[end + 1] < x[end])
+    return (start[up] + end[up]) // 2
+
+
+def _next_higher(index, peaks):
+    """First index after each peak strictly higher than it (len if none)."""
+    # ``index`` is built on -x: "higher than h" is "-x <= the float below -h".
+    return index.first_below(peaks + 1, np.nextafter(index.values[peaks], -np.inf))
+
+
+def prominences(x, peaks):
+    """Prominence of each peak in ``x``."""
+    x = np.asarray(x, dtype=np.float64)
+    peaks = np.asarray(peaks, dtype=np.int64)
+    n = len(x)
+    if not len(peaks):
+        return np.empty(0)
+    # PassageIndex answers "first j >= k with v[j] <= level": on -x that is
+    # the first strictly higher bin; on the reversed array, the last before.
+    right = _next_higher(PassageIndex(-x), peaks)
+    left = n - 1 - _next_higher(PassageIndex(-x[::-1]), n - 1 - peaks)
+    # Interleaved [a, b) pairs: every other reduceat result is a wanted
+    # window minimum, the ones in between are discarded.
+    def window_min(a, b):
+        idx = np.empty(2 * len(a), dtype=np.int64)
+        idx[0::2], idx[1::2] = a, np.minimum(b, n)
+        return np.minimum.reduceat(np.append(x, np.inf), idx)[0::2]
+    left_min = window_min(np.maximum(left, 0), peaks + 1)
+    right_min = window_min(peaks, right)
+    return x[peaks] - np.maximum(left_min, right_min)
+
+
+def hvn(hist, prominence=0.05, top=None):
+    """
+    High-volume nodes of a Histogram as an HVN tuple, highest first.
+
+    ``prominence`` is the minimum prominence as a fraction of the POC's
+    volume; ``top`` keeps only that many nodes.
+    """
+    vol = hist.volume
+    if not len(vol):
+        return HVN(np.empty(0), np.empty(0), np.empty(0))
+    # Zero-volume bins past either end let an edge bin (or the POC) be a peak.
+    padded = np.concatenate([[0.0], vol, [0.0]])
+    peaks = find_peaks(padded)
+    prom = prominences(padded, peaks)
+    keep = prom >= prominence * vol.max()
+    peaks, prom = peaks[keep] - 1, prom[keep]
+    order = np.argsort(-vol[peaks], kind="stable")[:top]
+    peaks, prom = peaks[order], prom[order]
+    return HVN((hist.lo + peaks) * hist.tick, vol[peaks], prom)
+
+
+# ─────────────────────────────────────────────────────────────
+# Per-day blocks
+# ─────────────────────────────────────────────────────────────
+def _lowbit(i):
+    return i & -i
+
+
+class DayProfiles:
+    """
+    Per-UTC-day volume profiles with a Fenwick tree of merged day blocks.
+
+    ``append`` takes bars in time order (a BarStore or dict of arrays, or
+    use ``update`` for a single bar); ``range`` returns the Histogram of
+    any span of days.  Node i of the tree (1-based) holds days
+    (i - lowbit(i), i], so a query is summed from disjoint nodes and is
+    exactly the profile of the bars in it.
+    """
+
+    __slots__ = ("tick", "days", "_leaves", "_tree")
+
+    def __init__(self, bars=None, tick=DEFAULT_TICK):
+        self.tick = float(tick)
+        self.days = []                      # UTC day number of each leaf
+        self._leaves = []
+        self._tree = [None]                 # 1-based
+        if bars is not None:
+            self.append(bars)
+
+    def __len__(self):
+        return len(self.days)
+
+    def _new_day(self, day, leaf):
+        self.days.append(day)
+        self._leaves.append(leaf)
+        i = len(self.days)
+        node = leaf.copy()
+        k = 1
+        while k < _lowbit(i):
+            node.add_histogram(self._tree[i - k])
+            k *= 2
+        self._tree.append(node)
+
+    def append(self, bars):
+        time = np.asarray(bars["time"], dtype=np.float64)
+        if not len(time):
+            return
+        high, low = np.asarray(bars["high"], dtype=np.float64), np.asarray(bars["low"], dtype=np.float64)
+        volume = np.asarray(bars["volume"], dtype=np.float64)
+        day = np.floor_divide(time, DAY).astype(np.int64)
+        if self.days and day[0] < self.days[-1]:
+            raise ValueError("bars must be appended in time order")
+        first = np.flatnonzero(np.concatenate([[True], day[1:] != day[:-1]]))
+        last = np.append(first[1:], len(day))
+        lo, hi = bar_bins(high, low, self.tick)
+        for a, b in zip(first, last):
+            d = int(day[a])
+            if self.days and d == self.days[-1]:
+                self._extend_last(high[a:b], low[a:b], volume[a:b])
+                continue
+            # One difference-array pass per new day.
+            leaf = Histogram(self.tick)
+            base, top = int(lo[a:b].min()), int(hi[a:b].max())
+            leaf._base, leaf.lo, leaf.hi = base, base, top
+            leaf._data = _spread(lo[a:b], hi[a:b], volume[a:b], base, top - base + 1)
+            self._new_day(d, leaf)
+
+    def _extend_last(self, high, low, volume):
+        # Only the last leaf and the tree node ending at it cover the last day.
+        part = Histogram.from_bars(high, low, volume, self.tick)
+        self._leaves[-1].add_histogram(part)
+        self._tree[-1].add_histogram(part)
+
+    def update(self, bar):
+        """Add one ``(time, open, high, low, close, volume)`` bar."""
+        t, o, h, l, c, vol = bar
+        self.append({"time": [t], "high": [h], "low": [l], "volume": [vol]})
+
+    def _index(self, t, side):
+        if t is None:
+            return 0 if side == "left" else len(self.days)
+        return int(np.searchsorted(self.days, np.floor_divide(float(t), DAY), side=side))
+
+    def range(self, start=None, end=None):
+        """Histogram of the days from ``start`` to ``end`` (UTC seconds, inclusive)."""
+        lo, r = self._index(start, "left"), self._index(end, "right")
+        out = Histogram(self.tick)
+        while r > lo:
+            if r - _lowbit(r) >= lo:
+                out.add_histogram(self._tree[r])
+                r -= _lowbit(r)
+            else:
+                out.add_histogram(self._leaves[r - 1])
+                r -= 1
+        return out
+
+    def total(self):
+        return self.range()
+
+
+def _parse_day(s):
+    if s is None:
+        return None
+    return (datetime.date.fromisoformat(s) - datetime.date(1970, 1, 1)).days * DAY
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Find historical high-volume nodes from bar data.")
+    ap.add_argument("path")
+    ap.add_argument("--tick", type=float, default=DEFAULT_TICK)
+    ap.add_argument("--prominence", type=float, default=0.05)
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--from", dest="start", help="first day, YYYY-MM-DD")
+    ap.add_argument("--to", dest="end", help="last day, YYYY-MM-DD")
+    args = ap.parse_args(argv)
+    days = DayProfiles(BarStore.from_csv(args.path), tick=args.tick)
+    hist = days.range(_parse_day(args.start), _parse_day(args.end))
+    print(f"POC {hist.poc():.1f}  ({len(days)} days, {len(hist)} bins)")
+    nodes = hist.hvn(args.prominence, args.top)
+    for price, vol, prom in zip(*nodes):
+        print(f"  HVN {price:10.1f}  volume={vol:.4g}  prominence={prom:.4g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+"""
+Anchored VWAP and standard-deviation bands, as computed by
+yearly_anchored_vwap.pine and Agg-MTF-VWAP.pine.
+
+Per anchored period the scripts accumulate
+
+    cum_vol  += volume
+    cum_tpv  += tp * volume
+    cum_tp2v += tp * tp * volume
+
+and plot  vwap = cum_tpv / cum_vol,
+          sd   = sqrt(max(cum_tp2v / cum_vol - vwap^2, 0)),
+          VAH/VAL = vwap ± k * sd.
+
+The batch path turns the accumulators into segmented cumulative sums that
+reset at anchor boundaries, so any number of typical-price formulas run in
+one vectorised pass.  ``AnchoredVWAP`` is the O(1)-per-bar incremental
+version for live feeds.
+
+Two accumulation modes are offered:
+
+  "naive"    the scripts' raw moments, bit-for-bit what Pine plots.  With
+             BTC near 100k, tp^2 is ~1e10 and the variance is the difference
+             of two nearly equal numbers, so SD loses digits as volume
+             accumulates (the reason for the abs()/max(..., 0) guards).
+  "welford"  weighted Welford updates in the scalar engine and moments taken
+             about each period's opening price in the batch engine; both
+             keep the cancellation at the scale of the spread, not the price.
+"""
+import collections
+import datetime
+import math
+
+import numpy as np
+
+# ─────────────────────────────────────────────────────────────
+# Typical price sources (Pine built-in names)
+# ─────────────────────────────────────────────────────────────
+TP_SOURCES = {
+    "hlc3":  lambda o, h, l, c: (h + l + c) / 3,
+    "close": lambda o, h, l, c: c,
+    "open":  lambda o, h, l, c: o,
+    "hl2":   lambda o, h, l, c: (h + l) / 2,
+    "hc2":   lambda o, h, l, c: (h + c) / 2,
+    "oc2":   lambda o, h, l, c: (o + c) / 2,
+    "ohlc4": lambda o, h, l, c: (o + h + l + c) / 4,
+    "hlcc4": lambda o, h, l, c: (h + l + 2 * c) / 4,
+}
+
+
+def typical_price(bars, source="hlc3"):
+    """Typical price series of a BarStore for one Pine source name."""
+    return TP_SOURCES[source](bars.open, bars.high, bars.low, bars.close)
+
+
+def typical_prices(bars, sources):
+    """(len(sources), n) matrix of typical prices, one row per source."""
+    out = np.empty((len(sources), len(bars)))
+    for k, src in enumerate(sources):
+        out[k] = typical_price(bars, src)
+    return out
+
+
+# ─────────────────────────────────────────────────────────────
+# Anchor periods
+# ─────────────────────────────────────────────────────────────
+# Pine cascades the resets: a new year is also a new quarter, month, week
+# and day; a new month is also a new week and day, and so on.
+ANCHORS = ("year", "quarter", "month", "week", "day")
+
+MODES = ("naive", "welford")
+
+_TF_NAMES = {"Yearly": "year", "Quarterly": "quarter", "Monthly": "month",
+             "Weekly": "week", "Daily": "day"}
+
+
+def auto_anchor(tf_secs, tf_mode="Auto"):
+    """The scripts' ``eff_tf`` selection, returned as an anchor name."""
+    if tf_mode != "Auto":
+        return _TF_NAMES[tf_mode]
+    if tf_secs >= 86400:
+        return "year"
+    if tf_secs > 14400:
+        return "quarter"
+    if tf_secs >= 3600:
+        return "month"
+    if tf_secs >= 1800:
+        return "week"
+    return "day"
+
+
+def _calendar_fields(time):
+    """year, quarter, month, ISO week and day-of-month arrays for UTC seconds."""
+    days = np.floor_divide(np.asarray(time, dtype=np.float64), 86400).astype(np.int64)
+    d = days.astype("datetime64[D]")
+    year = d.astype("datetime64[Y]").astype(np.int64) + 1970
+    month = d.astype("datetime64[M]").astype(np.int64) % 12 + 1
+    dom = (d - d.astype("datetime64[M]")).astype(np.int64) + 1
+    # ISO week: the week's Thursday decides the year; 1970-01-01 was a Thursday.
+    thursday = days - (days + 3) % 7 + 3
+    th = thursday.astype("datetime64[D]")
+    week = (th - th.astype("datetime64[Y]")).astype(np.int64) // 7 + 1
+    quarter = (month - 1) // 3 + 1
+    return {"year": year, "quarter": quarter, "month": month, "week": week, "day": dom}
+
+
+def new_period(time, anchor):
+    """Boolean mask of bars that open a new ``anchor`` period (first bar included)."""
+    if anchor not in ANCHORS:
+        raise ValueError(f"unknown anchor {anchor!r}; expected one of {ANCHORS}")
+    fields = _calendar_fields(time)
+    n = len(fields["year"])
+    mask = np.zeros(n, dtype=bool)
+    if n == 0:
+        return mask
+    mask[0] = True
+    for name in ANCHORS[:ANCHORS.index(anchor) + 1]:
+        mask[1:] |= fields[name][1:] != fields[name][:-1]
+    return mask
+
+
+def _period_key(t, anchor):
+    """Scalar counterpart of the cascade in ``new_period``."""
+    dt = datetime.datetime.fromtimestamp(t, tz=datetime.timezone.utc)
+    key = (dt.year, (dt.month - 1) // 3 + 1, dt.month, dt.isocalendar()[1], dt.day)
+    return key[:ANCHORS.index(anchor) + 1]
+
+
+# ─────────────────────────────────────────────────────────────
+# Batch engine
+# ─────────────────────────────────────────────────────────────
+class VWAPResult(collections.namedtuple("VWAPResult", "vwap sd")):
+    """Developing VWAP and SD; arrays are (n,) or (k, n) for k sources."""
+
+    def band(self, mult=1.0):
+        """(upper, lower) band at ``mult`` standard deviations."""
+        return self.vwap + mult * self.sd, self.vwap - mult * self.sd
+
+    def bands(self, mults=(1.0, 2.0, 3.0)):
+        """{"vah1": ..., "val1": ..., "vah2": ...} keyed by band index."""
+        out = {}
+        for k, m in enumerate(mults, 1):
+            out[f"vah{k}"], out[f"val{k}"] = self.band(m)
+        return out
+
+
+def segment_starts(resets):
+    """Index of the first bar of each bar's segment."""
+    idx = np.arange(len(resets))
+    return np.maximum.accumulate(np.where(resets, idx, 0))
+
+
+def segmented_cumsum(x, resets, initial=None):
+    """
+    Cumulative sum along the last axis that restarts wherever ``resets``.
+
+    Each anchored period is accumulated on its own (one vectorised cumsum per
+    period, not per bar), so running values never grow with the whole
+    history.  A single global cumsum minus per-period offsets would lose the
+    first bars of every period to cancellation against years of prior totals.
+
+    ``initial`` seeds the bars before the first reset (a series continued
+    from an earlier chunk).  The seed is summed in first, in the same order
+    as one pass over both chunks, so the result is bit-for-bit the same.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    out = np.empty(x.shape)
+    bounds = np.flatnonzero(resets).tolist()
+    if not bounds or bounds[0] != 0:
+        bounds.insert(0, 0)
+        if initial is not None and x.shape[-1]:
+            b = bounds[1] if len(bounds) > 1 else x.shape[-1]
+            seeded = np.empty(x.shape[:-1] + (b + 1,))
+            seeded[..., 0] = initial
+            seeded[..., 1:] = x[..., :b]
+            np.cumsum(seeded, axis=-1, out=seeded)
+            out[..., :b] = seeded[..., 1:]
+            bounds.pop(0)
+    bounds.append(x.shape[-1])
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        np.cumsum(x[..., a:b], axis=-1, out=out[..., a:b])
+    return out
+
+
+def vwap_from_sums(cum_vol, cum_tpv, cum_tp2v):
+    """Pine's vwap/sd expressions; bars with no volume yet are NaN."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        vwap = np.where(cum_vol > 0, cum_tpv / cum_vol, np.nan)
+        var = np.maximum(cum_tp2v / cum_vol - vwap * vwap, 0.0)
+    return VWAPResult(vwap, np.sqrt(var))
+
+
+def anchored_vwap_sums(vol, tpv, tp2v, resets):
+    """Anchored VWAP from per-bar (vol, tp*vol, tp^2*vol), e.g. venue aggregates."""
+    return vwap_from_sums(segmented_cumsum(vol, resets),
+                          segmented_cumsum(tpv, resets),
+                          segmented_cumsum(tp2v, resets))
+
+
+VWAPState = collections.namedtuple("VWAPState", "origin cum_vol cum_1 cum_2")
+VWAPState.__doc__ = """\
+Running sums of the anchored period open after a bar, for continuing a
+series chunk by chunk (scalars, or (k,) arrays for k sources).
+
+origin   the period's first typical price (the "welford" shift)
+cum_vol  sum of volume
+cum_1    "naive": sum of tp*vol;   "welford": sum of vol*(tp - origin)
+cum_2    "naive": sum of tp^2*vol; "welford": sum of vol*(tp - origin)^2
+"""
+
+
+def _check_mode(mode):
+    if mode not in MODES:
+        raise ValueError(f"unknown mode {mode!r}; expected one of {MODES}")
+
+
+def _head_length(resets):
+    """Bars before the first reset: the part a carried-in state applies to."""
+    resets = np.asarray(resets, dtype=bool)
+    return int(np.argmax(resets)) if resets.any() else len(resets)
+
+
+def raw_moments(tp, volume):
+    """Per-bar ``(tp * volume, tp * tp * volume)`` in the scripts' evaluation order."""
+    return tp * volume, tp * tp * volume
+
+
+def _moments(tp, volume, resets, mode, state):
+    """``(origin, cum_vol, cum_1, cum_2)`` per bar; origin is None in "naive" mode."""
+    volume = np.broadcast_to(np.asarray(volume, dtype=np.float64), tp.shape)
+    head = _head_length(resets) if state is not None else 0
+    init = (state.cum_vol, state.cum_1, state.cum_2) if head else (None, None, None)
+    if mode == "naive":
+        return (None,) + tuple(segmented_cumsum(x, resets, i)
+                               for x, i in zip((volume,) + raw_moments(tp, volume), init))
+    # Shifted moments: d = tp - K with K the period's first typical price.
+    # sum(v*(tp-vwap)^2) = sum(v*d^2) - sum(v*d)^2 / sum(v) for any K.
+    origin = tp[..., segment_starts(resets)]
+    if head:
+        origin[..., :head] = np.asarray(state.origin, dtype=np.float64)[..., None]
+    d = tp - origin
+    vd = volume * d
+    return (origin, segmented_cumsum(volume, resets, init[0]),
+            segmented_cumsum(vd, resets, init[1]), segmented_cumsum(vd * d, resets, init[2]))
+
+
+def anchored_vwap(tp, volume, resets, mode="naive", state=None):
+    """
+    Anchored VWAP/SD for one typical-price series or a (k, n) stack of them.
+
+    ``resets`` is the new-period mask from ``new_period``; volume is shared
+    across all rows of ``tp``.  See the module docstring for ``mode``.
+    ``state`` (a VWAPState from ``anchored_vwap_state`` on the bars just
+    before these) continues the period open at bar 0 when ``resets[0]`` is
+    False; the result then equals one run over both chunks exactly.
+    """
+    _check_mode(mode)
+    tp = np.asarray(tp, dtype=np.float64)
+    origin, cum_vol, cum_1, cum_2 = _moments(tp, volume, resets, mode, state)
+    if mode == "naive":
+        return vwap_from_sums(cum_vol, cum_1, cum_2)
+    d = tp - origin
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_d = np.where(cum_vol > 0, cum_1 / cum_vol, np.nan)
+        var = np.maximum(cum_2 / cum_vol - mean_d * mean_d, 0.0)
+    return VWAPResult(tp - d + mean_d, np.sqrt(var))
+
+
+def anchored_vwap_state(tp, volume, resets, mode="naive", state=None):
+    """
+    VWAPState after the last bar, to pass as ``state`` for the next chunk.
+    Only the last period is summed; ``state`` matters only when the chunk
+    has no reset at all.
+    """
+    _check_mode(mode)
+    tp = np.asarray(tp, dtype=np.float64)
+    resets = np.asarray(resets, dtype=bool)
+    n = tp.shape[-1]
+    if n == 0:
+        return state
+    last = np.flatnonzero(resets)
+    r = int(last[-1]) if len(last) else 0
+    carry = state if not resets[r] else None
+    tail = tp[..., r:]
+    volume = np.broadcast_to(np.asarray(volume, dtype=np.float64), tp.shape)[..., r:]
+    origin, cum_vol, cum_1, cum_2 = _moments(tail, volume, resets[r:], mode, carry)
+    if origin is None:
+        origin = tail[..., 0] if carry is None else carry.origin
+    else:
+        origin = origin[..., -1]
+    return VWAPState(origin, cum_vol[..., -1], cum_1[..., -1], cum_2[..., -1])
+
+
+def previous_period(result, resets):
+    """
+    Final VWAP/SD of the previous period carried across the current one
+    (the scripts' ``prev_vwap``/``prev_sd``); NaN during the first period.
+    """
+    vwap, sd = np.asarray(result.vwap), np.asarray(result.sd)
+    starts = segment_starts(resets)
+    last_of_prev = starts - 1
+    valid = last_of_prev >= 0
+    idx = np.where(valid, last_of_prev, 0)
+    pv = np.where(valid, vwap[..., idx], np.nan)
+    ps = np.where(valid, sd[..., idx], np.nan)
+    return VWAPResult(pv, ps)
+
+
+def anchored_vwap_bars(bars, sources=("hlc3",), anchor="year", mode="naive"):
+    """Run every TP source over a BarStore in one pass: {source: VWAPResult}."""
+    resets = new_period(bars.time, anchor)
+    res = anchored_vwap(typical_prices(bars, sources), bars.volume, resets, mode)
+    return {src: VWAPResult(res.vwap[k], res.sd[k]) for k, src in enumerate(sources)}
+
+
+# ─────────────────────────────────────────────────────────────
+# Incremental engine
+# ─────────────────────────────────────────────────────────────
+class AnchoredVWAP:
+    """
+    Bar-by-bar anchored VWAP for live feeds; each ``update`` is O(1).
+
+    Bars are ``(time, open, high, low, close, volume)`` tuples with time in
+    UTC seconds.  Results match ``anchored_vwap`` on the same bars and mode.
+    In "welford" mode ``cum_tpv``/``cum_tp2v`` are unused and the state is
+    the running weighted mean and sum of squared deviations (``mean``, ``m2``).
+    """
+
+    __slots__ = ("anchor", "source", "mode", "cum_vol", "cum_tpv", "cum_tp2v",
+                 "mean", "m2", "prev_vwap", "prev_sd", "_key", "_tp")
+
+    def __init__(self, anchor="year", source="hlc3", mode="naive"):
+        if anchor not in ANCHORS:
+            raise ValueError(f"unknown anchor {anchor!r}; expected one of {ANCHORS}")
+        _check_mode(mode)
+        self.anchor = anchor
+        self.source = source
+        self.mode = mode
+        self._tp = TP_SOURCES[source]
+        self.cum_vol = self.cum_tpv = self.cum_tp2v = 0.0
+        self.mean = self.m2 = 0.0
+        self.prev_vwap = self.prev_sd = float("nan")
+        self._key = None
+
+    @property
+    def vwap(self):
+        if self.cum_vol <= 0:
+            return float("nan")
+        if self.mode == "welford":
+            return self.mean
+        return self.cum_tpv / self.cum_vol
+
+    @property
+    def sd(self):
+        if self.cum_vol <= 0:
+            return float("nan")
+        if self.mode == "welford":
+            return math.sqrt(max(self.m2 / self.cum_vol, 0.0))
+        v = self.vwap
+        return math.sqrt(max(self.cum_tp2v / self.cum_vol - v * v, 0.0))
+
+    def update(self, bar):
+        """Fold one bar in and return the developing ``(vwap, sd)``."""
+        t, o, h, l, c, vol = bar
+        tp = self._tp(o, h, l, c)
+        key = _period_key(t, self.anchor)
+        if key != self._key:
+            if self.cum_vol > 0:
+                self.prev_vwap, self.prev_sd = self.vwap, self.sd
+            self._key = key
+            self.cum_vol = self.cum_tpv = self.cum_tp2v = 0.0
+            self.mean = tp
+            self.m2 = 0.0
+        if self.mode == "welford":
+            self.cum_vol += vol
+            if self.cum_vol > 0:
+                delta = tp - self.mean
+                self.mean += delta * vol / self.cum_vol
+                self.m2 += vol * delta * (tp - self.mean)
+        else:
+            self.cum_vol += vol
+            self.cum_tpv += tp * vol
+            self.cum_tp2v += tp * tp * vol
+        return self.vwap, self.sd